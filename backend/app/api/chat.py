@@ -1,11 +1,18 @@
 """Chat API routes."""
+import asyncio
+import contextlib
+import threading
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
-from app.models.base import get_db
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.models.base import SessionLocal, get_db
 from app.models.conversation import Conversation, Message
-from app.services.ai_assistant import AIAssistant
+from app.services.admission import AdmissionRejected, get_admission_controller
+from app.services.ai_assistant import AIAssistant, ensure_user
 import uuid
 from datetime import datetime
 
@@ -26,6 +33,124 @@ class ChatResponse(BaseModel):
     tool_calls: Optional[list] = None
 
 
+class TurnCancelled(Exception):
+    """The client cancelled a chat turn before its reply was stored."""
+
+
+def add_message(
+    db: Session,
+    conversation_id: uuid.UUID,
+    role: str,
+    content: str,
+    tool_calls: Optional[list] = None
+) -> Message:
+    """
+    Append a message to a conversation and commit it.
+    
+    The conversation row is locked while the next sequence number is
+    chosen, so concurrent turns (e.g. several in flight on one WebSocket,
+    or in other workers) never get the same number.
+    """
+    db.query(Conversation.id).filter(Conversation.id == conversation_id).with_for_update().one()
+    last = db.query(func.max(Message.sequence_number)).filter(
+        Message.conversation_id == conversation_id
+    ).scalar()
+    message = Message(
+        conversation_id=conversation_id,
+        role=role,
+        content=content,
+        tool_calls=tool_calls,
+        sequence_number=(last or 0) + 1
+    )
+    db.add(message)
+    db.commit()
+    return message
+
+
+def run_chat_turn(
+    db: Session,
+    user_id: str,
+    conversation_id: Optional[str],
+    message: str,
+    cancelled: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Store a user message, get the assistant's reply and store it.
+    
+    Blocking (database and LLM calls); run it in the thread pool.
+    
+    Args:
+        db: Database session
+        user_id: User ID
+        conversation_id: Existing conversation, or None to start one
+        message: User message
+        cancelled: Set to cancel the turn. It is checked before the
+            assistant runs and before the reply is stored; a running
+            Claude call is not interrupted.
+        
+    Returns:
+        Dictionary with response, conversation_id and tool_calls
+    """
+    # Get or create conversation
+    if conversation_id:
+        conversation = db.query(Conversation).filter(
+            Conversation.id == uuid.UUID(conversation_id)
+        ).first()
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    else:
+        # Create new conversation (its user row must exist first)
+        ensure_user(db, user_id)
+        conversation = Conversation(
+            user_id=uuid.UUID(user_id),
+            title=message[:100]  # Use first 100 chars as title
+        )
+        db.add(conversation)
+        db.commit()
+        db.refresh(conversation)
+    
+    # Save user message
+    add_message(db, conversation.id, "user", message)
+    
+    if cancelled is not None and cancelled.is_set():
+        raise TurnCancelled()
+    
+    # Initialize AI assistant
+    assistant = AIAssistant(user_id=user_id, db=db)
+    
+    # Process message
+    result = assistant.process_message(
+        message=message,
+        conversation_id=str(conversation.id)
+    )
+    
+    if cancelled is not None and cancelled.is_set():
+        raise TurnCancelled()
+    
+    # Save assistant response
+    add_message(db, conversation.id, "assistant", result["response"], result.get("tool_calls"))
+    
+    return {
+        "response": result["response"],
+        "conversation_id": str(conversation.id),
+        "tool_calls": result.get("tool_calls")
+    }
+
+
+def run_chat_turn_in_session(
+    user_id: str,
+    conversation_id: Optional[str],
+    message: str,
+    cancelled: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """Run a chat turn with its own short-lived database session."""
+    db = SessionLocal()
+    try:
+        return run_chat_turn(db, user_id, conversation_id, message, cancelled)
+    finally:
+        db.close()
+
+
 @router.post("/message", response_model=ChatResponse)
 async def send_message(
     chat_message: ChatMessage,
@@ -33,59 +158,26 @@ async def send_message(
 ):
     """Send a message to the AI assistant."""
     try:
-        # Get or create conversation
-        if chat_message.conversation_id:
-            conversation = db.query(Conversation).filter(
-                Conversation.id == uuid.UUID(chat_message.conversation_id)
-            ).first()
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-        else:
-            # Create new conversation
-            conversation = Conversation(
-                user_id=uuid.UUID(chat_message.user_id),
-                title=chat_message.message[:100]  # Use first 100 chars as title
+        # Rejected requests are turned away before any work is done
+        async with get_admission_controller().admit(chat_message.user_id):
+            result = await run_in_threadpool(
+                run_chat_turn,
+                db,
+                chat_message.user_id,
+                chat_message.conversation_id,
+                chat_message.message
             )
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
         
-        # Save user message
-        user_message = Message(
-            conversation_id=conversation.id,
-            role="user",
-            content=chat_message.message,
-            sequence_number=len(conversation.messages) + 1
-        )
-        db.add(user_message)
-        db.commit()
-        
-        # Initialize AI assistant
-        assistant = AIAssistant(user_id=chat_message.user_id, db=db)
+        return ChatResponse(**result)
         
-        # Process message
-        result = assistant.process_message(
-            message=chat_message.message,
-            conversation_id=str(conversation.id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
         )
-        
-        # Save assistant response
-        assistant_message = Message(
-            conversation_id=conversation.id,
-            role="assistant",
-            content=result["response"],
-            tool_calls=result.get("tool_calls"),
-            sequence_number=len(conversation.messages) + 2
-        )
-        db.add(assistant_message)
-        db.commit()
-        
-        return ChatResponse(
-            response=result["response"],
-            conversation_id=str(conversation.id),
-            tool_calls=result.get("tool_calls")
-        )
-        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -142,72 +234,131 @@ async def get_messages(
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
-    """WebSocket endpoint for real-time chat."""
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    WebSocket endpoint for real-time chat.
+    
+    Client frames:
+        {"type": "message", "request_id", "user_id", "conversation_id", "message"}
+            ("type" may be omitted; without a request_id one is assigned)
+        {"type": "cancel", "request_id"}
+    
+    Server frames echo the request_id:
+        {"type": "response", "request_id", "response", "conversation_id", "tool_calls"}
+        {"type": "error", "request_id", "error"} (plus "retry_after" when rejected)
+        {"type": "cancelled", "request_id"}
+        {"type": "ping"} every websocket_heartbeat_seconds
+    
+    Up to websocket_max_in_flight messages (no more than the per-user
+    admission cap) can be in flight at once; replies are sent as they
+    finish, except that turns in the same conversation run one after
+    another, in the order they arrived. Each turn uses its own database
+    session. A socket belongs to the user_id of its first message, so
+    admission's per-user limits cannot be dodged by changing user_id.
+    """
     await websocket.accept()
+    max_in_flight = settings.websocket_max_in_flight
+    if settings.admission_enabled and settings.admission_user_max_in_flight > 0:
+        # Turns beyond the user's admission cap would only be rejected
+        max_in_flight = min(max_in_flight, settings.admission_user_max_in_flight)
+    socket_user_id = None
+    send_lock = asyncio.Lock()
+    turns: Dict[str, threading.Event] = {}
+    conversation_locks: Dict[str, asyncio.Lock] = {}
+    tasks = set()  # running turns, referenced until done
+    
+    async def send(payload: Dict[str, Any]) -> bool:
+        async with send_lock:
+            try:
+                await websocket.send_json(payload)
+                return True
+            except Exception:
+                return False
+    
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(settings.websocket_heartbeat_seconds)
+            if not await send({"type": "ping"}):
+                return
+    
+    async def run_turn(request_id: str, user_id: str, conversation_id: Optional[str], message: str):
+        cancelled = turns[request_id]
+        conversation_lock = None
+        if conversation_id:
+            conversation_lock = conversation_locks.setdefault(conversation_id, asyncio.Lock())
+        try:
+            async with conversation_lock or contextlib.nullcontext():
+                async with get_admission_controller().admit(user_id):
+                    if cancelled.is_set():
+                        return
+                    result = await run_in_threadpool(
+                        run_chat_turn_in_session, user_id, conversation_id, message, cancelled
+                    )
+            if not cancelled.is_set():
+                await send({"type": "response", "request_id": request_id, **result})
+        except TurnCancelled:
+            pass  # acknowledged when the cancel frame arrived
+        except AdmissionRejected as e:
+            await send({"type": "error", "request_id": request_id, "error": e.detail, "retry_after": e.retry_after})
+        except HTTPException as e:
+            await send({"type": "error", "request_id": request_id, "error": e.detail})
+        except Exception as e:
+            await send({"type": "error", "request_id": request_id, "error": str(e)})
+        finally:
+            turns.pop(request_id, None)
+    
+    heartbeat_task = None
+    if settings.websocket_heartbeat_seconds > 0:
+        heartbeat_task = asyncio.create_task(heartbeat())
     
     try:
         while True:
             data = await websocket.receive_json()
+            request_id = str(data.get("request_id") or uuid.uuid4())
+            
+            if data.get("type") == "cancel":
+                cancelled = turns.get(request_id)
+                if cancelled is not None and not cancelled.is_set():
+                    cancelled.set()
+                    await send({"type": "cancelled", "request_id": request_id})
+                continue
+            if data.get("type") not in (None, "message"):
+                continue  # e.g. pong
+            
             user_id = data.get("user_id")
-            conversation_id = data.get("conversation_id")
             message = data.get("message")
-            
             if not user_id or not message:
-                await websocket.send_json({"error": "Missing user_id or message"})
+                await send({"type": "error", "request_id": request_id, "error": "Missing user_id or message"})
+                continue
+            if request_id in turns:
+                await send({"type": "error", "request_id": request_id, "error": "Duplicate request_id"})
+                continue
+            if socket_user_id is None:
+                socket_user_id = user_id
+            elif user_id != socket_user_id:
+                await send({"type": "error", "request_id": request_id, "error": "user_id does not match this connection"})
+                continue
+            if len(turns) >= max_in_flight:
+                await send({
+                    "type": "error",
+                    "request_id": request_id,
+                    "error": f"Too many messages in flight (at most {max_in_flight})"
+                })
                 continue
             
-            # Get or create conversation
-            if conversation_id:
-                conversation = db.query(Conversation).filter(
-                    Conversation.id == uuid.UUID(conversation_id)
-                ).first()
-            else:
-                conversation = Conversation(
-                    user_id=uuid.UUID(user_id),
-                    title=message[:100]
-                )
-                db.add(conversation)
-                db.commit()
-                db.refresh(conversation)
-            
-            # Save user message
-            user_msg = Message(
-                conversation_id=conversation.id,
-                role="user",
-                content=message,
-                sequence_number=len(conversation.messages) + 1
-            )
-            db.add(user_msg)
-            db.commit()
-            
-            # Process with AI
-            assistant = AIAssistant(user_id=user_id, db=db)
-            result = assistant.process_message(
-                message=message,
-                conversation_id=str(conversation.id)
-            )
-            
-            # Save assistant response
-            assistant_msg = Message(
-                conversation_id=conversation.id,
-                role="assistant",
-                content=result["response"],
-                tool_calls=result.get("tool_calls"),
-                sequence_number=len(conversation.messages) + 2
-            )
-            db.add(assistant_msg)
-            db.commit()
-            
-            # Send response
-            await websocket.send_json({
-                "response": result["response"],
-                "conversation_id": str(conversation.id),
-                "tool_calls": result.get("tool_calls")
-            })
+            turns[request_id] = threading.Event()
+            task = asyncio.create_task(run_turn(request_id, user_id, data.get("conversation_id"), message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
             
     except WebSocketDisconnect:
         pass
     except Exception as e:
-        await websocket.send_json({"error": str(e)})
-
+        await send({"type": "error", "error": str(e)})
+    finally:
+        # Running turns finish in their threads (keeping their admission
+        # slots until then), but nothing more is stored or sent
+        for cancelled in turns.values():
+            cancelled.set()
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
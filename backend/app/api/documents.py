@@ -1,21 +1,35 @@
 """Document upload and management API routes."""
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from app.models.base import get_db
+from app.config import settings
+from app.models.base import SessionLocal, get_db
 from app.models.document import Document, DocumentChunk
 from app.services.tools import KnowledgeBaseTool
-from app.services.ai_assistant import AIAssistant
+from app.services.ai_assistant import AIAssistant, ensure_user
+from app.services.cache import documents_changed
+from app.metrics import REGISTRY
+import hashlib
 import uuid
 import os
-from typing import List
-import PyPDF2
-from docx import Document as DocxDocument
+from collections import defaultdict
+from typing import List, Tuple
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
+UPLOAD_STAGE_SECONDS = REGISTRY.histogram(
+    "document_upload_stage_seconds",
+    "Time spent in each stage of the document upload pipeline",
+    ["stage", "outcome"]
+)
+
 
 def extract_text_from_pdf(file_path: str) -> str:
     """Extract text from PDF file."""
+    # Parsers are imported on first use to keep startup fast
+    import PyPDF2
+    
     try:
         with open(file_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
@@ -29,6 +43,8 @@ def extract_text_from_pdf(file_path: str) -> str:
 
 def extract_text_from_docx(file_path: str) -> str:
     """Extract text from DOCX file."""
+    from docx import Document as DocxDocument
+    
     try:
         doc = DocxDocument(file_path)
         text = ""
@@ -71,99 +87,413 @@ def chunk_text(text: str, chunk_size: int = 500) -> List[dict]:
     return chunks
 
 
+def content_hash(data: bytes) -> str:
+    """SHA-256 fingerprint used to detect unchanged files and chunks."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def legacy_vector_id(document_id, chunk_index: int) -> str:
+    """Vector ID of chunks indexed before vector_id was recorded."""
+    return f"{document_id}_chunk_{chunk_index}"
+
+
+def plan_chunk_updates(
+    db: Session,
+    document: Document,
+    chunks: List[dict],
+    reuse_vectors: bool
+) -> Tuple[List[dict], List[DocumentChunk], List[DocumentChunk]]:
+    """
+    Reconcile a document's stored chunks with freshly extracted ones.
+    
+    Chunks whose text is unchanged keep their row and vector (when
+    reuse_vectors), with the row moved to the chunk's new position; the
+    others get new rows under new vector IDs.
+    
+    Args:
+        db: Database session
+        document: Document being (re-)indexed
+        chunks: Chunks from chunk_text()
+        reuse_vectors: Whether the stored vectors are known to be complete
+        
+    Returns:
+        Tuple of (chunks that need embedding, with "vector_id" set;
+        existing rows kept with their vectors; existing rows whose vectors
+        are no longer needed)
+    """
+    existing = list(document.chunks)
+    reusable = defaultdict(list)
+    if reuse_vectors:
+        for row in existing:
+            if row.content_hash and row.vector_id:
+                reusable[row.content_hash].append(row)
+    
+    used_vector_ids = {row.vector_id or legacy_vector_id(document.id, row.chunk_index) for row in existing}
+    kept = set()
+    to_embed = []
+    for chunk_data in chunks:
+        chunk_hash = content_hash(chunk_data["text"].encode("utf-8"))
+        if reusable[chunk_hash]:
+            row = reusable[chunk_hash].pop(0)
+            row.chunk_index = chunk_data["chunk_index"]
+            kept.add(row.id)
+            continue
+        
+        occurrence = 0
+        vector_id = f"{document.id}_{chunk_hash[:16]}_{occurrence}"
+        while vector_id in used_vector_ids:
+            occurrence += 1
+            vector_id = f"{document.id}_{chunk_hash[:16]}_{occurrence}"
+        used_vector_ids.add(vector_id)
+        
+        db.add(DocumentChunk(
+            document_id=document.id,
+            chunk_text=chunk_data["text"],
+            chunk_index=chunk_data["chunk_index"],
+            content_hash=chunk_hash,
+            vector_id=vector_id
+        ))
+        to_embed.append({**chunk_data, "vector_id": vector_id})
+    
+    kept_rows = [row for row in existing if row.id in kept]
+    stale = [row for row in existing if row.id not in kept]
+    return to_embed, kept_rows, stale
+
+
+def index_upload(
+    db: Session,
+    user_id: str,
+    file: UploadFile,
+    content: bytes,
+    document: Document,
+    reuse_vectors: bool
+) -> dict:
+    """
+    Extract, chunk and index an uploaded file into a document record.
+    
+    Only chunks whose text is not already indexed for the document are
+    embedded (see plan_chunk_updates); kept vectors get their new position
+    and filename in their metadata. A completed document stays
+    completed, with its old file details and vectors, until the new
+    version is fully indexed; a failed run is rolled back (see
+    rollback_upload) and raised. It blocks for the whole extraction,
+    embedding and vector writes, so endpoints run it in the thread pool.
+    
+    Returns:
+        Upload response for the document
+    """
+    previous_status = document.status
+    original_indexes = {row.id: row.chunk_index for row in document.chunks}
+    file_type = file.filename.split('.')[-1].lower()
+    file_path = None
+    to_embed = []
+    moved = {}
+    try:
+        with UPLOAD_STAGE_SECONDS.time(stage="total"):
+            if previous_status != "completed":
+                document.status = "processing"
+            db.commit()
+            db.refresh(document)
+            
+            # Save file temporarily
+            with UPLOAD_STAGE_SECONDS.time(stage="save"):
+                upload_dir = "uploads"
+                os.makedirs(upload_dir, exist_ok=True)
+                file_path = os.path.join(upload_dir, f"{document.id}_{file.filename}")
+                
+                with open(file_path, "wb") as buffer:
+                    buffer.write(content)
+            
+            # Extract text based on file type
+            with UPLOAD_STAGE_SECONDS.time(stage="extract"):
+                if file_type == "pdf":
+                    text = extract_text_from_pdf(file_path)
+                elif file_type in ["docx", "doc"]:
+                    text = extract_text_from_docx(file_path)
+                elif file_type == "txt":
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                else:
+                    raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_type}")
+            
+            # Chunk the text
+            with UPLOAD_STAGE_SECONDS.time(stage="chunk"):
+                chunks = chunk_text(text)
+            
+            # Store chunks in database, keeping unchanged ones
+            with UPLOAD_STAGE_SECONDS.time(stage="store_chunks"):
+                to_embed, kept_chunks, stale_chunks = plan_chunk_updates(db, document, chunks, reuse_vectors)
+                moved = {
+                    row.vector_id: {"chunk_index": row.chunk_index, "source": file.filename}
+                    for row in kept_chunks
+                    if row.chunk_index != original_indexes[row.id] or file.filename != document.filename
+                }
+                db.commit()
+            
+            # Add new chunks to vector database and drop replaced ones
+            with UPLOAD_STAGE_SECONDS.time(stage="index") as labels:
+                knowledge_base = KnowledgeBaseTool()
+                chunks_with_source = [
+                    {
+                        "text": chunk_data["text"],
+                        "chunk_index": chunk_data["chunk_index"],
+                        "vector_id": chunk_data["vector_id"],
+                        "source": file.filename
+                    }
+                    for chunk_data in to_embed
+                ]
+                
+                if chunks_with_source:
+                    report = knowledge_base.add_document_chunks(
+                        user_id=user_id,
+                        document_id=str(document.id),
+                        chunks=chunks_with_source
+                    )
+                    if not report.success:
+                        labels["outcome"] = "error"
+                        raise Exception(f"Failed to index {len(report.failed_ids)} of {len(chunks_with_source)} chunks")
+                if moved:
+                    if not knowledge_base.update_chunk_metadata(user_id, moved).success:
+                        labels["outcome"] = "error"
+                        raise Exception("Failed to update the positions of unchanged chunks")
+                if stale_chunks:
+                    if not knowledge_base.delete_vectors(user_id, [
+                        row.vector_id or legacy_vector_id(document.id, row.chunk_index)
+                        for row in stale_chunks
+                    ]):
+                        labels["outcome"] = "error"
+                        raise Exception("Failed to delete replaced document vectors")
+                    for row in stale_chunks:
+                        db.delete(row)
+            
+            document.filename = file.filename
+            document.file_type = file_type
+            document.file_size = len(content)
+            document.content_hash = content_hash(content)
+            document.status = "completed"
+            db.commit()
+            documents_changed(user_id)
+        
+    except Exception:
+        rollback_upload(db, user_id, document, previous_status, original_indexes, to_embed, moved)
+        raise
+    finally:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+    
+    return {
+        "document_id": str(document.id),
+        "filename": document.filename,
+        "status": document.status,
+        "chunks": len(chunks),
+        "embedded_chunks": len(to_embed),
+        "deduplicated": False
+    }
+
+
+def rollback_upload(
+    db: Session,
+    user_id: str,
+    document: Document,
+    previous_status: str,
+    original_indexes: dict,
+    to_embed: List[dict],
+    moved: dict
+):
+    """
+    Undo a failed (re-)index of a document.
+    
+    Chunks added by the run are removed (with any vectors already written)
+    and kept chunks get their old positions back, in the database and in
+    the metadata of the vectors in moved, so a document that was completed
+    stays searchable as its previous version. Other documents are marked
+    "failed".
+    """
+    try:
+        db.rollback()
+        knowledge_base = KnowledgeBaseTool()
+        if to_embed:
+            knowledge_base.delete_vectors(user_id, [chunk["vector_id"] for chunk in to_embed])
+        restored = {}
+        for row in list(document.chunks):
+            if row.id in original_indexes:
+                row.chunk_index = original_indexes[row.id]
+                if row.vector_id in moved:
+                    restored[row.vector_id] = {"chunk_index": row.chunk_index, "source": document.filename}
+            else:
+                db.delete(row)
+        if restored:
+            knowledge_base.update_chunk_metadata(user_id, restored)
+        document.status = "completed" if previous_status == "completed" else "failed"
+        db.commit()
+    except Exception as e:
+        print(f"Error rolling back upload of document {document.id}: {e}")
+
+
+def unchanged_response(document: Document) -> dict:
+    """Upload response for a file that is already indexed."""
+    return {
+        "document_id": str(document.id),
+        "filename": document.filename,
+        "status": document.status,
+        "chunks": len(document.chunks),
+        "embedded_chunks": 0,
+        "deduplicated": True
+    }
+
+
+def get_user_document(db: Session, user_id: str, document_id: str) -> Document:
+    """Get a user's document or raise 404."""
+    try:
+        document_uuid = uuid.UUID(document_id)
+        user_uuid = uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    document = db.query(Document).filter(
+        Document.id == document_uuid,
+        Document.user_id == user_uuid
+    ).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+
+def purge_document(db: Session, document: Document) -> bool:
+    """
+    Delete a document's vectors, then its rows (chunks cascade).
+    
+    Returns:
+        True if deleted; on failure the document is marked "delete_failed"
+    """
+    user_id = str(document.user_id)
+    vector_ids = [
+        row.vector_id or legacy_vector_id(document.id, row.chunk_index)
+        for row in document.chunks
+    ]
+    if not KnowledgeBaseTool().delete_document(user_id, str(document.id), vector_ids):
+        document.status = "delete_failed"
+        db.commit()
+        return False
+    
+    db.delete(document)
+    db.commit()
+    documents_changed(user_id)
+    return True
+
+
+def purge_document_in_background(document_id: uuid.UUID):
+    """Background task deleting a large document with its own session."""
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if document:
+            purge_document(db, document)
+    except Exception as e:
+        print(f"Error deleting document {document_id}: {e}")
+    finally:
+        db.close()
+
+
 @router.post("/upload")
 async def upload_document(
     user_id: str,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    """Upload and process a document."""
+    """
+    Upload and process a document.
+    
+    An upload identical to an indexed document of the user returns that
+    document without reprocessing. Any other upload creates a new
+    document, even under an existing filename; use PUT
+    /{user_id}/{document_id} to replace a document's file.
+    """
     try:
+        ensure_user(db, user_id)
+        user_uuid = uuid.UUID(user_id)
+        content = await file.read()
+        
+        # Identical file already indexed
+        duplicate = db.query(Document).filter(
+            Document.user_id == user_uuid,
+            Document.content_hash == content_hash(content),
+            Document.status == "completed"
+        ).first()
+        if duplicate:
+            return unchanged_response(duplicate)
+        
         # Create document record
         document = Document(
-            user_id=uuid.UUID(user_id),
+            user_id=user_uuid,
             filename=file.filename,
             file_type=file.filename.split('.')[-1].lower(),
-            file_size=0,  # Will update after saving
+            file_size=len(content),
             status="processing"
         )
         db.add(document)
-        db.commit()
-        db.refresh(document)
         
-        # Save file temporarily
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, f"{document.id}_{file.filename}")
+        return await run_in_threadpool(index_upload, db, user_id, file, content, document, reuse_vectors=False)
         
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-            document.file_size = len(content)
-        
-        # Extract text based on file type
-        if document.file_type == "pdf":
-            text = extract_text_from_pdf(file_path)
-        elif document.file_type in ["docx", "doc"]:
-            text = extract_text_from_docx(file_path)
-        elif document.file_type == "txt":
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {document.file_type}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.put("/{user_id}/{document_id}")
+async def replace_document(
+    user_id: str,
+    document_id: str,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """Replace a document's file, re-embedding only changed chunks."""
+    document = get_user_document(db, user_id, document_id)
+    try:
+        content = await file.read()
+        if document.status == "completed" and document.content_hash == content_hash(content):
+            return unchanged_response(document)
         
-        # Chunk the text
-        chunks = chunk_text(text)
+        # Vectors of a failed run may be missing, so only reuse completed ones
+        reuse_vectors = document.status == "completed"
+        return await run_in_threadpool(index_upload, db, user_id, file, content, document, reuse_vectors)
         
-        # Store chunks in database
-        for chunk_data in chunks:
-            chunk = DocumentChunk(
-                document_id=document.id,
-                chunk_text=chunk_data["text"],
-                chunk_index=chunk_data["chunk_index"]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/{user_id}/{document_id}")
+async def delete_document(
+    user_id: str,
+    document_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Delete a document with its chunks and vectors.
+    
+    Documents with more than settings.document_delete_background_chunks
+    chunks are marked "deleting" and removed in the background (202).
+    """
+    document = get_user_document(db, user_id, document_id)
+    try:
+        chunk_count = db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).count()
+        if chunk_count > settings.document_delete_background_chunks:
+            document.status = "deleting"
+            db.commit()
+            background_tasks.add_task(purge_document_in_background, document.id)
+            return JSONResponse(
+                status_code=202,
+                content={"document_id": document_id, "status": "deleting"}
             )
-            db.add(chunk)
         
-        db.commit()
-        
-        # Add to vector database
-        knowledge_base = KnowledgeBaseTool()
-        chunks_with_source = [
-            {
-                "text": chunk_data["text"],
-                "chunk_index": chunk_data["chunk_index"],
-                "source": file.filename
-            }
-            for chunk_data in chunks
-        ]
-        
-        success = knowledge_base.add_document_chunks(
-            user_id=user_id,
-            document_id=str(document.id),
-            chunks=chunks_with_source
-        )
-        
-        if success:
-            document.status = "completed"
-        else:
-            document.status = "failed"
-        
-        db.commit()
-        
-        # Clean up temp file
-        os.remove(file_path)
-        
-        return {
-            "document_id": str(document.id),
-            "filename": document.filename,
-            "status": document.status,
-            "chunks": len(chunks)
-        }
+        if not purge_document(db, document):
+            raise Exception("Failed to delete document vectors")
+        return {"document_id": document_id, "status": "deleted"}
         
     except Exception as e:
-        if document:
-            document.status = "failed"
-            db.commit()
         raise HTTPException(status_code=500, detail=str(e))
 
 
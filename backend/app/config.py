@@ -1,6 +1,6 @@
 """Configuration management for the application."""
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -8,6 +8,14 @@ class Settings(BaseSettings):
     
     # Anthropic API
     anthropic_api_key: str
+    anthropic_base_url: Optional[str] = None  # Override for local stubs (benchmarks/load)
+    # Models (see app.services.model_router); simple calls use fast_model
+    full_model: str = "claude-3-5-sonnet-20241022"
+    fast_model: Optional[str] = "claude-3-5-haiku-20241022"  # unset routes everything to full_model
+    model_routing_enabled: bool = True
+    model_routing_chitchat_max_chars: int = 80
+    model_routing_fast_result_chars: int = 2000  # tool result JSON the fast model may summarize
+    model_routing_log_decisions: bool = False  # print every decision (debugging); counts are always in /metrics
     
     # Database
     database_url: str
@@ -16,15 +24,116 @@ class Settings(BaseSettings):
     pinecone_api_key: str
     pinecone_environment: str = "us-east-1-aws"
     pinecone_index_name: str = "ai-assistant-index"
+    pinecone_host: Optional[str] = None  # Control plane override for local stubs
     
     # Web Search (Tavily)
     tavily_api_key: str
+    tavily_base_url: str = "https://api.tavily.com"
     
     # Server
     port: int = 8000
     environment: str = "development"
     cors_origins: str = "http://localhost:3000,http://localhost:5173"
     
+    # User profile injected into the system prompt
+    profile_max_chars: int = 800
+    profile_max_value_chars: int = 120
+    profile_cache_size: int = 10000
+    profile_cache_ttl_seconds: int = 300
+    
+    # Tool execution: max seconds to wait for a free slot in a tool's bulkhead
+    tool_queue_timeout_seconds: float = 2.0
+    # Tool results are compacted to this many tokens (estimated) for Claude
+    tool_result_max_tokens: int = 1500
+    tool_result_store_full: bool = False  # store and return uncompacted results
+    
+    # Chat admission control, per worker process (see app.services.admission)
+    admission_enabled: bool = True
+    admission_max_in_flight: int = 32  # chat turns running at once
+    admission_queue_size: int = 64  # turns waiting for a slot
+    admission_queue_timeout_seconds: float = 10.0
+    admission_user_rate_per_minute: float = 20.0  # 0 disables the rate limit
+    admission_user_burst: int = 5
+    admission_user_max_in_flight: int = 2  # 0 disables the per-user cap
+    
+    # Seconds between {"type": "ping"} frames on chat WebSockets; 0 disables
+    websocket_heartbeat_seconds: float = 20.0
+    websocket_max_in_flight: int = 2  # concurrent turns per socket; capped at admission_user_max_in_flight
+    
+    # Semantic cache of answers to general questions (see app.services.response_cache)
+    response_cache_enabled: bool = False
+    response_cache_scope: str = "user"  # or "global" to share answers between users
+    response_cache_threshold: float = 0.95
+    response_cache_ttl_seconds: float = 86400.0
+    response_cache_max_entries: int = 1000  # per scope
+    response_cache_max_question_chars: int = 500
+    
+    # Knowledge base retrieval run alongside context assembly, with the best
+    # chunks put into the prompt (saves the search_knowledge_base round trip)
+    rag_prefetch_enabled: bool = False
+    rag_prefetch_top_k: int = 4
+    rag_prefetch_min_score: float = 0.5  # chunks below this are left to the tool
+    rag_prefetch_timeout_seconds: float = 2.0
+    rag_prefetch_threads: int = 8
+    rag_has_documents_ttl_seconds: int = 300
+    
+    # Users known to exist, cached per worker
+    known_user_cache_size: int = 100000
+    
+    # Embeddings
+    embedding_backend: str = "sentence_transformers"  # or "onnx"
+    embedding_model_path: Optional[str] = None  # pre-saved model directory (python -m app.services.warmup --save-model)
+    embedding_onnx_path: Optional[str] = None  # model file from embeddings.export_onnx
+    embedding_onnx_threads: int = 0  # 0 = ONNX Runtime default
+    # Single-text requests are batched across concurrent callers
+    embedding_batching_enabled: bool = True
+    embedding_batch_max_size: int = 32  # also the most texts per forward pass for bulk encodes
+    embedding_batch_max_wait_ms: float = 5.0
+    embedding_batch_timeout_seconds: float = 30.0  # longest a caller waits for its row
+    # Shared embedding server (app.services.embeddings.server); unset = in-process
+    embedding_server_socket: Optional[str] = None
+    embedding_server_fallback: bool = True  # encode in-process when busy or down
+    embedding_server_timeout_seconds: float = 5.0  # per request; bulk encodes are split into embedding_batch_max_size texts
+    embedding_server_retry_seconds: float = 30.0  # after a failed connect
+    embedding_server_processes: int = 2
+    embedding_server_max_pending: int = 16
+    
+    # Vector storage: "pinecone", or "local" for the self-hosted quantized index
+    vector_store: str = "pinecone"
+    vector_partitioning: str = "filter"  # "namespace" (one per user) once migrate_vector_namespaces.py has run
+    local_vector_store_path: str = "vector_store"
+    vector_quantization: str = "int8"  # none, int8 or pq
+    vector_rerank_factor: int = 4  # candidates re-ranked exactly per result
+    vector_pq_subspaces: int = 48
+    vector_pq_train_size: int = 4096  # vectors needed before PQ is trained
+    vector_compact_ratio: float = 0.5  # dead rows (deletes, replacements) that trigger a local store rewrite
+    vector_upsert_batch_size: int = 100  # vectors per upsert request
+    vector_upsert_max_batch_bytes: int = 2_000_000  # Pinecone rejects requests over 2 MB
+    vector_upsert_max_in_flight: int = 4  # concurrent upsert requests per document
+    vector_upsert_max_attempts: int = 4
+    vector_upsert_backoff_base_seconds: float = 0.5
+    vector_upsert_backoff_max_seconds: float = 8.0
+    
+    # Long-term memory retention (see app.services.memory.compaction)
+    memory_duplicate_threshold: float = 0.95  # similarity treated as the same memory; 1 disables
+    memory_cluster_threshold: float = 0.8  # similarity for grouping old memories into summaries
+    memory_summary_age_days: int = 30  # memories older than this are summarized
+    memory_summary_max_chars: int = 1000
+    memory_ttl_days: int = 365  # 0 keeps memories forever
+    memory_max_per_user: int = 2000
+    memory_recency_half_life_days: float = 30.0
+    
+    # Documents with more chunks than this are deleted in a background task
+    document_delete_background_chunks: int = 200
+    
+    # Startup: create missing tables (disable where setup_database.py is run
+    # at deploy time, e.g. Lambda) and load models and connections up front
+    create_tables_on_startup: bool = True
+    warmup_on_startup: bool = True
+    
+    # Metrics (served from /metrics in Prometheus text format)
+    metrics_enabled: bool = True
+    
     # Security
     secret_key: str = "dev-secret-key-change-in-production"
     algorithm: str = "HS256"
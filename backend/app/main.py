@@ -1,12 +1,12 @@
 """Main FastAPI application."""
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.config import settings
+from app.metrics import REGISTRY
 from app.api import chat, documents
 from app.models.base import Base, engine
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from app.services.warmup import warm_up
 
 # Create FastAPI app
 app = FastAPI(
@@ -29,6 +29,16 @@ app.include_router(chat.router)
 app.include_router(documents.router)
 
 
+@app.on_event("startup")
+def startup():
+    """Create tables and warm up models and connections before serving."""
+    if settings.create_tables_on_startup:
+        Base.metadata.create_all(bind=engine)
+    if settings.warmup_on_startup:
+        timings = warm_up()
+        print("Warm-up: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -45,6 +55,17 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this worker process."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=settings.port)
@@ -3,6 +3,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.metrics import instrument_engine
 
 # Create database engine
 engine = create_engine(
@@ -10,6 +11,8 @@ engine = create_engine(
     pool_pre_ping=True,
     echo=settings.environment == "development"
 )
+if settings.metrics_enabled:
+    instrument_engine(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
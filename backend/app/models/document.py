@@ -1,5 +1,5 @@
 """Document models for knowledge base."""
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Integer, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -17,12 +17,18 @@ class Document(Base):
     file_type = Column(String(50), nullable=False)  # pdf, docx, txt, etc.
     file_size = Column(Integer, nullable=False)  # in bytes
     status = Column(String(50), default="processing")  # processing, completed, failed
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the uploaded file, set once indexed
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="documents")
     chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Finds identical re-uploads
+        Index("ix_documents_user_content_hash", "user_id", "content_hash"),
+    )
 
 
 class DocumentChunk(Base):
@@ -34,7 +40,9 @@ class DocumentChunk(Base):
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)  # Order within document
     vector_id = Column(String(500), nullable=True, unique=True)  # ID in vector database
-    metadata = Column(Text, nullable=True)  # JSON string for additional metadata
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of chunk_text
+    # "metadata" is reserved on declarative models, so the attribute is renamed
+    chunk_metadata = Column("metadata", Text, nullable=True)  # JSON string for additional metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
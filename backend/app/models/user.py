@@ -1,5 +1,5 @@
 """User and preference models."""
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -37,6 +37,8 @@ class UserPreference(Base):
     user = relationship("User", back_populates="preferences")
     
     __table_args__ = (
+        # Backs the INSERT ... ON CONFLICT upsert in PreferenceMemoryTool
+        Index("uq_user_preferences_user_key", "user_id", "key", unique=True),
         {"comment": "Stores user preferences as key-value pairs for structured memory"}
     )
 
@@ -0,0 +1,200 @@
+"""Admission control for chat requests.
+
+Every chat turn holds a worker thread and an LLM call for seconds, so
+requests are admitted before any work is done:
+
+1. Each user may have at most ``admission_user_max_in_flight`` turns
+   running at once, and starts turns at ``admission_user_rate_per_minute``
+   with bursts of ``admission_user_burst`` (token bucket). Either limit
+   rejects with 429.
+2. At most ``admission_max_in_flight`` turns run per worker process. Further
+   requests wait in a FIFO queue of ``admission_queue_size`` entries for up
+   to ``admission_queue_timeout_seconds``; a full queue or an expired wait
+   rejects with 503.
+
+Rejections carry a Retry-After estimate. State is per worker process and
+lives on the event loop, so ``admit`` must be used from async code.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+from app.config import settings
+from app.metrics import REGISTRY
+from app.services.cache import LRUCache
+
+
+ADMISSION_DECISIONS_TOTAL = REGISTRY.counter(
+    "admission_decisions_total",
+    "Chat admission decisions, by outcome (admitted, rate_limited, user_busy, queue_full, queue_timeout)",
+    ["outcome"]
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "admission_wait_seconds",
+    "Time admitted chat requests waited for a free slot"
+)
+
+
+class AdmissionRejected(Exception):
+    """A request was not admitted; maps to an HTTP status with Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-user rate and concurrency limits plus a global slot queue."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        queue_size: int,
+        queue_timeout: float,
+        user_rate_per_minute: float,
+        user_burst: int,
+        user_max_in_flight: int
+    ):
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate_per_minute / 60
+        self.user_burst = user_burst
+        self.user_max_in_flight = user_max_in_flight
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._user_in_flight: Dict[str, int] = {}
+        # Evicting an idle user's bucket only resets it to full
+        self._buckets = LRUCache(maxsize=settings.known_user_cache_size)
+
+    @asynccontextmanager
+    async def admit(self, user_id: str) -> AsyncIterator[None]:
+        """
+        Hold an admission slot for one chat turn.
+
+        Raises:
+            AdmissionRejected: If the user is over their limits or the
+                worker is saturated
+        """
+        self._check_user(user_id)
+        self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+        try:
+            await self._acquire()
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            remaining = self._user_in_flight[user_id] - 1
+            if remaining:
+                self._user_in_flight[user_id] = remaining
+            else:
+                del self._user_in_flight[user_id]
+
+    def _check_user(self, user_id: str):
+        if self.user_max_in_flight > 0 and self._user_in_flight.get(user_id, 0) >= self.user_max_in_flight:
+            ADMISSION_DECISIONS_TOTAL.inc(outcome="user_busy")
+            raise AdmissionRejected(429, "Too many concurrent requests, please wait for a reply", 1)
+
+        if self.user_rate > 0:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = TokenBucket(self.user_rate, max(1, self.user_burst))
+                self._buckets.set(user_id, bucket)
+            wait = bucket.take()
+            if wait:
+                ADMISSION_DECISIONS_TOTAL.inc(outcome="rate_limited")
+                raise AdmissionRejected(429, "Too many requests, please slow down", wait)
+
+    async def _acquire(self):
+        """Take a global slot, queueing up to the deadline if none is free."""
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            ADMISSION_DECISIONS_TOTAL.inc(outcome="admitted")
+            ADMISSION_WAIT_SECONDS.observe(0.0)
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            ADMISSION_DECISIONS_TOTAL.inc(outcome="queue_full")
+            raise AdmissionRejected(503, "Server is busy, please try again later", self.queue_timeout)
+
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # _release hands its slot over by resolving the waiter
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            # Timed out or cancelled just as a slot was handed over: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_DECISIONS_TOTAL.inc(outcome="queue_timeout")
+                raise AdmissionRejected(503, "Server is busy, please try again later", self.queue_timeout)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        ADMISSION_DECISIONS_TOTAL.inc(outcome="admitted")
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+    def _release(self):
+        """Hand the slot to the oldest live waiter, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+
+class _NoAdmission:
+    """Stand-in used when admission control is disabled."""
+
+    @asynccontextmanager
+    async def admit(self, user_id: str) -> AsyncIterator[None]:
+        yield
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller():
+    """Get the worker's admission controller (created on first use)."""
+    global _controller
+    if _controller is None:
+        if not settings.admission_enabled:
+            return _NoAdmission()
+        _controller = AdmissionController(
+            max_in_flight=settings.admission_max_in_flight,
+            queue_size=settings.admission_queue_size,
+            queue_timeout=settings.admission_queue_timeout_seconds,
+            user_rate_per_minute=settings.admission_user_rate_per_minute,
+            user_burst=settings.admission_user_burst,
+            user_max_in_flight=settings.admission_user_max_in_flight
+        )
+    return _controller
@@ -1,19 +1,92 @@
 """Core AI Assistant service with Claude integration."""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
-from anthropic import Anthropic
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from app.config import settings
+from app.services.cache import LRUCache
+from app.metrics import REGISTRY
 from app.services.tools import (
     WebSearchTool,
     CalculatorTool,
     KnowledgeBaseTool,
-    PreferenceMemoryTool
+    PreferenceMemoryTool,
+    ToolContext,
+    ToolRegistry
 )
+from app.services.tools.compaction import to_json
 from app.services.memory import LongTermMemory
+from app.services.model_router import LLM_CALL_SECONDS, ModelRouter, RoutingDecision, record_usage
+from app.services.response_cache import CacheProbe, get_response_cache
 from app.models.user import User
 from app.models.conversation import Conversation, Message
 import uuid
-import json
+
+
+CHAT_STAGE_SECONDS = REGISTRY.histogram(
+    "chat_stage_seconds",
+    "Time spent in each stage of process_message",
+    ["stage", "outcome"]
+)
+CHAT_TURNS_TOTAL = REGISTRY.counter(
+    "chat_turns_total",
+    "Chat turns processed, by outcome",
+    ["outcome"]
+)
+
+# User IDs this worker has already seen in the users table
+_known_users = LRUCache(maxsize=settings.known_user_cache_size)
+
+# Document retrieval started ahead of the first Claude call (rag_prefetch_*)
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=settings.rag_prefetch_threads,
+    thread_name_prefix="rag-prefetch"
+)
+
+
+_anthropic_client = None
+_anthropic_client_lock = threading.Lock()
+
+
+def get_anthropic_client():
+    """
+    Get the worker's shared Anthropic client.
+    
+    The SDK is imported on first use, and one client (with its connection
+    pool) serves all requests.
+    """
+    global _anthropic_client
+    if _anthropic_client is None:
+        with _anthropic_client_lock:
+            if _anthropic_client is None:
+                from anthropic import Anthropic
+                
+                _anthropic_client = Anthropic(
+                    api_key=settings.anthropic_api_key,
+                    base_url=settings.anthropic_base_url
+                )
+    return _anthropic_client
+
+
+def ensure_user(db: Session, user_id: str):
+    """
+    Create the user row if it does not exist yet.
+    
+    Users already seen by this worker cost no queries. Otherwise a single
+    INSERT ... ON CONFLICT DO NOTHING creates the row, which is also safe
+    when concurrent first requests race to create the same user.
+    """
+    if user_id in _known_users:
+        return
+    
+    db.execute(
+        insert(User)
+        .values(id=uuid.UUID(user_id))
+        .on_conflict_do_nothing(index_elements=[User.id])
+    )
+    db.commit()
+    _known_users.set(user_id, True)
 
 
 class AIAssistant:
@@ -22,7 +95,7 @@ class AIAssistant:
     def __init__(self, user_id: str, db: Session):
         self.user_id = user_id
         self.db = db
-        self.client = Anthropic(api_key=settings.anthropic_api_key)
+        self.client = get_anthropic_client()
         
         # Initialize tools
         self.web_search = WebSearchTool()
@@ -30,19 +103,19 @@ class AIAssistant:
         self.knowledge_base = KnowledgeBaseTool()
         self.preference_memory = PreferenceMemoryTool()
         self.long_term_memory = LongTermMemory()
+        self.router = ModelRouter()
         
-        # Get or create user
-        self.user = self._get_or_create_user()
-    
-    def _get_or_create_user(self) -> User:
-        """Get existing user or create new one."""
-        user = self.db.query(User).filter(User.id == uuid.UUID(self.user_id)).first()
-        if not user:
-            user = User(id=uuid.UUID(self.user_id))
-            self.db.add(user)
-            self.db.commit()
-            self.db.refresh(user)
-        return user
+        # Register tools exposed to Claude
+        self.tools = ToolRegistry(ToolContext(user_id=user_id, db=db))
+        self.tools.register(
+            *self.web_search.get_tool_specs(),
+            *self.calculator.get_tool_specs(),
+            *self.knowledge_base.get_tool_specs(),
+            *self.preference_memory.get_tool_specs()
+        )
+        
+        # Make sure the user row exists
+        ensure_user(self.db, self.user_id)
     
     def get_conversation_history(self, conversation_id: str, limit: int = 20) -> List[Dict[str, str]]:
         """Get conversation history for context."""
@@ -62,9 +135,17 @@ class AIAssistant:
         
         return history
     
-    def get_system_prompt(self) -> str:
-        """Generate system prompt with available tools."""
-        return """You are a helpful, intelligent AI assistant with access to various tools and capabilities.
+    def get_system_prompt(self, profile: Optional[str] = None) -> str:
+        """
+        Generate system prompt with available tools.
+        
+        Args:
+            profile: Rendered user preferences (see PreferenceMemoryTool.get_profile)
+            
+        Returns:
+            System prompt text
+        """
+        prompt = """You are a helpful, intelligent AI assistant with access to various tools and capabilities.
 
 You can help users with:
 1. Answering questions using your knowledge
@@ -78,60 +159,84 @@ When a user asks a question:
 - If it requires current/recent information → use web_search
 - If it requires math → use calculator
 - If it's about their documents → use search_knowledge_base
-- If they share personal info → use save_preference
+- If they share personal info → use save_preference (or save_preferences for several facts at once)
 - If you need to recall something about them → use get_preference
 
 Be conversational, helpful, and proactive. Remember user preferences and use them to personalize responses."""
+        
+        if profile:
+            prompt += f"""
+
+What you already know about this user (saved preferences):
+{profile}
+
+Use these directly. Only call get_preference for information not listed here."""
+        
+        return prompt
     
     def get_tools(self) -> List[Dict[str, Any]]:
         """Get all available tool definitions."""
-        return [
-            self.web_search.get_tool_definition(),
-            self.calculator.get_tool_definition(),
-            self.knowledge_base.get_tool_definition(),
-            self.preference_memory.get_tool_definition(),
-            self.preference_memory.get_save_tool_definition(),
-        ]
+        return self.tools.get_definitions()
     
     def execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a tool call."""
-        if tool_name == "web_search":
-            return self.web_search.search(
-                query=tool_input.get("query", ""),
-                max_results=tool_input.get("max_results", 5)
-            )
+        """Execute a tool call within its registered timeout and concurrency limit."""
+        return self.tools.execute(tool_name, tool_input)
+    
+    @staticmethod
+    def build_messages(
+        message: str,
+        history: List[Dict[str, str]],
+        relevant_memories: List[str],
+        document_excerpts: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the message list sent to Claude.
         
-        elif tool_name == "calculator":
-            return self.calculator.calculate(
-                expression=tool_input.get("expression", "")
-            )
+        Args:
+            message: Current user message
+            history: Conversation history in chronological order
+            relevant_memories: Texts of relevant past conversations
+            document_excerpts: Prefetched knowledge base results to include
+                with the current message
+            
+        Returns:
+            Messages for messages.create
+        """
+        messages = []
         
-        elif tool_name == "search_knowledge_base":
-            return self.knowledge_base.search(
-                query=tool_input.get("query", ""),
-                user_id=self.user_id,
-                top_k=tool_input.get("top_k", 5)
-            )
+        # Add relevant memories if any
+        if relevant_memories:
+            memory_context = "\n\nRelevant past conversations:\n" + "\n".join(f"- {m}" for m in relevant_memories)
+            messages.append({
+                "role": "user",
+                "content": memory_context
+            })
         
-        elif tool_name == "get_preference":
-            value = self.preference_memory.get_preference(
-                user_id=self.user_id,
-                key=tool_input.get("key", ""),
-                db=self.db
-            )
-            return {"key": tool_input.get("key", ""), "value": value}
+        # Add conversation history
+        for msg in history[-10:]:  # Last 10 messages for context
+            messages.append({
+                "role": msg["role"],
+                "content": msg["content"]
+            })
         
-        elif tool_name == "save_preference":
-            success = self.preference_memory.save_preference(
-                user_id=self.user_id,
-                key=tool_input.get("key", ""),
-                value=tool_input.get("value", ""),
-                db=self.db
+        # Add current message, preceded by any prefetched document excerpts
+        content = message
+        if document_excerpts:
+            excerpts = "\n\n".join(
+                f"[{excerpt.get('source') or 'document'}, chunk {excerpt.get('chunk_index', 0)}]\n{excerpt['text']}"
+                for excerpt in document_excerpts
+            )
+            content = (
+                "Excerpts from my uploaded documents that may be relevant "
+                "(search_knowledge_base can find more):\n\n"
+                f"{excerpts}\n\n{message}"
             )
-            return {"success": success, "key": tool_input.get("key", ""), "value": tool_input.get("value", "")}
+        messages.append({
+            "role": "user",
+            "content": content
+        })
         
-        else:
-            return {"error": f"Unknown tool: {tool_name}"}
+        return messages
     
     def process_message(
         self,
@@ -150,55 +255,90 @@ Be conversational, helpful, and proactive. Remember user preferences and use the
         Returns:
             Response dictionary with assistant message and metadata
         """
+        with CHAT_STAGE_SECONDS.time(stage="total") as labels:
+            result = self._process_message(message, conversation_id, include_memories)
+            labels["outcome"] = "error" if "error" in result else "ok"
+        CHAT_TURNS_TOTAL.inc(outcome=labels["outcome"])
+        return result
+    
+    def _process_message(
+        self,
+        message: str,
+        conversation_id: str,
+        include_memories: bool
+    ) -> Dict[str, Any]:
+        """Run one chat turn; see process_message."""
+        # Embed the message once for the cache, document prefetch and memory search
+        prefetch_documents = self._should_prefetch_documents()
+        query_embedding = None
+        if include_memories or prefetch_documents or get_response_cache() is not None:
+            query_embedding = self._embed_message(message)
+        
+        # Retrieve document chunks while the rest of the context is assembled
+        documents_future = None
+        if prefetch_documents:
+            documents_future = _prefetch_executor.submit(
+                self.knowledge_base.search,
+                message,
+                self.user_id,
+                settings.rag_prefetch_top_k,
+                query_embedding
+            )
+        
         # Get conversation history
-        history = self.get_conversation_history(conversation_id)
+        with CHAT_STAGE_SECONDS.time(stage="history"):
+            history = self.get_conversation_history(conversation_id)
+        
+        # Repeated general questions are answered from the semantic cache
+        probe = self._probe_response_cache(message, history, query_embedding)
+        if probe is not None and probe.answer is not None:
+            if documents_future is not None:
+                documents_future.cancel()
+            if include_memories:
+                self._remember(message, probe.answer, conversation_id)
+            return {
+                "response": probe.answer,
+                "tool_calls": [],
+                "conversation_id": conversation_id,
+                "cached": True
+            }
         
         # Optionally search for relevant past memories
         relevant_memories = []
         if include_memories:
-            memories = self.long_term_memory.search_memories(
-                user_id=self.user_id,
-                query=message,
-                top_k=3
-            )
+            with CHAT_STAGE_SECONDS.time(stage="memory_search"):
+                memories = self.long_term_memory.search_memories(
+                    user_id=self.user_id,
+                    query=message,
+                    top_k=3,
+                    query_embedding=query_embedding
+                )
             relevant_memories = [m["text"] for m in memories if m["score"] > 0.7]
         
-        # Build messages for Claude
-        messages = []
+        # Relevant document chunks go straight into the prompt, so document
+        # questions usually need no search_knowledge_base round trip
+        document_excerpts = self._collect_prefetched_documents(documents_future)
         
-        # Add relevant memories if any
-        if relevant_memories:
-            memory_context = "\n\nRelevant past conversations:\n" + "\n".join(f"- {m}" for m in relevant_memories)
-            messages.append({
-                "role": "user",
-                "content": memory_context
-            })
-        
-        # Add conversation history
-        for msg in history[-10:]:  # Last 10 messages for context
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        
-        # Add current message
-        messages.append({
-            "role": "user",
-            "content": message
-        })
+        # Build messages for Claude
+        messages = self.build_messages(message, history, relevant_memories, document_excerpts)
         
         # Call Claude with function calling
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",  # Claude 3.5 Sonnet
-                max_tokens=4096,
-                system=self.get_system_prompt(),
-                messages=messages,
-                tools=self.get_tools()
-            )
+            with CHAT_STAGE_SECONDS.time(stage="profile"):
+                profile = self.preference_memory.get_profile(self.user_id, self.db)
+            system_prompt = self.get_system_prompt(profile=profile)
+            with CHAT_STAGE_SECONDS.time(stage="llm_first"):
+                response = self._create_message(
+                    "first",
+                    self.router.route_first(message, document_excerpts),
+                    system=system_prompt,
+                    messages=messages,
+                    tools=self.get_tools()
+                )
             
             # Handle tool calls if any
             tool_results = []
+            tool_payloads = []  # compact JSON of each result, sent to Claude
             final_response = None
             tool_use_blocks = []
             
@@ -208,43 +348,55 @@ Be conversational, helpful, and proactive. Remember user preferences and use the
                     final_response = content_block.text
                 elif content_block.type == "tool_use":
                     tool_use_blocks.append(content_block)
-                    # Execute tool
-                    tool_result = self.execute_tool(
-                        tool_name=content_block.name,
-                        tool_input=content_block.input
-                    )
-                    tool_results.append({
-                        "tool_use_id": content_block.id,
-                        "tool": content_block.name,
-                        "input": content_block.input,
-                        "result": tool_result
-                    })
+            
+            # Execute tools
+            if tool_use_blocks:
+                with CHAT_STAGE_SECONDS.time(stage="tools"):
+                    for content_block in tool_use_blocks:
+                        tool_result = self.execute_tool(
+                            tool_name=content_block.name,
+                            tool_input=content_block.input
+                        )
+                        compact_result = self.tools.compact(content_block.name, tool_result)
+                        tool_results.append({
+                            "tool_use_id": content_block.id,
+                            "tool": content_block.name,
+                            "input": content_block.input,
+                            "result": tool_result if settings.tool_result_store_full else compact_result
+                        })
+                        tool_payloads.append(to_json(compact_result))
             
             # If tools were called, send results back to Claude for final response
             if tool_results:
                 # Build tool result messages
                 tool_result_messages = []
-                for tool_result in tool_results:
+                for tool_result, payload in zip(tool_results, tool_payloads):
                     tool_result_messages.append({
                         "type": "tool_result",
                         "tool_use_id": tool_result["tool_use_id"],
-                        "content": json.dumps(tool_result["result"], indent=2)
+                        "content": payload
                     })
                 
-                # Append assistant message with tool use and tool results
+                # Append assistant message with tool use, then the tool results
+                # as the content of the next user message
                 messages.append({
                     "role": "assistant",
                     "content": response.content
                 })
-                messages.extend(tool_result_messages)
+                messages.append({
+                    "role": "user",
+                    "content": tool_result_messages
+                })
                 
                 # Get final response with tool results
-                final_response_obj = self.client.messages.create(
-                    model="claude-3-5-sonnet-20241022",
-                    max_tokens=4096,
-                    system=self.get_system_prompt(),
-                    messages=messages
-                )
+                result_chars = sum(len(result["content"]) for result in tool_result_messages)
+                with CHAT_STAGE_SECONDS.time(stage="llm_second"):
+                    final_response_obj = self._create_message(
+                        "second",
+                        self.router.route_second(tool_results, result_chars),
+                        system=system_prompt,
+                        messages=messages
+                    )
                 
                 # Extract final text response
                 final_response = None
@@ -252,14 +404,17 @@ Be conversational, helpful, and proactive. Remember user preferences and use the
                     if content_block.type == "text":
                         final_response = content_block.text
             
+            # Answers that used no tools, memories or documents can be reused;
+            # the response cache relies on never holding document-grounded answers
+            if (
+                probe is not None and final_response
+                and not tool_results and not relevant_memories and not document_excerpts
+            ):
+                get_response_cache().store(probe, final_response)
+            
             # Store memory of this interaction
             if include_memories:
-                memory_text = f"User: {message}\nAssistant: {final_response}"
-                self.long_term_memory.store_memory(
-                    user_id=self.user_id,
-                    conversation_text=memory_text,
-                    metadata={"conversation_id": conversation_id}
-                )
+                self._remember(message, final_response, conversation_id)
             
             return {
                 "response": final_response or "I apologize, but I couldn't generate a response.",
@@ -273,4 +428,84 @@ Be conversational, helpful, and proactive. Remember user preferences and use the
                 "response": "I'm sorry, I encountered an error processing your message. Please try again.",
                 "conversation_id": conversation_id
             }
-
+    
+    def _create_message(self, call: str, decision: RoutingDecision, **kwargs):
+        """Call messages.create with the routed model, recording latency and tokens."""
+        with LLM_CALL_SECONDS.time(call=call, model=decision.model):
+            response = self.client.messages.create(
+                model=decision.model,
+                max_tokens=4096,
+                **kwargs
+            )
+        record_usage(call, decision.model, response)
+        return response
+    
+    def _embed_message(self, message: str) -> Optional[List[float]]:
+        """Embed the user message (None on failure; consumers then embed it themselves)."""
+        try:
+            with CHAT_STAGE_SECONDS.time(stage="embed"):
+                return self.long_term_memory.embedder.encode_one(message)
+        except Exception as e:
+            print(f"Warning: embedding the message failed: {e}")
+            return None
+    
+    def _should_prefetch_documents(self) -> bool:
+        """Whether to retrieve document chunks before the first Claude call."""
+        if not settings.rag_prefetch_enabled:
+            return False
+        try:
+            return self.knowledge_base.has_documents(self.user_id, self.db)
+        except Exception as e:
+            print(f"Warning: document check failed: {e}")
+            return False
+    
+    def _collect_prefetched_documents(self, future: Optional[Future]) -> List[Dict[str, Any]]:
+        """Wait for prefetched knowledge base results and keep the relevant ones."""
+        if future is None:
+            return []
+        try:
+            with CHAT_STAGE_SECONDS.time(stage="document_prefetch_wait"):
+                results = future.result(timeout=settings.rag_prefetch_timeout_seconds)
+        except Exception as e:
+            print(f"Warning: document prefetch failed: {e}")
+            return []
+        return [
+            result for result in results.get("results", [])
+            if result["score"] >= settings.rag_prefetch_min_score
+        ]
+    
+    def _probe_response_cache(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        query_embedding: Optional[List[float]] = None
+    ) -> Optional[CacheProbe]:
+        """Look the message up in the response cache (None if disabled or bypassed)."""
+        cache = get_response_cache()
+        if cache is None:
+            return None
+        try:
+            with CHAT_STAGE_SECONDS.time(stage="response_cache"):
+                # Answers must not depend on history or saved preferences
+                profile = "" if history else self.preference_memory.get_profile(self.user_id, self.db)
+                return cache.probe(
+                    user_id=self.user_id,
+                    message=message,
+                    system_prompt=self.get_system_prompt(),
+                    contextual=bool(history or profile),
+                    embedding=query_embedding
+                )
+        except Exception as e:
+            print(f"Warning: response cache lookup failed: {e}")
+            return None
+    
+    def _remember(self, message: str, response: Optional[str], conversation_id: str):
+        """Store this interaction in long-term memory."""
+        memory_text = f"User: {message}\nAssistant: {response}"
+        with CHAT_STAGE_SECONDS.time(stage="store_memory") as labels:
+            stored = self.long_term_memory.store_memory(
+                user_id=self.user_id,
+                conversation_text=memory_text,
+                metadata={"conversation_id": conversation_id}
+            )
+            labels["outcome"] = "ok" if stored else "error"
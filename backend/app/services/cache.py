@@ -0,0 +1,83 @@
+"""Small in-process caches shared by services."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with optional per-entry TTL.
+
+    Entries live in the worker process only; with several workers, each keeps
+    its own copy, so the TTL bounds how stale a cross-worker write can be.
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key and return its value (default if not cached)."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry is not None else default
+    
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._data.clear()
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+_MISSING = object()
+
+
+# Callbacks run when a user's documents change (upload, replace, delete), so
+# caches built from retrieval results can drop that user's entries. They run
+# in the worker that made the change; other workers rely on their TTLs.
+_document_listeners: List[Callable[[str], None]] = []
+
+
+def on_documents_changed(listener: Callable[[str], None]) -> Callable[[str], None]:
+    """Register a callback taking the user ID; usable as a decorator."""
+    _document_listeners.append(listener)
+    return listener
+
+
+def documents_changed(user_id: str):
+    """Notify listeners that a user's documents were added, replaced or removed."""
+    for listener in _document_listeners:
+        try:
+            listener(user_id)
+        except Exception as e:
+            print(f"Warning: document change listener failed: {e}")
@@ -0,0 +1,104 @@
+"""Shared embedding model with dynamic micro-batching.
+
+Use ``get_embedder()`` instead of loading a model per service: the model is
+loaded once per worker process and single-text calls from concurrent
+requests are encoded together (see ``batcher``). The backend is chosen by
+``settings.embedding_backend`` (PyTorch sentence-transformers, or the same
+model on ONNX Runtime; see ``export_onnx``). With
+``settings.embedding_server_socket`` set, encoding is delegated to the
+shared embedding server (see ``server``) and done in-process only as a
+fallback.
+
+In a forked worker (e.g. gunicorn with ``preload_app``, see
+``gunicorn.conf.py``) an embedder loaded by the master is reused: its
+weights stay shared copy-on-write and only threads, locks and connections
+are recreated.
+"""
+import os
+import threading
+from functools import partial
+from typing import List, Optional
+import numpy as np
+from app.config import settings
+from .backends import EMBEDDING_DIMENSION, create_backend
+from .batcher import EmbeddingBatcher
+from .client import RemoteBackend
+
+
+class Embedder:
+    """Front end used by services to compute embeddings."""
+
+    def __init__(self, backend, batcher: Optional[EmbeddingBatcher] = None):
+        self.backend = backend
+        self.batcher = batcher
+
+    def encode_one(self, text: str) -> List[float]:
+        """Embed one text (batched with concurrent callers when enabled)."""
+        if self.batcher is not None:
+            return self.batcher.encode_one(text).tolist()
+        return self.backend.encode([text])[0].tolist()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed many texts (e.g. document chunks) in capped forward passes."""
+        return self.backend.encode(list(texts))
+
+    def reset_after_fork(self):
+        """Recreate per-process state (threads, locks, sockets) in a forked child."""
+        if self.batcher is not None:
+            self.batcher.reset_after_fork()
+        if hasattr(self.backend, "reset_after_fork"):
+            self.backend.reset_after_fork()
+
+
+_embedder: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    """Get the worker's shared embedder, loading the model on first use."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                local_backend = partial(
+                    create_backend,
+                    settings.embedding_backend,
+                    onnx_path=settings.embedding_onnx_path,
+                    num_threads=settings.embedding_onnx_threads,
+                    model_path=settings.embedding_model_path,
+                    batch_size=settings.embedding_batch_max_size
+                )
+                if settings.embedding_server_socket:
+                    backend = RemoteBackend(
+                        settings.embedding_server_socket,
+                        fallback_factory=local_backend if settings.embedding_server_fallback else None,
+                        timeout=settings.embedding_server_timeout_seconds,
+                        retry_after=settings.embedding_server_retry_seconds,
+                        max_texts=settings.embedding_batch_max_size
+                    )
+                else:
+                    backend = local_backend()
+                batcher = None
+                if settings.embedding_batching_enabled:
+                    batcher = EmbeddingBatcher(
+                        backend,
+                        max_batch_size=settings.embedding_batch_max_size,
+                        max_wait_ms=settings.embedding_batch_max_wait_ms,
+                        timeout=settings.embedding_batch_timeout_seconds
+                    )
+                _embedder = Embedder(backend, batcher)
+    return _embedder
+
+
+def _after_fork_in_child():
+    global _embedder_lock
+    _embedder_lock = threading.Lock()
+    if _embedder is not None:
+        _embedder.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+__all__ = ["EMBEDDING_DIMENSION", "Embedder", "EmbeddingBatcher", "get_embedder"]
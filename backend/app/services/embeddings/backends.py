@@ -0,0 +1,134 @@
+"""Embedding model backends.
+
+A backend turns a list of texts into a 2-D float32 array of embeddings, one
+row per text. Backends must be safe to call from several threads.
+"""
+import os
+from typing import List, Optional
+import numpy as np
+
+
+# all-MiniLM-L6-v2 output size; the Pinecone indexes are created with it
+EMBEDDING_DIMENSION = 384
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+# Longest input the model was trained with; longer texts are truncated
+MAX_SEQUENCE_LENGTH = 256
+# Texts per forward pass: every text in a pass is padded to the longest one,
+# so bulk encodes (whole documents) are split rather than run as one pass
+DEFAULT_BATCH_SIZE = 32
+
+
+class SentenceTransformerBackend:
+    """Embeddings from a sentence-transformers model running in-process."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, batch_size: int = DEFAULT_BATCH_SIZE):
+        # Imported here so importing the package does not load torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.model = SentenceTransformer(model_name)
+        # Inference only: no autograd state is ever written next to the
+        # weights, so workers forked after loading keep sharing their pages
+        self.model.eval()
+        self.model.requires_grad_(False)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in forward passes of at most ``batch_size`` texts."""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        batch_size = min(len(texts), self.batch_size)
+        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+class OnnxBackend:
+    """The same model exported to ONNX and run with ONNX Runtime on CPU.
+
+    ``model_path`` is an ONNX file written by ``export_onnx`` (float32 or
+    int8-quantised); ``tokenizer.json`` must sit next to it. Outputs match
+    sentence-transformers: mean pooling over the attention mask followed by
+    L2 normalisation.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = 0, batch_size: int = DEFAULT_BATCH_SIZE):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.batch_size = max(1, batch_size)
+
+        tokenizer_path = os.path.join(os.path.dirname(os.path.abspath(model_path)), "tokenizer.json")
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQUENCE_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1] or EMBEDDING_DIMENSION
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in runs of at most ``batch_size`` texts."""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        texts = list(texts)
+        return np.concatenate([
+            self._encode_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        # Padded to the longest text of this batch only
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        inputs = {name: value for name, value in inputs.items() if name in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real (non-padding) tokens
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def create_backend(
+    name: str,
+    onnx_path: Optional[str] = None,
+    num_threads: int = 0,
+    model_path: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE
+):
+    """
+    Create an embedding backend by name.
+
+    Args:
+        name: "sentence_transformers" or "onnx"
+        onnx_path: ONNX model file, required for the onnx backend
+        num_threads: ONNX Runtime intra-op threads (0 = runtime default)
+        model_path: Directory with a saved sentence-transformers model, used
+            instead of downloading DEFAULT_MODEL_NAME
+        batch_size: Most texts per forward pass
+    """
+    if name == "sentence_transformers":
+        return SentenceTransformerBackend(model_path or DEFAULT_MODEL_NAME, batch_size=batch_size)
+    if name == "onnx":
+        if not onnx_path:
+            raise ValueError("embedding_onnx_path must be set to use the onnx embedding backend")
+        return OnnxBackend(onnx_path, num_threads=num_threads, batch_size=batch_size)
+    raise ValueError(f"Unknown embedding backend: {name}")
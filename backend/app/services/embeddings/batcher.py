@@ -0,0 +1,115 @@
+"""Dynamic micro-batching of embedding requests.
+
+Single-text encode calls from concurrent requests are collected for up to
+``max_wait_ms`` (or until ``max_batch_size`` texts are queued), encoded as
+one batch by a background thread, and the rows are handed back to the
+waiting callers. The transformer's per-batch cost on CPU grows much slower
+than linearly with batch size, so under concurrency this trades a few
+milliseconds of queueing for much higher throughput.
+
+Callers wait at most ``timeout`` seconds for their row, so a stuck or
+dead batch thread cannot hold request threads forever.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Tuple
+import numpy as np
+from app.metrics import REGISTRY
+
+
+EMBEDDING_BATCH_SIZE = REGISTRY.histogram(
+    "embedding_batch_size",
+    "Number of texts encoded per embedding batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+EMBEDDING_BATCH_SECONDS = REGISTRY.histogram(
+    "embedding_batch_seconds",
+    "Time to encode one embedding batch",
+    ["outcome"]
+)
+
+
+class EmbeddingBatcher:
+    """Collects encode requests from many threads into batches."""
+
+    def __init__(self, backend, max_batch_size: int = 32, max_wait_ms: float = 5.0, timeout: float = 30.0):
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the future resolves to its embedding row."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode_one(self, text: str) -> np.ndarray:
+        """Encode one text, batched with any concurrent callers."""
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Embedding not ready after {self.timeout:.1f}s")
+
+    def reset_after_fork(self):
+        """Drop the parent's queue, lock and thread in a forked child."""
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="embedding-batcher",
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        """Block for the first request, then gather more until full or the wait expires."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Drop requests whose callers have gone away
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            EMBEDDING_BATCH_SIZE.observe(len(batch))
+            try:
+                with EMBEDDING_BATCH_SECONDS.time():
+                    embeddings = self.backend.encode([text for text, _ in batch])
+                if len(embeddings) != len(batch):
+                    raise RuntimeError(f"Embedding backend returned {len(embeddings)} rows for {len(batch)} texts")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
@@ -0,0 +1,133 @@
+"""Embedding backend that delegates to the shared embedding server."""
+import socket
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from app.metrics import REGISTRY
+from app.services.embeddings import protocol
+from app.services.embeddings.backends import EMBEDDING_DIMENSION
+
+
+EMBEDDING_REMOTE_REQUESTS = REGISTRY.counter(
+    "embedding_remote_requests_total",
+    "Encode requests sent to the embedding server, by outcome",
+    ["outcome"]
+)
+
+
+class RemoteBackend:
+    """Backend that encodes through the embedding server.
+
+    Falls back to an in-process backend (created on first need) when the
+    server replies busy, when a request fails, or when it cannot be reached.
+    Only a failed connect marks the server down: it is then not retried for
+    ``retry_after`` seconds, so an outage costs one failed connect per worker
+    rather than one per request. A slow or dropped response only affects
+    that request. Bulk encodes are sent as requests of at most ``max_texts``
+    texts, so each one fits in ``timeout``.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        fallback_factory: Optional[Callable[[], object]] = None,
+        timeout: float = 5.0,
+        retry_after: float = 30.0,
+        max_texts: int = 32
+    ):
+        self.socket_path = socket_path
+        self.fallback_factory = fallback_factory
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.max_texts = max(1, max_texts)
+        self._local = threading.local()
+        self._down_until = 0.0
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts on the server, or in-process if it is unavailable."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        batches = []
+        for start in range(0, len(texts), self.max_texts):
+            rows, reason = self._encode_remotely(texts[start:start + self.max_texts])
+            if rows is None:
+                # Encode the rest here rather than wait on the server again
+                batches.append(self._encode_locally(texts[start:], reason))
+                break
+            batches.append(rows)
+        return batches[0] if len(batches) == 1 else np.concatenate(batches)
+
+    def _encode_remotely(self, texts: List[str]) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        """One request to the server: (rows, None), or (None, reason to fall back)."""
+        if time.monotonic() < self._down_until:
+            return None, "unavailable"
+
+        try:
+            sock = self._connection()
+        except OSError as e:
+            self._down_until = time.monotonic() + self.retry_after
+            print(f"Warning: embedding server unavailable ({e}); encoding in-process for {self.retry_after:g}s")
+            return None, "unavailable"
+        try:
+            status, result = self._request(sock, texts)
+        except OSError as e:
+            # A slow or dropped reply: the connection may hold half a frame,
+            # so reconnect next time, but keep using the server
+            self._close()
+            print(f"Warning: embedding server request failed ({e}); encoding in-process")
+            return None, "failed"
+
+        if status == protocol.STATUS_OK:
+            EMBEDDING_REMOTE_REQUESTS.inc(outcome="ok")
+            return result, None
+        if status == protocol.STATUS_BUSY:
+            return None, "busy"
+        EMBEDDING_REMOTE_REQUESTS.inc(outcome="error")
+        raise RuntimeError(f"Embedding server error: {result}")
+
+    def reset_after_fork(self):
+        """Forget the parent's connections and locks in a forked child."""
+        # A socket inherited from the parent must not be shared with it
+        self._local = threading.local()
+        self._fallback_lock = threading.Lock()
+        if self._fallback is not None and hasattr(self._fallback, "reset_after_fork"):
+            self._fallback.reset_after_fork()
+
+    def _request(self, sock: socket.socket, texts: List[str]):
+        protocol.send_frame(sock, protocol.encode_request(texts))
+        return protocol.decode_response(protocol.recv_frame(sock))
+
+    def _connection(self) -> socket.socket:
+        """Per-thread persistent connection to the server."""
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _encode_locally(self, texts: List[str], reason: str) -> np.ndarray:
+        if self.fallback_factory is None:
+            EMBEDDING_REMOTE_REQUESTS.inc(outcome=reason)
+            raise RuntimeError(f"Embedding server {reason} and in-process fallback is disabled")
+        EMBEDDING_REMOTE_REQUESTS.inc(outcome=f"fallback_{reason}")
+        if self._fallback is None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    self._fallback = self.fallback_factory()
+        return self._fallback.encode(texts)
@@ -0,0 +1,75 @@
+"""Export the embedding model to ONNX, optionally quantised to int8.
+
+Run from backend/ (needs torch, sentence-transformers and onnxruntime):
+
+    python -m app.services.embeddings.export_onnx --output models/minilm
+    python -m app.services.embeddings.export_onnx --output models/minilm --quantize
+
+Writes model.onnx (and model.int8.onnx with --quantize) plus tokenizer.json.
+Point EMBEDDING_ONNX_PATH at either model file and set
+EMBEDDING_BACKEND=onnx.
+"""
+import argparse
+import os
+from app.services.embeddings.backends import DEFAULT_MODEL_NAME
+
+
+def export(output_dir: str, model_name: str = DEFAULT_MODEL_NAME, quantize: bool = False) -> str:
+    """
+    Export the transformer of a sentence-transformers model to ONNX.
+
+    Only the transformer is exported; pooling and normalisation run in
+    OnnxBackend so the graph stays a plain token-embedding model.
+
+    Returns:
+        Path of the exported (or quantised) model file
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(output_dir)  # writes tokenizer.json for fast tokenizers
+
+    sample = tokenizer(["example sentence"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    print(f"Exported {model_name} to {model_path}")
+
+    if not quantize:
+        return model_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = os.path.join(output_dir, "model.int8.onnx")
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    print(f"Quantized to int8: {quantized_path}")
+    return quantized_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX")
+    parser.add_argument("--output", required=True, help="Directory for model and tokenizer files")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="sentence-transformers model name")
+    parser.add_argument("--quantize", action="store_true", help="Also write an int8-quantized model")
+    args = parser.parse_args()
+    export(args.output, args.model, args.quantize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Wire format between web workers and the embedding server.
+
+Every message is a frame: a 4-byte big-endian payload length followed by
+the payload. Requests are JSON ``{"texts": [...]}``. Responses start with a
+12-byte header of three little-endian uint32 values (status, rows, dim);
+for ``STATUS_OK`` the rest is the float32 embedding matrix in row-major
+order, otherwise it is a UTF-8 message. The 12-byte header keeps the
+matrix 4-byte aligned so the client can wrap it with ``np.frombuffer``
+without copying.
+"""
+import json
+import socket
+import struct
+from typing import List, Tuple
+import numpy as np
+
+
+STATUS_OK = 0
+STATUS_BUSY = 1
+STATUS_ERROR = 2
+
+_LENGTH = struct.Struct(">I")
+_HEADER = struct.Struct("<III")
+# Guard against garbage lengths from a broken peer
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytearray:
+    """Read exactly size bytes into a new buffer."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return buffer
+
+
+def recv_frame(sock: socket.socket) -> bytearray:
+    """Read one frame's payload."""
+    (length,) = _LENGTH.unpack(recv_exact(sock, _LENGTH.size))
+    if length > MAX_FRAME_BYTES:
+        raise ConnectionError(f"Frame too large: {length} bytes")
+    return recv_exact(sock, length)
+
+
+def send_frame(sock: socket.socket, *parts: bytes):
+    """Send one frame made of the given payload parts."""
+    length = sum(len(part) for part in parts)
+    sock.sendall(_LENGTH.pack(length))
+    for part in parts:
+        sock.sendall(part)
+
+
+def encode_request(texts: List[str]) -> bytes:
+    return json.dumps({"texts": texts}).encode("utf-8")
+
+
+def decode_request(payload: bytes) -> List[str]:
+    texts = json.loads(bytes(payload).decode("utf-8"))["texts"]
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise ValueError("texts must be a list of strings")
+    return texts
+
+
+def send_embeddings(sock: socket.socket, embeddings: np.ndarray):
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    rows, dim = matrix.shape
+    send_frame(sock, _HEADER.pack(STATUS_OK, rows, dim), memoryview(matrix).cast("B"))
+
+
+def send_status(sock: socket.socket, status: int, message: str):
+    send_frame(sock, _HEADER.pack(status, 0, 0), message.encode("utf-8"))
+
+
+def decode_response(payload: bytearray) -> Tuple[int, object]:
+    """
+    Parse a response payload.
+
+    Returns:
+        (STATUS_OK, embedding matrix viewing the payload buffer) or
+        (status, message)
+    """
+    status, rows, dim = _HEADER.unpack_from(payload)
+    if status != STATUS_OK:
+        return status, bytes(payload[_HEADER.size:]).decode("utf-8", "replace")
+    matrix = np.frombuffer(payload, dtype=np.float32, offset=_HEADER.size, count=rows * dim)
+    return status, matrix.reshape(rows, dim)
@@ -0,0 +1,148 @@
+"""Embedding server shared by all web workers on a host.
+
+Runs the embedding model in a pool of processes, outside the web workers'
+GIL, so each host holds ``--processes`` copies of the weights instead of
+one per web worker. Web workers connect over a Unix socket (see
+``protocol`` and ``client``). When every process is busy and
+``--max-pending`` requests are already queued, new requests get a busy
+reply straight away and the caller encodes in-process instead.
+
+Run from backend/:
+
+    python -m app.services.embeddings.server --socket /tmp/ai-assistant-embeddings.sock
+
+then set EMBEDDING_SERVER_SOCKET to the same path for the web workers.
+"""
+import argparse
+import multiprocessing
+import os
+import socketserver
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import numpy as np
+from app.config import settings
+from app.services.embeddings import protocol
+from app.services.embeddings.backends import create_backend
+
+
+# Per pool process
+_backend = None
+
+
+def _init_process(
+    backend_name: str,
+    onnx_path: Optional[str],
+    num_threads: int,
+    model_path: Optional[str],
+    batch_size: int
+):
+    global _backend
+    _backend = create_backend(
+        backend_name,
+        onnx_path=onnx_path,
+        num_threads=num_threads,
+        model_path=model_path,
+        batch_size=batch_size
+    )
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return _backend.encode(texts)
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server dispatching encode requests to a process pool."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, processes: int, max_pending: int):
+        self.socket_path = socket_path
+        self.pool = ProcessPoolExecutor(
+            max_workers=processes,
+            # Fresh interpreters: the server's threads and torch do not mix with fork
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+            initargs=(
+                settings.embedding_backend,
+                settings.embedding_onnx_path,
+                settings.embedding_onnx_threads,
+                settings.embedding_model_path,
+                settings.embedding_batch_max_size
+            )
+        )
+        # Requests running or queued in the pool
+        self.slots = threading.BoundedSemaphore(processes + max_pending)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+
+    def warm_up(self, processes: int):
+        """Load the model in every pool process before accepting requests."""
+        futures = [self.pool.submit(_encode, ["warm up"]) for _ in range(processes)]
+        for future in futures:
+            future.result()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Serves frames on one client connection until it closes."""
+
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                payload = protocol.recv_frame(sock)
+            except ConnectionError:
+                return
+
+            try:
+                texts = protocol.decode_request(payload)
+            except Exception as e:
+                protocol.send_status(sock, protocol.STATUS_ERROR, f"Bad request: {e}")
+                continue
+
+            if not self.server.slots.acquire(blocking=False):
+                protocol.send_status(sock, protocol.STATUS_BUSY, "Embedding server is busy")
+                continue
+            try:
+                embeddings = self.server.pool.submit(_encode, texts).result()
+            except Exception as e:
+                protocol.send_status(sock, protocol.STATUS_ERROR, f"Encoding failed: {e}")
+                continue
+            finally:
+                self.server.slots.release()
+            protocol.send_embeddings(sock, embeddings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding server for web workers")
+    parser.add_argument("--socket", default=settings.embedding_server_socket,
+                        help="Unix socket path (default: EMBEDDING_SERVER_SOCKET)")
+    parser.add_argument("--processes", type=int, default=settings.embedding_server_processes,
+                        help="Encoding processes, each holding one copy of the model")
+    parser.add_argument("--max-pending", type=int, default=settings.embedding_server_max_pending,
+                        help="Requests allowed to queue before replying busy")
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("--socket or EMBEDDING_SERVER_SOCKET is required")
+
+    server = EmbeddingServer(args.socket, args.processes, args.max_pending)
+    print(f"Loading {settings.embedding_backend} model in {args.processes} process(es)...")
+    server.warm_up(args.processes)
+    print(f"Embedding server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Compaction and retention for long-term memory.
+
+``LongTermMemory.store_memory`` writes one memory per chat turn. The
+compactor keeps each user's memory index small and its search results
+varied:
+
+1. Memories older than ``memory_ttl_days`` expire.
+2. Near-duplicates (similarity >= ``memory_duplicate_threshold``) merge
+   into the newest of them.
+3. Memories older than ``memory_summary_age_days`` are grouped by
+   similarity (``memory_cluster_threshold``), and each group of two or
+   more is replaced by one extractive summary memory.
+4. At most ``memory_max_per_user`` memories are kept, ranked by recency
+   (half-life ``memory_recency_half_life_days``) weighted by how many
+   original memories each one stands for.
+
+Memories without a valid timestamp cannot be aged, so they are left
+untouched (and counted as "undated") rather than expired.
+
+Run from backend/ (e.g. daily from cron):
+
+    python -m app.services.memory.compaction
+    python -m app.services.memory.compaction --user <user_id> --dry-run
+"""
+import argparse
+import hashlib
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.services.memory.long_term_memory import LongTermMemory
+from app.services.vectorstore import user_namespace
+
+
+@dataclass
+class CompactionReport:
+    """What compaction did (or would do) for one user."""
+    user_id: str
+    before: int = 0
+    expired: int = 0
+    merged: int = 0
+    summarized: int = 0  # memories folded into summaries
+    summaries: int = 0  # summary memories created
+    evicted: int = 0
+    undated: int = 0  # left untouched: no valid timestamp
+    after: int = 0
+
+
+@dataclass
+class _Memory:
+    id: str
+    vector: np.ndarray
+    metadata: Dict[str, Any]
+    timestamp: datetime
+    weight: int  # original memories this one stands for
+    dirty: bool = False  # metadata changed, needs writing
+
+    @property
+    def text(self) -> str:
+        return self.metadata.get("text", "")
+
+
+class MemoryCompactor:
+    """Applies deduplication, summarization and retention to users' memories."""
+
+    def __init__(self, memory: Optional[LongTermMemory] = None, now: Optional[datetime] = None):
+        self.memory = memory or LongTermMemory()
+        self.now = now or datetime.utcnow()
+
+    def compact_user(self, user_id: str, dry_run: bool = False) -> CompactionReport:
+        """
+        Compact one user's memories.
+
+        Args:
+            user_id: User ID
+            dry_run: Only report what would change
+
+        Returns:
+            CompactionReport with the counts per step
+        """
+        report = CompactionReport(user_id=user_id)
+        memories = []
+        for record in self.memory.list_memories(user_id):
+            memory = _load(record)
+            if memory is None:
+                report.undated += 1
+            else:
+                memories.append(memory)
+        original_ids = {memory.id for memory in memories}
+        report.before = len(memories) + report.undated
+
+        memories, report.expired = self._expire(memories)
+        memories, report.merged = self._merge_duplicates(memories)
+        memories, report.summaries, report.summarized = self._summarize_old(user_id, memories)
+        memories, report.evicted = self._apply_cap(memories)
+        report.after = len(memories) + report.undated
+
+        if not dry_run:
+            self._write(user_id, memories, original_ids)
+        return report
+
+    def _age_days(self, memory: _Memory) -> float:
+        return (self.now - memory.timestamp).total_seconds() / 86400
+
+    def _expire(self, memories: List[_Memory]) -> Tuple[List[_Memory], int]:
+        if settings.memory_ttl_days <= 0:
+            return memories, 0
+        kept = [memory for memory in memories if self._age_days(memory) <= settings.memory_ttl_days]
+        return kept, len(memories) - len(kept)
+
+    def _merge_duplicates(self, memories: List[_Memory]) -> Tuple[List[_Memory], int]:
+        """Fold each memory into a newer near-duplicate, if any."""
+        representatives = []
+        for memory, members in _cluster(memories, settings.memory_duplicate_threshold):
+            for member in members:
+                memory.weight += member.weight
+            if members:
+                memory.metadata["merged_count"] = memory.weight
+                memory.dirty = True
+            representatives.append(memory)
+        return representatives, len(memories) - len(representatives)
+
+    def _summarize_old(self, user_id: str, memories: List[_Memory]) -> Tuple[List[_Memory], int, int]:
+        """Replace groups of similar old memories with one summary each."""
+        cutoff = settings.memory_summary_age_days
+        recent = [memory for memory in memories if self._age_days(memory) <= cutoff]
+        old = [memory for memory in memories if self._age_days(memory) > cutoff]
+
+        result = list(recent)
+        summaries = 0
+        summarized = 0
+        for leader, members in _cluster(old, settings.memory_cluster_threshold):
+            if not members:
+                result.append(leader)
+                continue
+            group = [leader] + members
+            result.append(self._summary(user_id, group))
+            summaries += 1
+            summarized += len(group)
+        return result, summaries, summarized
+
+    def _summary(self, user_id: str, group: List[_Memory]) -> _Memory:
+        """Extractive summary: the most central members' texts, up to the size limit."""
+        vectors = np.stack([memory.vector for memory in group])
+        centroid = vectors.mean(axis=0)
+        order = np.argsort(-(vectors @ centroid))
+
+        lines = []
+        length = 0
+        per_memory = max(80, settings.memory_summary_max_chars // 4)
+        for index in order:
+            text = " ".join(group[index].text.split())
+            if len(text) > per_memory:
+                text = text[:per_memory - 3].rstrip() + "..."
+            if length + len(text) > settings.memory_summary_max_chars:
+                break
+            lines.append(f"- {text}")
+            length += len(text) + 3
+
+        weight = sum(memory.weight for memory in group)
+        timestamps = sorted(memory.timestamp for memory in group)
+        conversation_ids = []
+        for memory in group:
+            ids = memory.metadata.get("conversation_ids") or [memory.metadata.get("conversation_id")]
+            conversation_ids.extend(id for id in ids if id and id not in conversation_ids)
+
+        digest = hashlib.sha1("".join(sorted(memory.id for memory in group)).encode()).hexdigest()[:16]
+        metadata = {
+            "user_id": user_id,
+            "text": f"Summary of {weight} past conversations:\n" + "\n".join(lines),
+            "timestamp": timestamps[-1].isoformat(),
+            "first_timestamp": timestamps[0].isoformat(),
+            "summary": True,
+            "merged_count": weight,
+            "conversation_ids": conversation_ids[:20],
+        }
+        # Normalised centroid until the summary text is embedded on write
+        return _Memory(
+            id=f"{user_id}_summary_{digest}",
+            vector=centroid / max(np.linalg.norm(centroid), 1e-12),
+            metadata=metadata,
+            timestamp=timestamps[-1],
+            weight=weight,
+            dirty=True
+        )
+
+    def _apply_cap(self, memories: List[_Memory]) -> Tuple[List[_Memory], int]:
+        """Keep the highest-scoring memories within the per-user cap."""
+        cap = settings.memory_max_per_user
+        if cap <= 0 or len(memories) <= cap:
+            return memories, 0
+        half_life = max(settings.memory_recency_half_life_days, 1e-6)
+
+        def score(memory: _Memory) -> float:
+            recency = math.exp(-math.log(2) * self._age_days(memory) / half_life)
+            return recency * (1 + math.log(memory.weight))
+
+        kept = sorted(memories, key=score, reverse=True)[:cap]
+        return kept, len(memories) - len(kept)
+
+    def _write(self, user_id: str, memories: List[_Memory], original_ids: set):
+        """Write new and changed memories, then delete the ones no longer kept."""
+        namespace = user_namespace(user_id)
+        changed = [memory for memory in memories if memory.dirty]
+        summaries = [memory for memory in changed if memory.id not in original_ids]
+        if summaries:
+            embeddings = self.memory.embedder.encode([memory.text for memory in summaries])
+            for memory, embedding in zip(summaries, embeddings):
+                memory.vector = np.asarray(embedding, dtype=np.float32)
+        if changed:
+            self.memory.vector_store.upsert([
+                {"id": memory.id, "values": memory.vector.tolist(), "metadata": memory.metadata}
+                for memory in changed
+            ], namespace=namespace)
+        removed = original_ids - {memory.id for memory in memories}
+        if removed:
+            self.memory.vector_store.delete(ids=sorted(removed), namespace=namespace)
+
+
+def _load(record: Dict[str, Any]) -> Optional[_Memory]:
+    """The record as a _Memory, or None if it has no valid timestamp."""
+    vector = np.asarray(record["values"], dtype=np.float32)
+    metadata = record["metadata"]
+    try:
+        timestamp = datetime.fromisoformat(str(metadata.get("timestamp")))
+    except ValueError:
+        return None
+    return _Memory(
+        id=record["id"],
+        vector=vector / max(np.linalg.norm(vector), 1e-12),
+        metadata=metadata,
+        timestamp=timestamp,
+        weight=int(metadata.get("merged_count", 1))
+    )
+
+
+def _cluster(memories: List[_Memory], threshold: float) -> List[Tuple[_Memory, List[_Memory]]]:
+    """
+    Greedy leader clustering, newest first.
+
+    Each memory joins the most similar existing leader if the similarity
+    reaches threshold, and otherwise becomes a leader itself.
+    """
+    ordered = sorted(memories, key=lambda memory: memory.timestamp, reverse=True)
+    clusters: List[Tuple[_Memory, List[_Memory]]] = []
+    leaders = np.zeros((len(ordered), ordered[0].vector.shape[0]), dtype=np.float32) if ordered else None
+    for memory in ordered:
+        if clusters:
+            similarities = leaders[:len(clusters)] @ memory.vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                clusters[best][1].append(memory)
+                continue
+        leaders[len(clusters)] = memory.vector
+        clusters.append((memory, []))
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact long-term memories")
+    parser.add_argument("--user", action="append", help="User ID to compact (repeatable; default: all users)")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    args = parser.parse_args()
+
+    user_ids = args.user
+    if not user_ids:
+        from app.models.base import SessionLocal
+        from app.models.user import User
+
+        db = SessionLocal()
+        try:
+            user_ids = [str(user_id) for (user_id,) in db.query(User.id).all()]
+        finally:
+            db.close()
+
+    compactor = MemoryCompactor()
+    totals = CompactionReport(user_id="total")
+    for user_id in user_ids:
+        try:
+            report = compactor.compact_user(user_id, dry_run=args.dry_run)
+        except Exception as e:
+            print(f"Error compacting memories for {user_id}: {e}")
+            continue
+        if report.before != report.after or report.merged:
+            print(
+                f"{user_id}: {report.before} -> {report.after} "
+                f"(expired {report.expired}, merged {report.merged}, "
+                f"summarized {report.summarized} into {report.summaries}, evicted {report.evicted}, "
+                f"undated {report.undated})"
+            )
+        for name in ("before", "expired", "merged", "summarized", "summaries", "evicted", "undated", "after"):
+            setattr(totals, name, getattr(totals, name) + getattr(report, name))
+
+    prefix = "Would compact" if args.dry_run else "Compacted"
+    print(
+        f"{prefix} {len(user_ids)} users: {totals.before} -> {totals.after} memories "
+        f"(expired {totals.expired}, merged {totals.merged}, "
+        f"summarized {totals.summarized} into {totals.summaries}, evicted {totals.evicted}, "
+        f"undated {totals.undated})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,27 @@
 """Long-term memory service for semantic search of past conversations."""
-from typing import Dict, Any, List
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
+from typing import Dict, Any, List, Optional
 from app.config import settings
+from app.services.embeddings import get_embedder
+from app.services.vectorstore import get_vector_store, user_namespace
+from app.metrics import REGISTRY
 import json
 from datetime import datetime
 
 
+MEMORY_WRITES_TOTAL = REGISTRY.counter(
+    "memory_writes_total",
+    "Long-term memory writes, by outcome (stored, duplicate, error)",
+    ["outcome"]
+)
+
+
 class LongTermMemory:
     """Service for storing and retrieving long-term conversation memories."""
     
     def __init__(self):
-        self.pinecone = Pinecone(api_key=settings.pinecone_api_key)
         self.memory_index_name = f"{settings.pinecone_index_name}-memory"
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self._ensure_index()
-    
-    def _ensure_index(self):
-        """Ensure memory index exists."""
-        try:
-            existing_indexes = self.pinecone.list_indexes()
-            index_names = [idx.name for idx in existing_indexes] if hasattr(existing_indexes, '__iter__') else []
-            
-            if self.memory_index_name not in index_names:
-                try:
-                    self.pinecone.create_index(
-                        name=self.memory_index_name,
-                        dimension=384,
-                        metric="cosine",
-                        spec=ServerlessSpec(
-                            cloud="aws",
-                            region=settings.pinecone_environment
-                        )
-                    )
-                    print(f"Created Pinecone memory index: {self.memory_index_name}")
-                except Exception as create_error:
-                    print(f"Note: Memory index creation - {create_error}")
-        except Exception as e:
-            print(f"Warning: Could not ensure memory index exists: {e}")
-            print("Index will be created on first use if it doesn't exist")
+        self.vector_store = get_vector_store(self.memory_index_name)
+        self.embedder = get_embedder()
     
     def store_memory(self, user_id: str, conversation_text: str, metadata: Dict[str, Any] = None) -> bool:
         """
@@ -53,10 +36,13 @@ class LongTermMemory:
             True if successful
         """
         try:
-            index = self.pinecone.Index(self.memory_index_name)
-            
             # Generate embedding
-            embedding = self.embedding_model.encode(conversation_text).tolist()
+            embedding = self.embedder.encode_one(conversation_text)
+            
+            # An almost identical memory adds nothing but crowds search results
+            if self.find_duplicate(user_id, embedding):
+                MEMORY_WRITES_TOTAL.inc(outcome="duplicate")
+                return True
             
             # Prepare metadata
             memory_metadata = {
@@ -69,20 +55,74 @@ class LongTermMemory:
             # Generate unique ID
             memory_id = f"{user_id}_{datetime.utcnow().timestamp()}"
             
-            # Store in Pinecone
-            index.upsert(vectors=[{
+            # Store in the vector store
+            self.vector_store.upsert([{
                 "id": memory_id,
                 "values": embedding,
                 "metadata": memory_metadata
-            }])
+            }], namespace=user_namespace(user_id))
             
+            MEMORY_WRITES_TOTAL.inc(outcome="stored")
             return True
             
         except Exception as e:
             print(f"Error storing memory: {e}")
+            MEMORY_WRITES_TOTAL.inc(outcome="error")
             return False
     
-    def search_memories(self, user_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def find_duplicate(self, user_id: str, embedding: List[float]) -> Optional[str]:
+        """
+        Find an existing memory that is a near-duplicate of an embedding.
+        
+        Args:
+            user_id: User ID
+            embedding: Embedding of the new memory
+            
+        Returns:
+            ID of the duplicate memory, or None
+        """
+        if settings.memory_duplicate_threshold >= 1:
+            return None
+        try:
+            matches = self.vector_store.query(
+                vector=embedding,
+                top_k=1,
+                filter={"user_id": user_id},
+                namespace=user_namespace(user_id)
+            )
+        except Exception as e:
+            print(f"Warning: duplicate memory check failed: {e}")
+            return None
+        if matches and matches[0].score >= settings.memory_duplicate_threshold:
+            return matches[0].id
+        return None
+    
+    def list_memories(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Get all memories of a user with their vectors.
+        
+        Memory IDs start with the user ID, so they can be listed by prefix.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            List of {"id", "values", "metadata"} dictionaries
+        """
+        namespace = user_namespace(user_id)
+        ids = list(self.vector_store.list_ids(f"{user_id}_", namespace=namespace))
+        return [
+            memory for memory in self.vector_store.fetch(ids, namespace=namespace)
+            if memory["metadata"].get("user_id") == user_id
+        ]
+    
+    def search_memories(
+        self,
+        user_id: str,
+        query: str,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Search for relevant past memories.
         
@@ -90,27 +130,27 @@ class LongTermMemory:
             user_id: User ID
             query: Search query
             top_k: Number of results
+            query_embedding: Embedding of the query, if already computed
             
         Returns:
             List of relevant memories
         """
         try:
-            index = self.pinecone.Index(self.memory_index_name)
-            
             # Generate query embedding
-            query_embedding = self.embedding_model.encode(query).tolist()
+            if query_embedding is None:
+                query_embedding = self.embedder.encode_one(query)
             
             # Search
-            results = index.query(
+            matches = self.vector_store.query(
                 vector=query_embedding,
                 top_k=top_k,
-                include_metadata=True,
-                filter={"user_id": user_id}
+                filter={"user_id": user_id},
+                namespace=user_namespace(user_id)
             )
             
             # Format results
             memories = []
-            for match in results.matches:
+            for match in matches:
                 memories.append({
                     "text": match.metadata.get("text", ""),
                     "timestamp": match.metadata.get("timestamp", ""),
@@ -0,0 +1,111 @@
+"""Routing of Claude calls between a fast and a full model.
+
+Each turn makes a first call (which may request tools) and, after tools
+ran, a second call that writes the answer. Simple calls go to
+``settings.fast_model``, everything else to ``settings.full_model``:
+
+- first call: short chit-chat and plain arithmetic
+- second call: summarizing small tool results (at most
+  ``model_routing_fast_result_chars`` of JSON, without errors)
+
+Turns with prefetched document excerpts always use the full model.
+Decisions are counted (and printed with ``model_routing_log_decisions``),
+and latency and tokens are recorded per model so the two can be compared.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.metrics import REGISTRY
+
+
+MODEL_ROUTING_TOTAL = REGISTRY.counter(
+    "model_routing_total",
+    "Model routing decisions, by call (first, second), tier (fast, full) and reason",
+    ["call", "tier", "reason"]
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "llm_call_seconds",
+    "Claude messages.create latency, by call and model",
+    ["call", "model", "outcome"]
+)
+LLM_TOKENS_TOTAL = REGISTRY.counter(
+    "llm_tokens_total",
+    "Claude tokens used, by call, model and direction (input, output)",
+    ["call", "model", "direction"]
+)
+
+_CHITCHAT = re.compile(
+    r"^\W*(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|cool|great|nice|bye|goodbye|"
+    r"good (morning|afternoon|evening|night)|how are you|what's up)"
+    r"([\s,!.?'-]+[\w']+){0,3}[\s!.,?]*$",
+    re.IGNORECASE
+)
+_ARITHMETIC = re.compile(
+    r"^\s*(what\s+is|what's|calculate|compute|how\s+much\s+is)?\s*"
+    r"[\d\s.,()+\-*/^%x×÷]*\d[\d\s.,()+\-*/^%x×÷]*(\s*(percent\s+)?of\s+[\d.,]+)?\s*[?=]?\s*$",
+    re.IGNORECASE
+)
+_OPERATOR = re.compile(r"[+\-*/^%×÷]|\bof\b")
+
+
+@dataclass
+class RoutingDecision:
+    """Model chosen for one Claude call, and why."""
+    model: str
+    tier: str  # "fast" or "full"
+    reason: str
+
+
+class ModelRouter:
+    """Chooses the model for each Claude call of a turn."""
+
+    def __init__(self, fast_model: Optional[str] = None, full_model: Optional[str] = None):
+        self.fast_model = fast_model if fast_model is not None else settings.fast_model
+        self.full_model = full_model or settings.full_model
+        self.enabled = settings.model_routing_enabled and bool(self.fast_model)
+
+    def route_first(self, message: str, document_excerpts: Optional[List[Dict[str, Any]]] = None) -> RoutingDecision:
+        """Choose the model for the first (tool-deciding) call."""
+        if not self.enabled:
+            return self._decide("first", "full", "routing_disabled")
+        if document_excerpts:
+            return self._decide("first", "full", "documents")
+        text = message.strip()
+        if len(text) <= settings.model_routing_chitchat_max_chars and _CHITCHAT.match(text):
+            return self._decide("first", "fast", "chitchat")
+        if _ARITHMETIC.match(text) and _OPERATOR.search(text):
+            return self._decide("first", "fast", "arithmetic")
+        return self._decide("first", "full", "default")
+
+    def route_second(self, tool_results: List[Dict[str, Any]], result_chars: int) -> RoutingDecision:
+        """
+        Choose the model for the call that answers from tool results.
+
+        Args:
+            tool_results: Executed tool calls with their results
+            result_chars: Total size of the tool results sent to Claude
+        """
+        if not self.enabled:
+            return self._decide("second", "full", "routing_disabled")
+        if any(isinstance(call["result"], dict) and call["result"].get("error") for call in tool_results):
+            return self._decide("second", "full", "tool_error")
+        if result_chars <= settings.model_routing_fast_result_chars:
+            return self._decide("second", "fast", "small_tool_results")
+        return self._decide("second", "full", "large_tool_results")
+
+    def _decide(self, call: str, tier: str, reason: str) -> RoutingDecision:
+        model = self.fast_model if tier == "fast" else self.full_model
+        MODEL_ROUTING_TOTAL.inc(call=call, tier=tier, reason=reason)
+        if settings.model_routing_log_decisions:
+            print(f"Model routing: {call} call -> {model} ({reason})")
+        return RoutingDecision(model=model, tier=tier, reason=reason)
+
+
+def record_usage(call: str, model: str, response: Any):
+    """Count the tokens reported in a messages.create response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS_TOTAL.inc(getattr(usage, "input_tokens", 0) or 0, call=call, model=model, direction="input")
+    LLM_TOKENS_TOTAL.inc(getattr(usage, "output_tokens", 0) or 0, call=call, model=model, direction="output")
@@ -0,0 +1,215 @@
+"""Semantic cache of answers to repeated general questions.
+
+Before calling Claude, ``AIAssistant`` embeds a cacheable question and looks
+for an earlier answer to a question at least ``response_cache_threshold``
+similar. Only self-contained, non-personal questions take part:
+
+- turns with conversation history or saved preferences are bypassed, as
+  are messages that refer to the user, their documents, or the current
+  date and news
+- answers are stored only when Claude used no tools and no past memories
+
+Entries expire after ``response_cache_ttl_seconds`` and are kept per scope:
+per user (``response_cache_scope="user"``, the default) or shared by all
+users (``"global"``), and always per system prompt. At most
+``known_user_cache_size`` owners are kept (least recently used first out),
+each with up to ``response_cache_max_entries`` answers per prompt. The
+cache is per worker process and disabled unless ``response_cache_enabled``
+is set.
+
+Answers grounded in documents are never cached (they come from tools or
+prefetched excerpts), so document changes cannot make a cached answer
+stale in either scope. A user's scope is still dropped when their
+documents change; the global scope is left alone.
+"""
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.metrics import REGISTRY
+from app.services.cache import LRUCache, on_documents_changed
+from app.services.embeddings import get_embedder
+
+
+RESPONSE_CACHE_REQUESTS_TOTAL = REGISTRY.counter(
+    "response_cache_requests_total",
+    "Semantic response cache lookups, by outcome (hit, miss, bypass)",
+    ["outcome"]
+)
+
+# Messages about the user, their files or the present are never served from cache
+_CONTEXTUAL = re.compile(
+    r"\b(i|i'm|i've|i'd|me|my|mine|myself|we|our|us|remember|"
+    r"document|documents|file|files|upload|uploaded|pdf|docx|attachment|"
+    r"today|tonight|tomorrow|yesterday|now|current|currently|latest|recent|recently|"
+    r"news|this (week|month|year)|weather|price|prices|stock|score)\b",
+    re.IGNORECASE
+)
+
+
+def is_general_question(message: str) -> bool:
+    """Whether a message is self-contained enough to share cached answers."""
+    return 0 < len(message) <= settings.response_cache_max_question_chars and not _CONTEXTUAL.search(message)
+
+
+@dataclass
+class CacheProbe:
+    """A cacheable question: its scope, embedding and cached answer (if any)."""
+    owner: str
+    scope: str
+    embedding: np.ndarray
+    answer: Optional[str] = None
+
+
+class _Scope:
+    """Ring buffer of question embeddings and answers for one scope.
+
+    Storage grows as answers are added, up to max_entries; then the oldest
+    entry is overwritten.
+    """
+
+    def __init__(self, dimension: int, max_entries: int):
+        self.max_entries = max_entries
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.entries: List[Tuple[str, float]] = []  # answer, expiry
+        self.size = 0
+        self.next = 0
+
+    def add(self, embedding: np.ndarray, answer: str, expires_at: float):
+        if self.size < self.max_entries:
+            if self.size == len(self.vectors):
+                capacity = min(max(2 * self.size, 16), self.max_entries)
+                grown = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+                grown[:self.size] = self.vectors
+                self.vectors = grown
+            index = self.size
+            self.entries.append((answer, expires_at))
+            self.size += 1
+        else:
+            index = self.next
+            self.entries[index] = (answer, expires_at)
+            self.next = (self.next + 1) % self.max_entries
+        self.vectors[index] = embedding
+
+    def find(self, embedding: np.ndarray, threshold: float, now: float) -> Optional[str]:
+        if not self.size:
+            return None
+        scores = self.vectors[:self.size] @ embedding
+        for index in np.argsort(-scores):
+            if scores[index] < threshold:
+                return None
+            answer, expires_at = self.entries[index]
+            if expires_at > now:
+                return answer
+        return None
+
+
+class SemanticResponseCache:
+    """Answers keyed by question embedding, isolated per scope."""
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int, per_user: bool = True):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.per_user = per_user
+        self.embedder = get_embedder()
+        # Owner (user ID or "global") -> scope per system prompt
+        self._owners = LRUCache(maxsize=settings.known_user_cache_size)
+        self._lock = threading.Lock()
+
+    def owner(self, user_id: str) -> str:
+        """Owner of a user's entries: the user, or everyone."""
+        return user_id if self.per_user else "global"
+
+    def scope(self, system_prompt: str) -> str:
+        """Scope key within an owner: the system prompt."""
+        return hashlib.sha1(system_prompt.encode()).hexdigest()[:12]
+
+    def probe(
+        self,
+        user_id: str,
+        message: str,
+        system_prompt: str,
+        contextual: bool,
+        embedding: Optional[List[float]] = None
+    ) -> Optional[CacheProbe]:
+        """
+        Look a question up.
+
+        Args:
+            user_id: User ID
+            message: User message
+            system_prompt: System prompt the answer would be generated with
+            contextual: Whether the turn depends on history or preferences
+            embedding: Embedding of the message, if already computed
+
+        Returns:
+            CacheProbe (with the answer on a hit), or None if the message
+            must not use the cache
+        """
+        if contextual or not is_general_question(message):
+            RESPONSE_CACHE_REQUESTS_TOTAL.inc(outcome="bypass")
+            return None
+
+        if embedding is None:
+            embedding = self.embedder.encode_one(message)
+        probe = CacheProbe(
+            owner=self.owner(user_id),
+            scope=self.scope(system_prompt),
+            embedding=np.asarray(embedding, dtype=np.float32)
+        )
+        with self._lock:
+            scope = self._owners.get(probe.owner, {}).get(probe.scope)
+            if scope is not None:
+                probe.answer = scope.find(probe.embedding, self.threshold, time.monotonic())
+        RESPONSE_CACHE_REQUESTS_TOTAL.inc(outcome="hit" if probe.answer is not None else "miss")
+        return probe
+
+    def store(self, probe: CacheProbe, answer: str):
+        """Remember the answer generated for a probed question."""
+        with self._lock:
+            scopes = self._owners.get(probe.owner)
+            if scopes is None:
+                scopes = {}
+                self._owners.set(probe.owner, scopes)
+            scope = scopes.get(probe.scope)
+            if scope is None:
+                scope = _Scope(probe.embedding.shape[0], self.max_entries)
+                scopes[probe.scope] = scope
+            scope.add(probe.embedding, answer, time.monotonic() + self.ttl)
+
+    def drop_user(self, user_id: str):
+        """Forget a user's own scopes (the global scope is not affected)."""
+        with self._lock:
+            self._owners.pop(user_id)
+
+
+_cache: Optional[SemanticResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[SemanticResponseCache]:
+    """Get the worker's response cache, or None when it is disabled."""
+    global _cache
+    if not settings.response_cache_enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticResponseCache(
+                    threshold=settings.response_cache_threshold,
+                    ttl=settings.response_cache_ttl_seconds,
+                    max_entries=settings.response_cache_max_entries,
+                    per_user=settings.response_cache_scope == "user"
+                )
+    return _cache
+
+
+@on_documents_changed
+def _drop_user_answers(user_id: str):
+    if _cache is not None:
+        _cache.drop_user(user_id)
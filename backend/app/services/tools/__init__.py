@@ -1,4 +1,5 @@
 """Tool implementations for the AI assistant."""
+from .registry import ToolContext, ToolRegistry, ToolSpec
 from .web_search import WebSearchTool
 from .calculator import CalculatorTool
 from .knowledge_base import KnowledgeBaseTool
@@ -9,5 +10,8 @@ __all__ = [
     "CalculatorTool",
     "KnowledgeBaseTool",
     "PreferenceMemoryTool",
+    "ToolContext",
+    "ToolRegistry",
+    "ToolSpec",
 ]
 
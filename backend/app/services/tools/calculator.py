@@ -1,31 +1,135 @@
 """Calculator tool for mathematical computations."""
+import ast
 import math
 import operator
-from typing import Dict, Any
+import re
+from functools import lru_cache
+from typing import Dict, Any, List
+from app.services.tools.registry import ToolContext, ToolSpec
+
+
+# Limits that keep a single model-generated expression from pinning a worker
+MAX_EXPRESSION_LENGTH = 500
+MAX_EVALUATION_STEPS = 1000
+MAX_EXPONENT = 1000
+MAX_INTEGER_BITS = 4096
+MAX_SEQUENCE_LENGTH = 1000
+
+# "15% of 2450" -> "(15/100)*2450"
+PERCENT_OF_PATTERN = re.compile(r"(\d+(?:\.\d+)?|\.\d+)\s*%\s*of\b", re.IGNORECASE)
+# "200 * 15%" -> "200 * (15/100)". Only when no operand follows the "%", so
+# "10 % 3" and "10 % -3" are left alone as modulo
+PERCENT_PATTERN = re.compile(r"(\d+(?:\.\d+)?|\.\d+)\s*%(?=\s*(?:[),*/]|$))")
+
+
+class CalculationLimitError(ValueError):
+    """Raised when an expression exceeds the calculator's resource limits."""
+
+
+def _check_int_size(value: Any) -> Any:
+    """Reject integers too large to keep working with cheaply."""
+    if isinstance(value, int) and value.bit_length() > MAX_INTEGER_BITS:
+        raise CalculationLimitError("Result is too large")
+    return value
+
+
+def _check_sequence_length(length: int):
+    if length > MAX_SEQUENCE_LENGTH:
+        raise CalculationLimitError("Sequence is too long")
+
+
+def _check_size(value: Any) -> Any:
+    """Reject oversized integers and sequences, and non-real results."""
+    if isinstance(value, complex):
+        raise ValueError("Result is not a real number")
+    if isinstance(value, list):
+        _check_sequence_length(len(value))
+    return _check_int_size(value)
+
+
+def _safe_pow(base: Any, exponent: Any) -> Any:
+    """Power with bounds on the exponent and the size of integer results."""
+    if isinstance(exponent, (int, float)) and abs(exponent) > MAX_EXPONENT:
+        raise CalculationLimitError(f"Exponent exceeds limit of {MAX_EXPONENT}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        if base.bit_length() * exponent > MAX_INTEGER_BITS:
+            raise CalculationLimitError("Result is too large")
+    return operator.pow(base, exponent)
+
+
+def _safe_mul(left: Any, right: Any) -> Any:
+    """Multiplication that refuses to build oversized integers or sequences."""
+    if isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > MAX_INTEGER_BITS:
+            raise CalculationLimitError("Result is too large")
+    # Checked before repeating, since building the list is the expensive part
+    for sequence, count in ((left, right), (right, left)):
+        if isinstance(sequence, list) and isinstance(count, int):
+            _check_sequence_length(len(sequence) * max(count, 0))
+    return operator.mul(left, right)
+
+
+def _safe_round(number: Any, ndigits: Any = None) -> Any:
+    """round() with ndigits bounded, since a huge ndigits takes seconds per call."""
+    if ndigits is not None:
+        if isinstance(ndigits, bool) or not isinstance(ndigits, int):
+            raise ValueError("round() digits must be an integer")
+        if abs(ndigits) > MAX_EXPONENT:
+            raise CalculationLimitError(f"round() digits exceed limit of {MAX_EXPONENT}")
+    return round(number, ndigits)
+
+
+def _bounded_sequence_function(function):
+    """Wrap min/max/sum so they refuse oversized inputs."""
+    def wrapper(*args):
+        for arg in args:
+            if isinstance(arg, list):
+                _check_sequence_length(len(arg))
+        _check_sequence_length(len(args))
+        return function(*args)
+    wrapper.__name__ = function.__name__
+    return wrapper
+
+
+@lru_cache(maxsize=512)
+def _parse_expression(expression: str) -> ast.Expression:
+    """Parse an expression into an AST, caching trees for repeated inputs."""
+    normalized = PERCENT_OF_PATTERN.sub(r"(\1/100)*", expression)
+    normalized = PERCENT_PATTERN.sub(r"(\1/100)", normalized)
+    return ast.parse(normalized.strip(), mode="eval")
 
 
 class CalculatorTool:
     """Tool for performing mathematical calculations safely."""
-    
+
+    # Registry limits (see ToolSpec)
+    TIMEOUT_SECONDS = 2.0
+    MAX_CONCURRENCY = 4
+
     # Safe operations allowed
-    SAFE_OPERATIONS = {
-        "+": operator.add,
-        "-": operator.sub,
-        "*": operator.mul,
-        "/": operator.truediv,
-        "//": operator.floordiv,
-        "%": operator.mod,
-        "**": operator.pow,
-        "pow": pow,
-        "abs": abs,
-        "round": round,
-        "min": min,
-        "max": max,
-        "sum": sum,
+    BINARY_OPERATORS = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: _safe_mul,
+        ast.Div: operator.truediv,
+        ast.FloorDiv: operator.floordiv,
+        ast.Mod: operator.mod,
+        ast.Pow: _safe_pow,
     }
-    
-    # Safe functions from math module
+
+    UNARY_OPERATORS = {
+        ast.UAdd: operator.pos,
+        ast.USub: operator.neg,
+    }
+
+    # Safe functions
     SAFE_FUNCTIONS = {
+        "pow": _safe_pow,
+        "abs": abs,
+        "round": _safe_round,
+        "min": _bounded_sequence_function(min),
+        "max": _bounded_sequence_function(max),
+        "sum": _bounded_sequence_function(sum),
         "sqrt": math.sqrt,
         "sin": math.sin,
         "cos": math.cos,
@@ -35,34 +139,39 @@ class CalculatorTool:
         "exp": math.exp,
         "ceil": math.ceil,
         "floor": math.floor,
+    }
+
+    # Safe constants
+    SAFE_CONSTANTS = {
         "pi": math.pi,
         "e": math.e,
     }
-    
+
     def calculate(self, expression: str) -> Dict[str, Any]:
         """
         Safely evaluate a mathematical expression.
-        
+
         Args:
             expression: Mathematical expression as string
-            
+
         Returns:
             Dictionary with calculation result
         """
         try:
-            # Create safe evaluation context
-            safe_dict = {**self.SAFE_OPERATIONS, **self.SAFE_FUNCTIONS}
-            safe_dict["__builtins__"] = {}
-            
-            # Evaluate expression
-            result = eval(expression, safe_dict, {})
-            
+            if len(expression) > MAX_EXPRESSION_LENGTH:
+                raise CalculationLimitError(
+                    f"Expression exceeds {MAX_EXPRESSION_LENGTH} characters"
+                )
+
+            tree = _parse_expression(expression)
+            result = self._evaluate(tree.body, [MAX_EVALUATION_STEPS])
+
             return {
                 "expression": expression,
                 "result": result,
                 "formatted": f"{result:,.2f}" if isinstance(result, float) else str(result)
             }
-            
+
         except ZeroDivisionError:
             return {
                 "error": "Division by zero",
@@ -75,7 +184,75 @@ class CalculatorTool:
                 "expression": expression,
                 "result": None
             }
-    
+
+    def _evaluate(self, node: ast.AST, budget: list) -> Any:
+        """
+        Evaluate a whitelisted AST node.
+
+        Args:
+            node: Node to evaluate
+            budget: Single-item list holding the remaining evaluation steps
+
+        Returns:
+            Numeric value (or list of values for sequence literals)
+        """
+        budget[0] -= 1
+        if budget[0] < 0:
+            raise CalculationLimitError("Expression is too complex")
+
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ValueError(f"Unsupported constant: {node.value!r}")
+            return _check_int_size(node.value)
+
+        if isinstance(node, ast.Name):
+            if node.id not in self.SAFE_CONSTANTS:
+                raise ValueError(f"Unknown name: {node.id}")
+            return self.SAFE_CONSTANTS[node.id]
+
+        if isinstance(node, ast.BinOp):
+            op = self.BINARY_OPERATORS.get(type(node.op))
+            if op is None:
+                raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+            left = self._evaluate(node.left, budget)
+            right = self._evaluate(node.right, budget)
+            return _check_size(op(left, right))
+
+        if isinstance(node, ast.UnaryOp):
+            op = self.UNARY_OPERATORS.get(type(node.op))
+            if op is None:
+                raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+            return op(self._evaluate(node.operand, budget))
+
+        if isinstance(node, (ast.List, ast.Tuple)):
+            _check_sequence_length(len(node.elts))
+            return [self._evaluate(element, budget) for element in node.elts]
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in self.SAFE_FUNCTIONS:
+                raise ValueError("Unsupported function call")
+            if node.keywords:
+                raise ValueError("Keyword arguments are not supported")
+            args = [self._evaluate(arg, budget) for arg in node.args]
+            return _check_size(self.SAFE_FUNCTIONS[node.func.id](*args))
+
+        raise ValueError(f"Unsupported expression element: {type(node).__name__}")
+
+    def get_tool_specs(self) -> List[ToolSpec]:
+        """Get registry specs for the tools this class provides."""
+        return [
+            ToolSpec(
+                name="calculator",
+                definition=self.get_tool_definition(),
+                handler=self._handle_calculate,
+                timeout=self.TIMEOUT_SECONDS,
+                max_concurrency=self.MAX_CONCURRENCY
+            )
+        ]
+
+    def _handle_calculate(self, tool_input: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
+        return self.calculate(expression=tool_input.get("expression", ""))
+
     def get_tool_definition(self) -> Dict[str, Any]:
         """Get tool definition for Claude function calling."""
         return {
@@ -92,4 +269,3 @@ class CalculatorTool:
                 "required": ["expression"]
             }
         }
-
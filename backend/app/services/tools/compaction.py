@@ -0,0 +1,125 @@
+"""Helpers for compacting tool results before they are sent to Claude.
+
+Tools with verbose results register a compactor on their ToolSpec that
+keeps only what the model needs; ``fit_to_budget`` then shortens the
+result's strings (and, if needed, drops trailing list items) until its
+compact JSON fits the token budget.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Rough average for English text with Claude's tokenizer
+CHARS_PER_TOKEN = 4
+
+# Strings are never cut below this many characters
+MIN_STRING_CHARS = 40
+
+
+def to_json(value: Any) -> str:
+    """Serialize without indentation or separator padding."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def normalize_text(text: Any) -> str:
+    """Collapse runs of whitespace."""
+    return " ".join(str(text or "").split())
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, at a word boundary when one is close."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(max_chars - 3, 0)]
+    space = cut.rfind(" ")
+    if space > len(cut) * 0.8:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:") + "..."
+
+
+def _cap_strings(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str):
+        return truncate(value, max_chars)
+    if isinstance(value, dict):
+        return {key: _cap_strings(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_cap_strings(item, max_chars) for item in value]
+    return value
+
+
+def _longest_string(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return max((_longest_string(item) for item in value.values()), default=0)
+    if isinstance(value, list):
+        return max((_longest_string(item) for item in value), default=0)
+    return 0
+
+
+def _longest_list(value: Any) -> Optional[List[Any]]:
+    """The longest list inside value (with more than one item)."""
+    best: Tuple[int, Optional[List[Any]]] = (1, None)
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            if len(item) > best[0]:
+                best = (len(item), item)
+            stack.extend(item)
+    return best[1]
+
+
+def fit_to_budget(result: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+    """
+    Shrink a result until its compact JSON fits max_tokens.
+
+    All strings are capped to the longest length that fits (found by
+    binary search). If even the minimum length is too large, trailing items
+    of the longest list are dropped. An "error" key is never removed.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(to_json(result)) <= max_chars:
+        return result
+
+    low, high = MIN_STRING_CHARS, _longest_string(result)
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = _cap_strings(result, middle)
+        if len(to_json(candidate)) <= max_chars:
+            best, low = candidate, middle + 1
+        else:
+            high = middle - 1
+    if best is not None:
+        return best
+
+    compact = _cap_strings(result, MIN_STRING_CHARS)
+    while len(to_json(compact)) > max_chars:
+        items = _longest_list(compact)
+        if items is None:
+            break
+        items.pop()
+    return compact
+
+
+def dedupe(items: List[Dict[str, Any]], *keys: str) -> List[Dict[str, Any]]:
+    """Drop items whose value for any of keys was already seen (case-insensitive)."""
+    seen = set()
+    unique = []
+    for item in items:
+        fingerprints = {
+            (key, str(item.get(key, "")).lower()[:200])
+            for key in keys if item.get(key)
+        }
+        if fingerprints & seen:
+            continue
+        seen |= fingerprints
+        unique.append(item)
+    return unique
@@ -1,49 +1,49 @@
 """Knowledge base tool for RAG (Retrieval Augmented Generation)."""
-from typing import Dict, Any, List
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
+from typing import Dict, Any, List, Optional
+from sqlalchemy.orm import Session
 from app.config import settings
+from app.models.document import Document
+from app.services.cache import LRUCache, on_documents_changed
+from app.services.embeddings import get_embedder
+from app.services.vectorstore import get_vector_store, user_namespace
+from app.services.vectorstore.batching import BatchResult, UpsertReport, upsert_in_batches
+from app.services.tools.compaction import dedupe, fit_to_budget, normalize_text
+from app.services.tools.registry import ToolContext, ToolSpec
 import uuid
 
 
+# Whether each user has indexed documents, shared by all requests in this worker
+_has_documents_cache = LRUCache(
+    maxsize=settings.known_user_cache_size,
+    ttl=settings.rag_has_documents_ttl_seconds
+)
+
+
+@on_documents_changed
+def _forget_has_documents(user_id: str):
+    _has_documents_cache.pop(user_id)
+
+
 class KnowledgeBaseTool:
     """Tool for searching user's uploaded documents using RAG."""
     
+    # Registry limits (see ToolSpec)
+    TIMEOUT_SECONDS = 10.0
+    MAX_CONCURRENCY = 8
+    
     def __init__(self):
-        self.pinecone = Pinecone(api_key=settings.pinecone_api_key)
         self.index_name = settings.pinecone_index_name
-        # Initialize embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self._ensure_index()
+        self.vector_store = get_vector_store(self.index_name)
+        # Shared per-worker embedding model
+        self.embedder = get_embedder()
     
-    def _ensure_index(self):
-        """Ensure Pinecone index exists, create if not."""
-        try:
-            # Get list of indexes
-            existing_indexes = self.pinecone.list_indexes()
-            index_names = [idx.name for idx in existing_indexes] if hasattr(existing_indexes, '__iter__') else []
-            
-            if self.index_name not in index_names:
-                # Create index if it doesn't exist
-                try:
-                    self.pinecone.create_index(
-                        name=self.index_name,
-                        dimension=384,  # all-MiniLM-L6-v2 dimension
-                        metric="cosine",
-                        spec=ServerlessSpec(
-                            cloud="aws",
-                            region=settings.pinecone_environment
-                        )
-                    )
-                    print(f"Created Pinecone index: {self.index_name}")
-                except Exception as create_error:
-                    # Index might already exist or creation failed
-                    print(f"Note: Index creation - {create_error}")
-        except Exception as e:
-            print(f"Warning: Could not ensure index exists: {e}")
-            print("Index will be created on first use if it doesn't exist")
-    
-    def search(self, query: str, user_id: str, top_k: int = 5) -> Dict[str, Any]:
+    def search(
+        self,
+        query: str,
+        user_id: str,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict[str, Any]:
         """
         Search user's knowledge base for relevant information.
         
@@ -51,28 +51,28 @@ class KnowledgeBaseTool:
             query: Search query
             user_id: User ID to filter results
             top_k: Number of top results to return
+            query_embedding: Embedding of the query, if already computed
             
         Returns:
             Dictionary with search results
         """
         try:
-            # Get index
-            index = self.pinecone.Index(self.index_name)
-            
             # Generate query embedding
-            query_embedding = self.embedding_model.encode(query).tolist()
+            if query_embedding is None:
+                query_embedding = self.embedder.encode_one(query)
             
-            # Search in Pinecone with user filter
-            results = index.query(
+            # Search the user's namespace; in the shared layout the filter
+            # alone keeps other users' vectors out
+            matches = self.vector_store.query(
                 vector=query_embedding,
                 top_k=top_k,
-                include_metadata=True,
-                filter={"user_id": user_id}
+                filter={"user_id": user_id},
+                namespace=user_namespace(user_id)
             )
             
             # Format results
             formatted_results = []
-            for match in results.matches:
+            for match in matches:
                 formatted_results.append({
                     "text": match.metadata.get("text", ""),
                     "source": match.metadata.get("source", ""),
@@ -94,53 +94,202 @@ class KnowledgeBaseTool:
                 "count": 0
             }
     
-    def add_document_chunks(self, user_id: str, document_id: str, chunks: List[Dict[str, Any]]) -> bool:
+    def has_documents(self, user_id: str, db: Session) -> bool:
+        """
+        Check whether the user has any indexed documents.
+        
+        Answers are cached per user and invalidated when the user's
+        documents change.
+        
+        Args:
+            user_id: User ID
+            db: Database session
+            
+        Returns:
+            True if at least one document finished indexing
+        """
+        has_documents = _has_documents_cache.get(user_id)
+        if has_documents is None:
+            has_documents = db.query(Document.id).filter(
+                Document.user_id == uuid.UUID(user_id),
+                Document.status == "completed"
+            ).first() is not None
+            _has_documents_cache.set(user_id, has_documents)
+        return has_documents
+    
+    def add_document_chunks(self, user_id: str, document_id: str, chunks: List[Dict[str, Any]]) -> UpsertReport:
         """
         Add document chunks to the knowledge base.
         
+        Vectors are upserted concurrently in batches; batches that fail with
+        a transient error are retried (see upsert_in_batches).
+        
         Args:
             user_id: User ID
             document_id: Document ID
-            chunks: List of chunks with text and metadata
+            chunks: List of chunks with text and metadata, optionally with
+                the "vector_id" to store them under
             
         Returns:
-            True if successful
+            Per-batch report; report.success is True if every vector was stored
         """
+        vector_ids = [
+            chunk.get("vector_id") or f"{document_id}_chunk_{i}"
+            for i, chunk in enumerate(chunks)
+        ]
         try:
-            index = self.pinecone.Index(self.index_name)
-            
             # Generate embeddings for all chunks
             texts = [chunk["text"] for chunk in chunks]
-            embeddings = self.embedding_model.encode(texts).tolist()
+            embeddings = self.embedder.encode(texts).tolist()
             
-            # Prepare vectors for Pinecone
-            vectors = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                vector_id = f"{document_id}_chunk_{i}"
-                vectors.append({
-                    "id": vector_id,
-                    "values": embedding,
-                    "metadata": {
-                        "user_id": user_id,
-                        "document_id": document_id,
-                        "text": chunk["text"],
-                        "source": chunk.get("source", ""),
-                        "chunk_index": chunk.get("chunk_index", i)
-                    }
-                })
+        except Exception as e:
+            print(f"Error embedding document chunks: {e}")
+            return UpsertReport([BatchResult(index=0, ids=vector_ids, size_bytes=0, error=str(e))])
+        
+        # Prepare vectors for the vector store
+        vectors = []
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            vectors.append({
+                "id": vector_ids[i],
+                "values": embedding,
+                "metadata": {
+                    "user_id": user_id,
+                    "document_id": document_id,
+                    "text": chunk["text"],
+                    "source": chunk.get("source", ""),
+                    "chunk_index": chunk.get("chunk_index", i)
+                }
+            })
+        
+        report = upsert_in_batches(self.vector_store, vectors, namespace=user_namespace(user_id))
+        if not report.success:
+            print(
+                f"Error adding document chunks: {len(report.failed)} of {len(report.batches)} "
+                f"batches failed ({len(report.failed_ids)} vectors)"
+            )
+        return report
+    
+    def update_chunk_metadata(self, user_id: str, updates: Dict[str, Dict[str, Any]]) -> UpsertReport:
+        """
+        Change metadata fields of stored chunk vectors without re-embedding.
+        
+        The vectors are fetched and upserted again with the fields merged
+        into their metadata (e.g. a new "chunk_index" or "source").
+        
+        Args:
+            user_id: User ID owning the vectors
+            updates: Fields to set, by vector ID
+            
+        Returns:
+            Per-batch report; report.success is True if every vector was updated
+        """
+        namespace = user_namespace(user_id)
+        try:
+            vectors = self.vector_store.fetch(list(updates), namespace=namespace)
+        except Exception as e:
+            print(f"Error fetching document vectors: {e}")
+            return UpsertReport([BatchResult(index=0, ids=list(updates), size_bytes=0, error=str(e))])
+        
+        if len(vectors) < len(updates):
+            print(f"Warning: {len(updates) - len(vectors)} document vectors to update were not found")
+        for vector in vectors:
+            vector["metadata"] = {**vector["metadata"], **updates[vector["id"]]}
+        
+        report = upsert_in_batches(self.vector_store, vectors, namespace=namespace)
+        if not report.success:
+            print(f"Error updating chunk metadata: {len(report.failed_ids)} vectors failed")
+        return report
+    
+    def delete_vectors(self, user_id: str, vector_ids: List[str]) -> bool:
+        """
+        Delete vectors from the knowledge base by ID.
+        
+        Args:
+            user_id: User ID owning the vectors
+            vector_ids: IDs of the vectors to delete
             
-            # Upsert in batches
-            batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                index.upsert(vectors=batch)
+        Returns:
+            True if successful
+        """
+        try:
+            self.vector_store.delete(ids=vector_ids, namespace=user_namespace(user_id))
+            return True
             
+        except Exception as e:
+            print(f"Error deleting document vectors: {e}")
+            return False
+    
+    def delete_document(self, user_id: str, document_id: str, vector_ids: List[str]) -> bool:
+        """
+        Delete all vectors of a document.
+        
+        Deletes the stored vector IDs in bulk, then sweeps the document's ID
+        prefix (every chunk vector ID starts with "<document_id>_") to catch
+        vectors whose IDs were never recorded.
+        
+        Args:
+            user_id: User ID owning the document
+            document_id: Document ID
+            vector_ids: Vector IDs recorded for the document's chunks
+            
+        Returns:
+            True if successful
+        """
+        try:
+            namespace = user_namespace(user_id)
+            self.vector_store.delete(ids=vector_ids, namespace=namespace)
+            self.vector_store.delete_prefix(f"{document_id}_", namespace=namespace)
             return True
             
         except Exception as e:
-            print(f"Error adding document chunks: {e}")
+            print(f"Error deleting document {document_id} from knowledge base: {e}")
             return False
     
+    def get_tool_specs(self) -> List[ToolSpec]:
+        """Get registry specs for the tools this class provides."""
+        return [
+            ToolSpec(
+                name="search_knowledge_base",
+                definition=self.get_tool_definition(),
+                handler=self._handle_search,
+                timeout=self.TIMEOUT_SECONDS,
+                max_concurrency=self.MAX_CONCURRENCY,
+                compactor=self.compact_result
+            )
+        ]
+    
+    @staticmethod
+    def compact_result(result: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+        """
+        Keep each distinct chunk's text and source, most relevant first.
+        
+        Args:
+            result: Result of search
+            max_tokens: Token budget for the compacted result
+            
+        Returns:
+            Compacted result
+        """
+        if result.get("error"):
+            return {"error": result["error"]}
+        
+        chunks = [
+            {
+                "source": match.get("source", ""),
+                "chunk": match.get("chunk_index", 0),
+                "text": normalize_text(match.get("text"))
+            }
+            for match in result.get("results", [])
+        ]
+        return fit_to_budget({"results": dedupe(chunks, "text")}, max_tokens)
+    
+    def _handle_search(self, tool_input: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
+        return self.search(
+            query=tool_input.get("query", ""),
+            user_id=context.user_id,
+            top_k=tool_input.get("top_k", 5)
+        )
+    
     def get_tool_definition(self) -> Dict[str, Any]:
         """Get tool definition for Claude function calling."""
         return {
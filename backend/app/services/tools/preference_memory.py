@@ -1,37 +1,55 @@
 """Preference memory tool for storing and retrieving user preferences."""
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from app.models.user import User, UserPreference
 from app.models.base import get_db
+from app.services.cache import LRUCache
+from app.services.tools.registry import ToolContext, ToolSpec
+from app.config import settings
 import uuid
 
 
+# Rendered profiles per user, shared by all requests in this worker
+_profile_cache = LRUCache(
+    maxsize=settings.profile_cache_size,
+    ttl=settings.profile_cache_ttl_seconds
+)
+
+
 class PreferenceMemoryTool:
     """Tool for managing user preferences (structured memory)."""
     
+    # Registry limits (see ToolSpec). Handlers use the request's DB session,
+    # so they run inline rather than on the tool's thread pool.
+    TIMEOUT_SECONDS = None
+    MAX_CONCURRENCY = 16
+    
+    def __init__(self):
+        # Per-request snapshot of preferences loaded by get_all_preferences,
+        # keyed by user ID. The tool is created per request, so this never
+        # outlives the request that loaded it.
+        self._snapshots: Dict[str, Dict[str, str]] = {}
+    
     def get_preference(self, user_id: str, key: str, db: Session) -> Optional[str]:
         """
         Get a user preference by key.
         
+        The first read loads all of the user's preferences in one query;
+        later reads in the same request are served from that snapshot.
+        
         Args:
             user_id: User ID
             key: Preference key
             db: Database session
-            
+        
         Returns:
             Preference value or None
         """
-        try:
-            preference = db.query(UserPreference).filter(
-                UserPreference.user_id == uuid.UUID(user_id),
-                UserPreference.key == key
-            ).first()
-            
-            return preference.value if preference else None
-            
-        except Exception as e:
-            print(f"Error getting preference: {e}")
-            return None
+        if user_id not in self._snapshots:
+            self.get_all_preferences(user_id, db)
+        return self._snapshots.get(user_id, {}).get(key)
     
     def get_all_preferences(self, user_id: str, db: Session) -> Dict[str, str]:
         """
@@ -40,21 +58,74 @@ class PreferenceMemoryTool:
         Args:
             user_id: User ID
             db: Database session
-            
+        
         Returns:
             Dictionary of all preferences
         """
+        if user_id in self._snapshots:
+            return dict(self._snapshots[user_id])
+        
         try:
-            preferences = db.query(UserPreference).filter(
+            preferences = db.query(UserPreference.key, UserPreference.value).filter(
                 UserPreference.user_id == uuid.UUID(user_id)
             ).all()
             
-            return {pref.key: pref.value for pref in preferences}
-            
+            self._snapshots[user_id] = {key: value for key, value in preferences}
+            return dict(self._snapshots[user_id])
+        
         except Exception as e:
+            # Leave the session usable for the rest of the turn
+            db.rollback()
             print(f"Error getting all preferences: {e}")
             return {}
     
+    def get_profile(self, user_id: str, db: Session) -> str:
+        """
+        Get the user's preferences rendered for the system prompt.
+        
+        Renderings are cached per user and invalidated when preferences
+        are saved through this tool. A failed read is not cached.
+        
+        Args:
+            user_id: User ID
+            db: Database session
+            
+        Returns:
+            Compact profile text (empty if the user has no preferences)
+        """
+        profile = _profile_cache.get(user_id)
+        if profile is None:
+            profile = self.render_profile(self.get_all_preferences(user_id, db))
+            # Only successful reads leave a snapshot
+            if user_id in self._snapshots:
+                _profile_cache.set(user_id, profile)
+        return profile
+    
+    @staticmethod
+    def render_profile(preferences: Dict[str, str]) -> str:
+        """
+        Render preferences as a compact, size-bounded bullet list.
+        
+        Args:
+            preferences: Mapping of preference keys to values
+            
+        Returns:
+            Profile text of at most settings.profile_max_chars characters
+        """
+        lines = []
+        length = 0
+        for key in sorted(preferences):
+            value = " ".join(str(preferences[key]).split())
+            if len(value) > settings.profile_max_value_chars:
+                value = value[:settings.profile_max_value_chars - 3] + "..."
+            line = f"- {key}: {value}"
+            if length + len(line) + 1 > settings.profile_max_chars:
+                lines.append("- (more saved; use get_preference for other keys)")
+                break
+            lines.append(line)
+            length += len(line) + 1
+        return "\n".join(lines)
+    
     def save_preference(self, user_id: str, key: str, value: str, db: Session) -> bool:
         """
         Save or update a user preference.
@@ -64,37 +135,95 @@ class PreferenceMemoryTool:
             key: Preference key
             value: Preference value
             db: Database session
-            
+        
         Returns:
             True if successful
         """
+        return self.save_preferences(user_id, {key: value}, db)
+    
+    def save_preferences(self, user_id: str, preferences: Dict[str, str], db: Session) -> bool:
+        """
+        Save or update several user preferences in one statement.
+        
+        Args:
+            user_id: User ID
+            preferences: Mapping of preference keys to values
+            db: Database session
+        
+        Returns:
+            True if successful
+        """
+        if not preferences:
+            return True
+        
         try:
-            # Check if preference exists
-            preference = db.query(UserPreference).filter(
-                UserPreference.user_id == uuid.UUID(user_id),
-                UserPreference.key == key
-            ).first()
-            
-            if preference:
-                # Update existing
-                preference.value = value
-            else:
-                # Create new
-                preference = UserPreference(
-                    user_id=uuid.UUID(user_id),
-                    key=key,
-                    value=value
-                )
-                db.add(preference)
-            
+            now = datetime.utcnow()
+            statement = insert(UserPreference).values([
+                {
+                    "id": uuid.uuid4(),
+                    "user_id": uuid.UUID(user_id),
+                    "key": key,
+                    "value": value,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for key, value in preferences.items()
+            ])
+            statement = statement.on_conflict_do_update(
+                index_elements=[UserPreference.user_id, UserPreference.key],
+                set_={
+                    "value": statement.excluded.value,
+                    "updated_at": statement.excluded.updated_at,
+                }
+            )
+            db.execute(statement)
             db.commit()
-            return True
             
+            _profile_cache.pop(user_id)
+            if user_id in self._snapshots:
+                self._snapshots[user_id].update(preferences)
+            return True
+        
         except Exception as e:
             db.rollback()
-            print(f"Error saving preference: {e}")
+            print(f"Error saving preferences: {e}")
             return False
     
+    def get_tool_specs(self) -> List[ToolSpec]:
+        """Get registry specs for the tools this class provides."""
+        return [
+            ToolSpec(
+                name=definition["name"],
+                definition=definition,
+                handler=handler,
+                timeout=self.TIMEOUT_SECONDS,
+                max_concurrency=self.MAX_CONCURRENCY
+            )
+            for definition, handler in [
+                (self.get_tool_definition(), self._handle_get),
+                (self.get_save_tool_definition(), self._handle_save),
+                (self.get_batch_save_tool_definition(), self._handle_save_many),
+            ]
+        ]
+    
+    def _handle_get(self, tool_input: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
+        key = tool_input.get("key", "")
+        return {"key": key, "value": self.get_preference(context.user_id, key, context.db)}
+    
+    def _handle_save(self, tool_input: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
+        key = tool_input.get("key", "")
+        value = tool_input.get("value", "")
+        success = self.save_preference(context.user_id, key, value, context.db)
+        return {"success": success, "key": key, "value": value}
+    
+    def _handle_save_many(self, tool_input: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
+        preferences = {
+            str(key): str(value)
+            for key, value in (tool_input.get("preferences") or {}).items()
+        }
+        success = self.save_preferences(context.user_id, preferences, context.db)
+        return {"success": success, "saved": list(preferences.keys())}
+    
     def get_tool_definition(self) -> Dict[str, Any]:
         """Get tool definition for Claude function calling."""
         return {
@@ -132,4 +261,21 @@ class PreferenceMemoryTool:
                 "required": ["key", "value"]
             }
         }
-
+    
+    def get_batch_save_tool_definition(self) -> Dict[str, Any]:
+        """Get tool definition for saving several preferences at once."""
+        return {
+            "name": "save_preferences",
+            "description": "Save or update several user preferences in a single call. Prefer this over repeated save_preference calls when the user shares more than one fact about themselves.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "preferences": {
+                        "type": "object",
+                        "description": "Mapping of preference keys to values (e.g., {'name': 'Ada', 'location': 'London'})",
+                        "additionalProperties": {"type": "string"}
+                    }
+                },
+                "required": ["preferences"]
+            }
+        }
@@ -0,0 +1,173 @@
+"""Tool registry with per-tool timeouts, concurrency limits and bulkheads."""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.metrics import REGISTRY
+from app.services.tools.compaction import fit_to_budget
+
+
+TOOL_CALL_SECONDS = REGISTRY.histogram(
+    "tool_call_seconds",
+    "Tool execution time as seen by the caller",
+    ["tool", "outcome"]
+)
+
+
+@dataclass
+class ToolContext:
+    """Per-request state handed to tool handlers."""
+    user_id: str
+    db: Session
+
+
+@dataclass
+class ToolSpec:
+    """
+    Declaration of a tool exposed to Claude.
+
+    Attributes:
+        name: Tool name used in tool_use blocks
+        definition: Tool definition passed to messages.create
+        handler: Callable taking the tool input and a ToolContext
+        timeout: Seconds to wait for the handler. None runs the handler
+            inline in the calling thread, which handlers using the request's
+            (non thread-safe) DB session need.
+        max_concurrency: Maximum simultaneous executions per worker
+        compactor: Callable taking a result and a token budget and returning
+            the part of the result Claude needs. Results are fitted to the
+            budget afterwards either way.
+    """
+    name: str
+    definition: Dict[str, Any]
+    handler: Callable[[Dict[str, Any], ToolContext], Dict[str, Any]]
+    timeout: Optional[float] = 10.0
+    max_concurrency: int = 4
+    compactor: Optional[Callable[[Dict[str, Any], int], Dict[str, Any]]] = None
+
+
+class _Bulkhead:
+    """Concurrency limit and dedicated thread pool for one tool.
+
+    A slot is only released when the handler really returns, so calls that
+    outlive their timeout keep counting against the tool's limit and a
+    degraded tool cannot take more than its own threads.
+    """
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix=f"tool-{name}"
+        )
+
+
+# Bulkheads are per worker process and shared by all requests
+_bulkheads: Dict[str, _Bulkhead] = {}
+_bulkheads_lock = threading.Lock()
+
+
+def _get_bulkhead(spec: ToolSpec) -> _Bulkhead:
+    """Get (or lazily create) the bulkhead for a tool."""
+    bulkhead = _bulkheads.get(spec.name)
+    if bulkhead is None:
+        with _bulkheads_lock:
+            bulkhead = _bulkheads.get(spec.name)
+            if bulkhead is None:
+                bulkhead = _Bulkhead(spec.name, spec.max_concurrency)
+                _bulkheads[spec.name] = bulkhead
+    return bulkhead
+
+
+class ToolRegistry:
+    """Registry of the tools available to one request."""
+
+    def __init__(self, context: ToolContext):
+        self.context = context
+        self._specs: Dict[str, ToolSpec] = {}
+
+    def register(self, *specs: ToolSpec):
+        """Register one or more tool specs."""
+        for spec in specs:
+            self._specs[spec.name] = spec
+
+    def get_definitions(self) -> List[Dict[str, Any]]:
+        """Get definitions of all registered tools, in registration order."""
+        return [spec.definition for spec in self._specs.values()]
+
+    def execute(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute a tool call within the tool's time and concurrency limits.
+
+        Args:
+            tool_name: Name of the tool to run
+            tool_input: Input from the tool_use block
+
+        Returns:
+            Tool result, or a dictionary with an "error" key
+        """
+        spec = self._specs.get(tool_name)
+        if spec is None:
+            TOOL_CALL_SECONDS.observe(0.0, tool="unknown", outcome="unknown_tool")
+            return {"error": f"Unknown tool: {tool_name}"}
+
+        with TOOL_CALL_SECONDS.time(tool=tool_name) as labels:
+            outcome, result = self._execute(spec, tool_input)
+            labels["outcome"] = outcome
+        return result
+
+    def compact(self, tool_name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Compact a tool result for Claude within settings.tool_result_max_tokens.
+
+        Args:
+            tool_name: Name of the tool that produced the result
+            result: Result returned by execute
+
+        Returns:
+            Compacted result
+        """
+        budget = settings.tool_result_max_tokens
+        spec = self._specs.get(tool_name)
+        if spec is not None and spec.compactor is not None:
+            try:
+                result = spec.compactor(result, budget)
+            except Exception as e:
+                print(f"Warning: compacting {tool_name} result failed: {e}")
+        return fit_to_budget(result, budget)
+
+    def _execute(self, spec: ToolSpec, tool_input: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Run a tool's handler; returns (outcome, result)."""
+        tool_name = spec.name
+        bulkhead = _get_bulkhead(spec)
+        if not bulkhead.semaphore.acquire(timeout=settings.tool_queue_timeout_seconds):
+            return "busy", {"error": f"Tool {tool_name} is busy, please try again later"}
+
+        if spec.timeout is None:
+            try:
+                return _outcome(spec.handler(tool_input, self.context))
+            except Exception as e:
+                return "error", {"error": f"Tool {tool_name} failed: {str(e)}"}
+            finally:
+                bulkhead.semaphore.release()
+
+        try:
+            future = bulkhead.executor.submit(spec.handler, tool_input, self.context)
+        except Exception:
+            bulkhead.semaphore.release()
+            raise
+        future.add_done_callback(lambda _: bulkhead.semaphore.release())
+
+        try:
+            return _outcome(future.result(timeout=spec.timeout))
+        except FutureTimeoutError:
+            return "timeout", {"error": f"Tool {tool_name} timed out after {spec.timeout:g}s"}
+        except Exception as e:
+            return "error", {"error": f"Tool {tool_name} failed: {str(e)}"}
+
+
+def _outcome(result: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Classify a handler result; tools report failures as an "error" key."""
+    return ("error" if isinstance(result, dict) and result.get("error") else "ok"), result
@@ -1,15 +1,21 @@
 """Web search tool using Tavily API."""
 import httpx
-from typing import Dict, Any
+from typing import Dict, Any, List
 from app.config import settings
+from app.services.tools.compaction import dedupe, fit_to_budget, normalize_text
+from app.services.tools.registry import ToolContext, ToolSpec
 
 
 class WebSearchTool:
     """Tool for searching the web using Tavily API."""
     
+    # Registry limits (see ToolSpec)
+    TIMEOUT_SECONDS = 15.0
+    MAX_CONCURRENCY = 8
+    
     def __init__(self):
         self.api_key = settings.tavily_api_key
-        self.base_url = "https://api.tavily.com"
+        self.base_url = settings.tavily_base_url
     
     def search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
         """
@@ -61,6 +67,53 @@ class WebSearchTool:
                 "results": []
             }
     
+    def get_tool_specs(self) -> List[ToolSpec]:
+        """Get registry specs for the tools this class provides."""
+        return [
+            ToolSpec(
+                name="web_search",
+                definition=self.get_tool_definition(),
+                handler=self._handle_search,
+                timeout=self.TIMEOUT_SECONDS,
+                max_concurrency=self.MAX_CONCURRENCY,
+                compactor=self.compact_result
+            )
+        ]
+    
+    @staticmethod
+    def compact_result(result: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+        """
+        Keep the answer and one entry per page, without scores.
+        
+        Args:
+            result: Result of search
+            max_tokens: Token budget for the compacted result
+            
+        Returns:
+            Compacted result
+        """
+        if result.get("error"):
+            return {"error": result["error"]}
+        
+        results = [
+            {
+                "title": normalize_text(item.get("title")),
+                "url": item.get("url", ""),
+                "content": normalize_text(item.get("content"))
+            }
+            for item in result.get("results", [])
+        ]
+        compact = {"results": dedupe(results, "url", "content")}
+        if result.get("answer"):
+            compact = {"answer": normalize_text(result["answer"]), **compact}
+        return fit_to_budget(compact, max_tokens)
+    
+    def _handle_search(self, tool_input: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
+        return self.search(
+            query=tool_input.get("query", ""),
+            max_results=tool_input.get("max_results", 5)
+        )
+    
     def get_tool_definition(self) -> Dict[str, Any]:
         """Get tool definition for Claude function calling."""
         return {
@@ -0,0 +1,96 @@
+"""Vector storage for the knowledge base and long-term memory.
+
+``get_vector_store(index_name)`` returns the worker's store for an index:
+Pinecone by default, or the self-hosted ``LocalVectorStore`` (with int8 or
+product-quantized codes) when ``settings.vector_store`` is "local". Both
+expose ``upsert``, ``query``, ``fetch``, ``list_ids``, ``delete`` and
+``delete_prefix`` with Pinecone-style vectors, filters, matches and
+namespaces.
+
+With ``settings.vector_partitioning`` set to "filter" (the default),
+everything lives in the default namespace and queries rely on the
+``user_id`` metadata filter. With "namespace", each user's vectors live in
+their own namespace (``user_namespace``), so a query only touches that
+user's data. Existing indexes must be moved over with
+``migrate_vector_namespaces.py`` before switching: in namespace mode the
+default namespace is never read.
+
+Bulk writes go through ``upsert_in_batches`` (see ``batching``), which
+sends size-limited batches concurrently and retries transient failures.
+
+Local stores opened before a fork (see ``app.services.warmup.preload``)
+are kept by the child; stores holding network clients are dropped and
+reopened by each worker.
+"""
+import os
+import threading
+from typing import Dict, Optional
+from app.config import settings
+from app.services.embeddings import EMBEDDING_DIMENSION
+from .base import VectorMatch, matches_filter
+from .batching import UpsertReport, upsert_in_batches
+
+
+_stores: Dict[str, object] = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(index_name: str):
+    """Get (or lazily create) the store for an index, shared per worker."""
+    store = _stores.get(index_name)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(index_name)
+            if store is None:
+                store = _create_store(index_name)
+                _stores[index_name] = store
+    return store
+
+
+def user_namespace(user_id: str) -> Optional[str]:
+    """Namespace holding a user's vectors (None is the default namespace)."""
+    if settings.vector_partitioning == "namespace":
+        return str(user_id)
+    return None
+
+
+def _create_store(index_name: str):
+    if settings.vector_store == "pinecone":
+        from .pinecone_store import PineconeVectorStore
+        return PineconeVectorStore(index_name, EMBEDDING_DIMENSION)
+    if settings.vector_store == "local":
+        from .local import PartitionedLocalVectorStore
+        return PartitionedLocalVectorStore(
+            os.path.join(settings.local_vector_store_path, index_name),
+            EMBEDDING_DIMENSION,
+            quantization=settings.vector_quantization,
+            rerank_factor=settings.vector_rerank_factor,
+            pq_subspaces=settings.vector_pq_subspaces,
+            pq_train_size=settings.vector_pq_train_size,
+            compact_ratio=settings.vector_compact_ratio
+        )
+    raise ValueError(f"Unknown vector store: {settings.vector_store}")
+
+
+def _after_fork_in_child():
+    global _stores_lock
+    _stores_lock = threading.Lock()
+    for index_name, store in list(_stores.items()):
+        if hasattr(store, "reset_after_fork"):
+            store.reset_after_fork()
+        else:
+            del _stores[index_name]
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+__all__ = [
+    "UpsertReport",
+    "VectorMatch",
+    "get_vector_store",
+    "matches_filter",
+    "upsert_in_batches",
+    "user_namespace",
+]
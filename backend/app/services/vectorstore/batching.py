@@ -0,0 +1,188 @@
+"""Parallel, retrying upserts of many vectors.
+
+``upsert_in_batches`` splits vectors into batches that respect Pinecone's
+request limits (``vector_upsert_batch_size`` vectors and
+``vector_upsert_max_batch_bytes`` of JSON), sends up to
+``vector_upsert_max_in_flight`` of them at once and retries the batches
+that failed with a transient error (throttling, server errors, timeouts)
+with exponential backoff and full jitter. The returned ``UpsertReport``
+lists the outcome of each batch, so a caller can see exactly which
+vectors were not written.
+"""
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.metrics import REGISTRY
+
+
+VECTOR_UPSERT_BATCHES_TOTAL = REGISTRY.counter(
+    "vector_upsert_batches_total",
+    "Vector upsert batch attempts, by outcome (ok, retry, failed)",
+    ["outcome"]
+)
+VECTOR_UPSERT_BATCH_SECONDS = REGISTRY.histogram(
+    "vector_upsert_batch_seconds",
+    "Time to upsert one batch of vectors",
+    ["outcome"]
+)
+
+# HTTP statuses worth retrying; other 4xx errors would fail again
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one batch after all its attempts."""
+    index: int
+    ids: List[str]
+    size_bytes: int
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class UpsertReport:
+    """Per-batch outcome of ``upsert_in_batches``."""
+    batches: List[BatchResult] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        return all(batch.success for batch in self.batches)
+
+    @property
+    def failed(self) -> List[BatchResult]:
+        return [batch for batch in self.batches if not batch.success]
+
+    @property
+    def upserted(self) -> int:
+        return sum(len(batch.ids) for batch in self.batches if batch.success)
+
+    @property
+    def failed_ids(self) -> List[str]:
+        return [vector_id for batch in self.failed for vector_id in batch.ids]
+
+
+def vector_size(vector: Dict[str, Any]) -> int:
+    """Approximate request bytes of one vector (its JSON encoding)."""
+    return len(json.dumps(vector, separators=(",", ":"), default=str).encode())
+
+
+def plan_batches(
+    vectors: List[Dict[str, Any]],
+    max_vectors: int,
+    max_bytes: int
+) -> List[List[Dict[str, Any]]]:
+    """
+    Split vectors into batches of at most max_vectors and max_bytes.
+
+    A single vector larger than max_bytes gets a batch of its own (the
+    store will reject it, and the report shows which one it was).
+    """
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_bytes = 0
+    for vector in vectors:
+        size = vector_size(vector)
+        if current and (len(current) >= max_vectors or current_bytes + size > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(vector)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether an upsert error is worth retrying."""
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status in RETRYABLE_STATUSES
+    # Bad input fails the same way every time
+    return not isinstance(error, (ValueError, TypeError, KeyError))
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Full-jitter exponential backoff before retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+
+def upsert_in_batches(
+    store,
+    vectors: List[Dict[str, Any]],
+    namespace: Optional[str] = None,
+    max_in_flight: Optional[int] = None,
+    max_attempts: Optional[int] = None
+) -> UpsertReport:
+    """
+    Upsert vectors concurrently in size-limited batches, retrying failures.
+
+    Args:
+        store: Vector store (see ``get_vector_store``)
+        vectors: Vectors as {"id", "values", "metadata"} dicts
+        namespace: Namespace to write to
+        max_in_flight: Concurrent upsert requests (default from settings)
+        max_attempts: Attempts per batch, including the first
+
+    Returns:
+        Report with one BatchResult per batch
+    """
+    max_in_flight = max(1, max_in_flight or settings.vector_upsert_max_in_flight)
+    max_attempts = max(1, max_attempts or settings.vector_upsert_max_attempts)
+    batches = plan_batches(
+        vectors,
+        max_vectors=settings.vector_upsert_batch_size,
+        max_bytes=settings.vector_upsert_max_batch_bytes
+    )
+    report = UpsertReport([
+        BatchResult(
+            index=i,
+            ids=[str(vector["id"]) for vector in batch],
+            size_bytes=sum(vector_size(vector) for vector in batch)
+        )
+        for i, batch in enumerate(batches)
+    ])
+
+    def attempt(result: BatchResult) -> Optional[Exception]:
+        result.attempts += 1
+        with VECTOR_UPSERT_BATCH_SECONDS.time() as labels:
+            try:
+                store.upsert(batches[result.index], namespace=namespace)
+            except Exception as e:
+                labels["outcome"] = "error"
+                return e
+        return None
+
+    pending = report.batches
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(pending) or 1)) as pool:
+        while pending:
+            errors = list(pool.map(attempt, pending))
+            retry = []
+            for result, error in zip(pending, errors):
+                if error is None:
+                    result.error = None
+                    VECTOR_UPSERT_BATCHES_TOTAL.inc(outcome="ok")
+                    continue
+                result.error = str(error) or type(error).__name__
+                if result.attempts < max_attempts and is_transient(error):
+                    VECTOR_UPSERT_BATCHES_TOTAL.inc(outcome="retry")
+                    retry.append(result)
+                else:
+                    VECTOR_UPSERT_BATCHES_TOTAL.inc(outcome="failed")
+                    print(f"Vector upsert batch {result.index} failed after {result.attempts} attempt(s): {result.error}")
+            if retry:
+                time.sleep(backoff_delay(
+                    retry[0].attempts,
+                    settings.vector_upsert_backoff_base_seconds,
+                    settings.vector_upsert_backoff_max_seconds
+                ))
+            pending = retry
+    return report
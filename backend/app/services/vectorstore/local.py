@@ -0,0 +1,521 @@
+"""Self-hosted vector store with quantized in-memory codes.
+
+Data for one index lives in a directory:
+
+- ``vectors.f32``: append-only float32 rows, memory-mapped and only read to
+  re-rank the best candidates exactly
+- ``records.jsonl``: append-only log of upserts (id, row, metadata) and
+  deletes, replayed on start
+- ``pq_codebook.npy``: product quantization centroids, once trained
+
+Only the quantized codes (see ``quantization``), ids and metadata are held
+in memory; metadata (e.g. chunk text) is usually the larger part, and
+``stats`` reports both. Several worker processes can share a directory:
+writes are serialised with an exclusive file lock, and each process
+replays the log tail it has not seen (under a shared lock) before serving
+a query.
+
+Deletes and replacements leave dead rows behind. Once they make up
+``compact_ratio`` of the rows, the files are rewritten with live rows only
+(``compact``): the new rows go to a new ``vectors.<generation>.f32`` named
+by the first record of the new log, which atomically replaces the old one.
+Other processes notice the new log and replay it from the start.
+"""
+import fcntl
+import json
+import os
+import sys
+import threading
+import uuid
+from urllib.parse import quote
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+import numpy as np
+from app.services.vectorstore.base import VectorMatch, matches_filter
+from app.services.vectorstore.quantization import create_quantizer
+
+
+class LocalVectorStore:
+    """Cosine-similarity vector index stored on local disk."""
+
+    # Metadata fields with an inverted index, so filtering on them does not scan
+    INDEXED_FIELDS = ("user_id", "document_id")
+    # Smaller stores are never compacted
+    COMPACT_MIN_SLOTS = 1024
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int,
+        quantization: str = "int8",
+        rerank_factor: int = 4,
+        pq_subspaces: int = 48,
+        pq_train_size: int = 4096,
+        compact_ratio: float = 0.5
+    ):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dimension = dimension
+        self.rerank_factor = max(1, rerank_factor)
+        self.pq_train_size = pq_train_size
+        self.compact_ratio = compact_ratio
+        self.quantizer = create_quantizer(quantization, dimension, pq_subspaces)
+
+        self._default_vectors_path = os.path.join(path, "vectors.f32")
+        self._vectors_path = self._default_vectors_path
+        self._log_path = os.path.join(path, "records.jsonl")
+        self._codebook_path = os.path.join(path, "pq_codebook.npy")
+        self._lock_path = os.path.join(path, ".lock")
+        for file_path in (self._log_path, self._lock_path):
+            open(file_path, "ab").close()
+
+        self._lock = threading.RLock()
+        self._reset()
+
+        with self._lock, self._file_lock():
+            self._sync()
+            if self._should_compact():
+                self._compact()
+
+    def _reset(self):
+        """Forget all replayed state (before replaying a new log from the start)."""
+        # Per row ("slot") of the vectors file
+        self._codes = np.zeros(0, dtype=self.quantizer.dtype)
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._slot_by_id: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[Any, Set[int]]] = {name: {} for name in self.INDEXED_FIELDS}
+        self._encoded = 0  # slots with up-to-date codes
+        self._log_offset = 0
+        self._log_inode: Optional[int] = None
+        self._vectors_path = self._default_vectors_path
+        self._vectors: Optional[np.memmap] = None
+
+    # Public API
+
+    def reset_after_fork(self):
+        """Give a forked child its own lock; codes and mapped vectors stay shared."""
+        self._lock = threading.RLock()
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Insert or replace vectors given as {"id", "values", "metadata"} dicts."""
+        if not vectors:
+            return
+        values = _normalize(np.asarray([vector["values"] for vector in vectors], dtype=np.float32))
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dim vectors, got {values.shape[1]}")
+
+        with self._lock, self._file_lock():
+            self._sync()
+            first_slot = self._file_rows()
+            with open(self._vectors_path, "ab") as f:
+                f.write(values.tobytes())
+            records = [
+                {"op": "upsert", "slot": first_slot + i, "id": str(vector["id"]), "metadata": vector.get("metadata") or {}}
+                for i, vector in enumerate(vectors)
+            ]
+            self._append_log(records)
+            self._sync()
+            if self._should_compact():
+                self._compact()
+            self._maybe_train()
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[VectorMatch]:
+        """Return the top_k most similar vectors matching the metadata filter."""
+        query = _normalize(np.asarray([vector], dtype=np.float32))[0]
+        with self._lock:
+            self._sync_shared()
+            candidates = self._candidates(filter)
+            if len(candidates) == 0 or top_k <= 0:
+                return []
+
+            if self.quantizer.name == "none":
+                exact = self.quantizer.scores(query, self._codes[candidates])
+            else:
+                # Approximate scores on the codes, exact re-rank of the best few
+                shortlist = min(len(candidates), top_k * self.rerank_factor)
+                if self.quantizer.is_trained and len(candidates) > shortlist:
+                    approximate = self.quantizer.scores(query, self._codes[candidates])
+                    best = np.argpartition(-approximate, shortlist - 1)[:shortlist]
+                    candidates = np.sort(candidates[best])
+                exact = np.asarray(self._vectors[candidates]) @ query
+
+            order = np.argsort(-exact)[:top_k]
+            return [
+                VectorMatch(
+                    id=self._ids[candidates[i]],
+                    score=float(exact[i]),
+                    metadata=dict(self._metadata[candidates[i]])
+                )
+                for i in order
+            ]
+
+    def list_ids(self, prefix: str) -> Iterator[str]:
+        """Iterate over the ids starting with prefix."""
+        with self._lock:
+            self._sync_shared()
+            ids = sorted(id for id in self._slot_by_id if id.startswith(prefix))
+        return iter(ids)
+
+    def fetch(self, ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch vectors as {"id", "values", "metadata"} dicts; missing ids are skipped."""
+        with self._lock:
+            self._sync_shared()
+            vectors = []
+            for id in ids:
+                slot = self._slot_by_id.get(str(id))
+                if slot is not None:
+                    vectors.append({
+                        "id": self._ids[slot],
+                        "values": np.asarray(self._vectors[slot]).tolist(),
+                        "metadata": dict(self._metadata[slot])
+                    })
+            return vectors
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None):
+        """Delete vectors by id and/or metadata filter; unknown ids are ignored."""
+        with self._lock, self._file_lock():
+            self._sync()
+            targets = {str(id) for id in ids or []}
+            if filter:
+                targets.update(self._ids[slot] for slot in self._candidates(filter))
+            self._delete_ids(targets)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete every vector whose id starts with prefix; returns the count."""
+        with self._lock, self._file_lock():
+            self._sync()
+            return self._delete_ids({id for id in self._slot_by_id if id.startswith(prefix)})
+
+    def compact(self) -> int:
+        """Rewrite the files without dead rows; returns the number of rows dropped."""
+        with self._lock, self._file_lock():
+            self._sync()
+            return self._compact()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Index size and estimated memory use.
+
+        ``bytes_per_vector`` and ``code_bytes`` cover the quantized codes;
+        ``metadata_bytes`` estimates the ids and metadata held as Python
+        objects, and ``memory_bytes`` is the total.
+        """
+        with self._lock:
+            self._sync_shared()
+            slots = len(self._ids)
+            vectors = len(self._slot_by_id)
+            code_bytes = slots * self.quantizer.bytes_per_vector
+            metadata_bytes = sum(
+                sys.getsizeof(id) + _object_size(self._metadata[slot])
+                for id, slot in self._slot_by_id.items()
+            )
+            return {
+                "vectors": vectors,
+                "slots": slots,
+                "dead_slots": slots - vectors,
+                "quantization": self.quantizer.name,
+                "trained": self.quantizer.is_trained,
+                "bytes_per_vector": self.quantizer.bytes_per_vector,
+                "code_bytes": code_bytes,
+                "metadata_bytes": metadata_bytes,
+                "memory_bytes": code_bytes + metadata_bytes,
+                "memory_bytes_per_vector": (code_bytes + metadata_bytes) / vectors if vectors else 0.0,
+            }
+
+    # Log replay
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dimension * 4
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Lock across processes sharing this directory: exclusive for writes, shared for reads."""
+        with open(self._lock_path, "ab") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync_shared(self):
+        """Sync under a shared file lock, so a compaction is never seen half done."""
+        with self._file_lock(shared=True):
+            self._sync()
+
+    def _delete_ids(self, ids) -> int:
+        """Log deletes for the known ids (file lock held)."""
+        records = [{"op": "delete", "id": id} for id in ids if id in self._slot_by_id]
+        if records:
+            self._append_log(records)
+            self._sync()
+            if self._should_compact():
+                self._compact()
+        return len(records)
+
+    def _should_compact(self) -> bool:
+        slots = len(self._ids)
+        dead = slots - len(self._slot_by_id)
+        return slots >= self.COMPACT_MIN_SLOTS and self.compact_ratio > 0 and dead >= slots * self.compact_ratio
+
+    def _compact(self) -> int:
+        """Rewrite the vectors file and log with live rows only (file lock held)."""
+        live = sorted(self._slot_by_id.values())
+        dropped = len(self._ids) - len(live)
+        if not dropped:
+            return 0
+
+        vectors_path = os.path.join(self.path, f"vectors.{uuid.uuid4().hex[:12]}.f32")
+        with open(vectors_path, "wb") as f:
+            for start in range(0, len(live), 65536):
+                f.write(np.asarray(self._vectors[live[start:start + 65536]]).tobytes())
+        records = [{"op": "vectors", "file": os.path.basename(vectors_path)}] + [
+            {"op": "upsert", "slot": new_slot, "id": self._ids[slot], "metadata": self._metadata[slot]}
+            for new_slot, slot in enumerate(live)
+        ]
+        temporary_path = self._log_path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+        # The log switch is the commit point; the old vectors file is only garbage after it
+        os.replace(temporary_path, self._log_path)
+        if os.path.exists(self._vectors_path):
+            os.remove(self._vectors_path)
+
+        self._reset()
+        self._sync()
+        print(f"Compacted {self.path}: dropped {dropped} dead rows, kept {len(live)}")
+        return dropped
+
+    def _append_log(self, records: List[Dict[str, Any]]):
+        with open(self._log_path, "ab") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+
+    def _sync(self):
+        """Apply log records written since the last sync (by any process)."""
+        if not self.quantizer.is_trained and os.path.exists(self._codebook_path):
+            self.quantizer.codebook = np.load(self._codebook_path)
+            self._encoded = 0
+
+        log_stat = os.stat(self._log_path)
+        # Another process compacted the store: the log was replaced and the
+        # vectors file it referred to removed (inode numbers can be reused)
+        if self._log_offset and (
+            log_stat.st_ino != self._log_inode or not os.path.exists(self._vectors_path)
+        ):
+            self._reset()
+        self._log_inode = log_stat.st_ino
+        size = log_stat.st_size
+        if size > self._log_offset:
+            with open(self._log_path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read(size - self._log_offset)
+            # A concurrent writer may not have finished its last line yet
+            complete = data.rfind(b"\n") + 1
+            self._log_offset += complete
+            for line in data[:complete].splitlines():
+                if line.strip():
+                    self._apply(json.loads(line))
+            self._refresh_vectors()
+
+        if self.quantizer.is_trained and self._encoded < len(self._ids):
+            self._encode_slots(self._encoded, len(self._ids))
+
+    def _file_rows(self) -> int:
+        if not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // self._row_bytes
+
+    def _refresh_vectors(self):
+        rows = self._file_rows()
+        if rows and (
+            self._vectors is None
+            or len(self._vectors) != rows
+            or self._vectors.filename != os.path.abspath(self._vectors_path)
+        ):
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+
+    def _apply(self, record: Dict[str, Any]):
+        if record["op"] == "vectors":
+            # First record of a compacted log: rows live in a new file
+            self._vectors_path = os.path.join(self.path, record["file"])
+            self._vectors = None
+            return
+        if record["op"] == "delete":
+            slot = self._slot_by_id.pop(record["id"], None)
+            if slot is not None:
+                self._kill(slot)
+            return
+
+        slot = record["slot"]
+        # Rows written by a writer that died before logging them stay dead
+        while len(self._ids) <= slot:
+            self._add_slot()
+        previous = self._slot_by_id.get(record["id"])
+        if previous is not None:
+            self._kill(previous)
+        metadata = record["metadata"]
+        self._ids[slot] = record["id"]
+        self._metadata[slot] = metadata
+        self._alive[slot] = True
+        self._slot_by_id[record["id"]] = slot
+        for name in self.INDEXED_FIELDS:
+            if name in metadata:
+                self._postings[name].setdefault(metadata[name], set()).add(slot)
+
+    def _add_slot(self):
+        slot = len(self._ids)
+        if slot >= len(self._alive):
+            # Start small: with per-user partitions most stores stay tiny
+            capacity = max(64, 2 * len(self._alive))
+            codes = np.zeros(capacity, dtype=self.quantizer.dtype)
+            codes[:slot] = self._codes[:slot]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:slot] = self._alive[:slot]
+            self._codes, self._alive = codes, alive
+        self._ids.append(None)
+        self._metadata.append(None)
+
+    def _kill(self, slot: int):
+        metadata = self._metadata[slot] or {}
+        for name in self.INDEXED_FIELDS:
+            if name in metadata:
+                self._postings[name].get(metadata[name], set()).discard(slot)
+        self._alive[slot] = False
+        self._metadata[slot] = None
+
+    def _encode_slots(self, start: int, end: int, chunk_size: int = 65536):
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(end, chunk_start + chunk_size)
+            vectors = np.asarray(self._vectors[chunk_start:chunk_end])
+            self._codes[chunk_start:chunk_end] = self.quantizer.encode(vectors)
+        self._encoded = end
+
+    def _maybe_train(self):
+        """Train product quantization once enough vectors exist (file lock held)."""
+        if self.quantizer.is_trained or len(self._slot_by_id) < self.pq_train_size:
+            return
+        slots = np.fromiter(self._slot_by_id.values(), dtype=np.int64)
+        sample = np.sort(np.random.default_rng(0).choice(slots, min(len(slots), 65536), replace=False))
+        self.quantizer.train(np.asarray(self._vectors[sample]))
+        temporary_path = self._codebook_path + ".tmp.npy"
+        np.save(temporary_path, self.quantizer.codebook)
+        os.replace(temporary_path, self._codebook_path)
+        print(f"Trained product quantization for {self.path} on {len(sample)} vectors")
+        self._encode_slots(0, len(self._ids))
+
+    # Filtering
+
+    def _candidates(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Sorted live slots matching the filter."""
+        count = len(self._ids)
+        if not filter:
+            return np.flatnonzero(self._alive[:count])
+
+        slots = None
+        fully_indexed = True
+        for name, condition in filter.items():
+            if isinstance(condition, dict) and set(condition) == {"$eq"}:
+                condition = condition["$eq"]
+            if name not in self.INDEXED_FIELDS or isinstance(condition, dict):
+                fully_indexed = False
+                continue
+            matching = self._postings[name].get(condition, set())
+            slots = set(matching) if slots is None else slots & matching
+
+        if slots is None:
+            slots = np.flatnonzero(self._alive[:count]).tolist()
+        elif fully_indexed:
+            # Postings only hold live slots
+            return np.array(sorted(slots), dtype=np.int64)
+
+        selected = [
+            slot for slot in slots
+            if self._alive[slot] and matches_filter(self._metadata[slot], filter)
+        ]
+        return np.array(sorted(selected), dtype=np.int64)
+
+
+class PartitionedLocalVectorStore:
+    """Local equivalent of Pinecone namespaces: one LocalVectorStore per namespace.
+
+    The default namespace (None or "") lives in ``path`` itself, so indexes
+    written before partitioning stay readable; other namespaces live in
+    ``path/namespaces/<namespace>`` and are opened on first use.
+    """
+
+    def __init__(self, path: str, dimension: int, **options):
+        self.path = path
+        self.dimension = dimension
+        self.options = options
+        self._partitions: Dict[str, LocalVectorStore] = {}
+        self._lock = threading.Lock()
+
+    def reset_after_fork(self):
+        """Give a forked child its own locks; the mapped files stay shared."""
+        self._lock = threading.Lock()
+        for store in self._partitions.values():
+            store.reset_after_fork()
+
+    def partition(self, namespace: Optional[str] = None) -> LocalVectorStore:
+        """Get (or open) the store for a namespace."""
+        key = namespace or ""
+        store = self._partitions.get(key)
+        if store is None:
+            with self._lock:
+                store = self._partitions.get(key)
+                if store is None:
+                    path = os.path.join(self.path, "namespaces", quote(key, safe="")) if key else self.path
+                    store = LocalVectorStore(path, self.dimension, **self.options)
+                    self._partitions[key] = store
+        return store
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: Optional[str] = None):
+        self.partition(namespace).upsert(vectors)
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 5,
+        filter: Optional[Dict[str, Any]] = None,
+        namespace: Optional[str] = None
+    ) -> List[VectorMatch]:
+        return self.partition(namespace).query(vector, top_k=top_k, filter=filter)
+
+    def list_ids(self, prefix: str, namespace: Optional[str] = None) -> Iterator[str]:
+        return self.partition(namespace).list_ids(prefix)
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.partition(namespace).fetch(ids)
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        namespace: Optional[str] = None
+    ):
+        self.partition(namespace).delete(ids=ids, filter=filter)
+
+    def delete_prefix(self, prefix: str, namespace: Optional[str] = None) -> int:
+        return self.partition(namespace).delete_prefix(prefix)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def _object_size(value: Any) -> int:
+    """Approximate memory of a JSON-like value, including its contents."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_object_size(key) + _object_size(item) for key, item in value.items())
+    elif isinstance(value, list):
+        size += sum(_object_size(item) for item in value)
+    return size
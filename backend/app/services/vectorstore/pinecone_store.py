@@ -0,0 +1,123 @@
+"""Vector store backed by a Pinecone serverless index."""
+from typing import Any, Dict, Iterator, List, Optional
+from pinecone import Pinecone, ServerlessSpec
+from app.config import settings
+from app.services.vectorstore.base import VectorMatch
+
+
+# Pinecone's limit on ids per delete request
+DELETE_BATCH_SIZE = 1000
+# Ids per fetch request (sent in the URL, so kept small)
+FETCH_BATCH_SIZE = 100
+
+
+class PineconeVectorStore:
+    """Thin wrapper giving a Pinecone index the vector store interface."""
+
+    def __init__(self, index_name: str, dimension: int):
+        self.pinecone = Pinecone(api_key=settings.pinecone_api_key, host=settings.pinecone_host)
+        self.index_name = index_name
+        self.dimension = dimension
+        self._index = None
+        self._ensure_index()
+
+    def _ensure_index(self):
+        """Ensure Pinecone index exists, create if not."""
+        try:
+            existing_indexes = self.pinecone.list_indexes()
+            index_names = [idx.name for idx in existing_indexes] if hasattr(existing_indexes, '__iter__') else []
+
+            if self.index_name not in index_names:
+                try:
+                    self.pinecone.create_index(
+                        name=self.index_name,
+                        dimension=self.dimension,
+                        metric="cosine",
+                        spec=ServerlessSpec(
+                            cloud="aws",
+                            region=settings.pinecone_environment
+                        )
+                    )
+                    print(f"Created Pinecone index: {self.index_name}")
+                except Exception as create_error:
+                    # Index might already exist or creation failed
+                    print(f"Note: Index creation - {create_error}")
+        except Exception as e:
+            print(f"Warning: Could not ensure index {self.index_name} exists: {e}")
+            print("Index will be created on first use if it doesn't exist")
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self.pinecone.Index(self.index_name)
+        return self._index
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: Optional[str] = None):
+        """Insert or replace vectors given as {"id", "values", "metadata"} dicts."""
+        self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 5,
+        filter: Optional[Dict[str, Any]] = None,
+        namespace: Optional[str] = None
+    ) -> List[VectorMatch]:
+        """Return the top_k most similar vectors matching the metadata filter."""
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            filter=filter,
+            namespace=namespace
+        )
+        return [
+            VectorMatch(id=match.id, score=match.score, metadata=dict(match.metadata or {}))
+            for match in results.matches
+        ]
+
+    def list_ids(self, prefix: str, namespace: Optional[str] = None) -> Iterator[str]:
+        """Iterate over the ids starting with prefix."""
+        for page in self.index.list(prefix=prefix, namespace=namespace):
+            yield from page
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch vectors as {"id", "values", "metadata"} dicts; missing ids are skipped."""
+        ids = list(ids)
+        vectors = []
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            response = self.index.fetch(ids=ids[i:i + FETCH_BATCH_SIZE], namespace=namespace)
+            for vector in response.vectors.values():
+                vectors.append({
+                    "id": vector.id,
+                    "values": list(vector.values),
+                    "metadata": dict(vector.metadata or {})
+                })
+        return vectors
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        namespace: Optional[str] = None
+    ):
+        """
+        Delete vectors by id and/or metadata filter.
+
+        Serverless indexes reject filter deletes; use delete_prefix there.
+        """
+        ids = list(ids or [])
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            self.index.delete(ids=ids[i:i + DELETE_BATCH_SIZE], namespace=namespace)
+        if filter:
+            self.index.delete(filter=filter, namespace=namespace)
+
+    def delete_prefix(self, prefix: str, namespace: Optional[str] = None) -> int:
+        """Delete every vector whose id starts with prefix; returns the count."""
+        deleted = 0
+        for page in self.index.list(prefix=prefix, namespace=namespace):
+            ids = list(page)
+            if ids:
+                self.index.delete(ids=ids, namespace=namespace)
+                deleted += len(ids)
+        return deleted
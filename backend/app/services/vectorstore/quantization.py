@@ -0,0 +1,153 @@
+"""Vector codes for the local vector store.
+
+Each quantizer turns L2-normalised float32 vectors into fixed-size codes
+(a structured numpy dtype, one record per vector) and scores a query
+against many codes approximately. The local store keeps only the codes in
+memory and re-ranks the best candidates with the exact float vectors.
+
+- ``none``: float32 copy (4 * dim bytes), exact scores
+- ``int8``: per-vector scale plus one signed byte per dimension
+  (dim + 4 bytes)
+- ``pq``: product quantization, one byte per subspace (``subspaces``
+  bytes), scored with asymmetric distance tables
+"""
+from typing import Optional
+import numpy as np
+
+
+class FloatQuantizer:
+    """Unquantized float32 vectors."""
+
+    name = "none"
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.dtype = np.dtype([("v", np.float32, (dimension,))])
+        self.is_trained = True
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dtype.itemsize
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty(len(vectors), dtype=self.dtype)
+        codes["v"] = vectors
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return codes["v"] @ query
+
+
+class Int8Quantizer:
+    """Symmetric int8 scalar quantization with a per-vector scale."""
+
+    name = "int8"
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.dtype = np.dtype([("scale", np.float32), ("q", np.int8, (dimension,))])
+        self.is_trained = True
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dtype.itemsize
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        scale = np.abs(vectors).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes = np.empty(len(vectors), dtype=self.dtype)
+        codes["scale"] = scale
+        codes["q"] = np.clip(np.rint(vectors / scale[:, None]), -127, 127)
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return (codes["q"].astype(np.float32) @ query) * codes["scale"]
+
+
+class ProductQuantizer:
+    """Product quantization: each subspace is coded as its nearest of 256 centroids."""
+
+    name = "pq"
+    centroids_per_subspace = 256
+
+    def __init__(self, dimension: int, subspaces: int = 48):
+        if dimension % subspaces:
+            raise ValueError(f"dimension {dimension} is not divisible by {subspaces} subspaces")
+        self.dimension = dimension
+        self.subspaces = subspaces
+        self.subspace_dimension = dimension // subspaces
+        self.dtype = np.dtype([("c", np.uint8, (subspaces,))])
+        # (subspaces, 256, subspace_dimension) once trained
+        self.codebook: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebook is not None
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dtype.itemsize
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, seed: int = 0):
+        """Learn the per-subspace centroids with k-means."""
+        rng = np.random.default_rng(seed)
+        split = self._split(vectors)
+        self.codebook = np.stack([
+            kmeans(split[:, m], self.centroids_per_subspace, iterations, rng)
+            for m in range(self.subspaces)
+        ]).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        split = self._split(vectors)
+        codes = np.empty(len(vectors), dtype=self.dtype)
+        for m in range(self.subspaces):
+            codes["c"][:, m] = _nearest(split[:, m], self.codebook[m])
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # Inner product of the query with every centroid, per subspace
+        table = np.einsum("mkd,md->mk", self.codebook, query.reshape(self.subspaces, -1))
+        return table[np.arange(self.subspaces), codes["c"]].sum(axis=1)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.subspaces, self.subspace_dimension)
+
+
+def kmeans(points: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means; returns (k, dim) centroids. Empty clusters are reseeded."""
+    if len(points) < k:
+        raise ValueError(f"Need at least {k} training vectors, got {len(points)}")
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest(points, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _nearest(points: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Index of the nearest centroid (L2) for each point."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignment = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        # ||x||^2 is the same for every centroid, so it does not change the argmin
+        distances = centroid_norms[None, :] - 2 * chunk @ centroids.T
+        assignment[start:start + chunk_size] = distances.argmin(axis=1)
+    return assignment
+
+
+def create_quantizer(name: str, dimension: int, pq_subspaces: int = 48):
+    """Create a quantizer by name ("none", "int8" or "pq")."""
+    if name == "none":
+        return FloatQuantizer(dimension)
+    if name == "int8":
+        return Int8Quantizer(dimension)
+    if name == "pq":
+        return ProductQuantizer(dimension, pq_subspaces)
+    raise ValueError(f"Unknown vector quantization: {name}")
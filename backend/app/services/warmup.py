@@ -0,0 +1,134 @@
+"""Warm-up of models and connections before the first request.
+
+A cold worker pays for creating the Anthropic client, loading the
+embedding model, opening the vector store indexes and connecting to the
+database. ``warm_up`` does all of this up front; ``app.main`` runs it at
+startup when ``settings.warmup_on_startup`` is set.
+
+``preload`` is the subset that is safe to run in a server master before
+it forks workers (see ``gunicorn.conf.py``): the embedding model and local
+vector indexes are loaded once and shared copy-on-write, while clients and
+connections are still created by each worker.
+
+To avoid downloading the embedding model at startup, save it once (e.g.
+while building the image or Lambda package) and point
+``EMBEDDING_MODEL_PATH`` at the directory. From backend/:
+
+    python -m app.services.warmup --save-model models/all-MiniLM-L6-v2
+    python -m app.services.warmup      # warm up and print step timings
+"""
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+from app.config import settings
+
+
+def _warm_anthropic():
+    from app.services.ai_assistant import get_anthropic_client
+
+    get_anthropic_client()
+
+
+def _warm_embedder():
+    from app.services.embeddings import get_embedder
+
+    # One encode also initialises the model's kernels and buffers
+    get_embedder().encode_one("warm up")
+
+
+def _warm_vector_stores():
+    from app.services.vectorstore import get_vector_store
+
+    get_vector_store(settings.pinecone_index_name)
+    get_vector_store(f"{settings.pinecone_index_name}-memory")
+
+
+def _warm_database():
+    from sqlalchemy import text
+    from app.models.base import engine
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("anthropic_client", _warm_anthropic),
+    ("embedding_model", _warm_embedder),
+    ("vector_stores", _warm_vector_stores),
+    ("database", _warm_database),
+]
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Run every warm-up step; a failing step is reported and skipped.
+
+    Returns:
+        Seconds taken by each step that succeeded
+    """
+    timings = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warning: warm-up step {name} failed: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def preload() -> Dict[str, float]:
+    """
+    Load read-only assets in a master process, before workers are forked.
+
+    Nothing is encoded here: running the model would start its thread
+    pools, which do not survive a fork. The ONNX backend is not preloaded
+    because its session creates a thread pool as soon as it is opened.
+
+    Returns:
+        Seconds taken by each step that succeeded
+    """
+    from app.services.embeddings import get_embedder
+
+    steps = []
+    if settings.embedding_backend != "onnx":
+        steps.append(("embedding_model", get_embedder))
+    if settings.vector_store == "local":
+        steps.append(("vector_stores", _warm_vector_stores))
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warning: preload step {name} failed: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def save_model(path: str):
+    """Save the embedding model to a directory for EMBEDDING_MODEL_PATH."""
+    from sentence_transformers import SentenceTransformer
+    from app.services.embeddings.backends import DEFAULT_MODEL_NAME
+
+    SentenceTransformer(DEFAULT_MODEL_NAME).save(path)
+    print(f"Saved {DEFAULT_MODEL_NAME} to {path}; set EMBEDDING_MODEL_PATH={path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm up models and connections")
+    parser.add_argument("--save-model", metavar="PATH", help="Save the embedding model to PATH and exit")
+    args = parser.parse_args()
+
+    if args.save_model:
+        save_model(args.save_model)
+        return
+
+    for name, seconds in warm_up().items():
+        print(f"{name:<20} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
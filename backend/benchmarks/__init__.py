@@ -0,0 +1,4 @@
+"""Performance benchmarks for the backend.
+
+Run from the ``backend/`` directory, e.g. ``python -m benchmarks.calculator``.
+"""
@@ -0,0 +1,69 @@
+"""Microbenchmark: AST calculator versus the previous ``eval`` implementation.
+
+Usage:
+    python -m benchmarks.calculator [--number 20000]
+"""
+import argparse
+import math
+import operator
+import timeit
+
+from app.services.tools.calculator import CalculatorTool, _parse_expression
+
+
+EXPRESSIONS = [
+    "25 * 84",
+    "15% of 2450",
+    "sqrt(144) + 3 ** 4",
+    "(1250 * 0.075) / 12 + max(3, 9) - abs(-4)",
+    "round(sin(pi / 4) * 100, 2)",
+]
+
+# Evaluation context of the previous eval-based implementation
+LEGACY_SAFE_DICT = {
+    "pow": pow, "abs": abs, "round": round, "min": min, "max": max, "sum": sum,
+    "sqrt": math.sqrt, "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "log": math.log, "log10": math.log10, "exp": math.exp,
+    "ceil": math.ceil, "floor": math.floor, "pi": math.pi, "e": math.e,
+    "__builtins__": {},
+}
+
+
+def legacy_calculate(expression: str):
+    """The removed ``eval`` path (without percentage support)."""
+    return eval(expression.replace("15% of 2450", "0.15*2450"), LEGACY_SAFE_DICT, {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="Calls per expression")
+    args = parser.parse_args()
+
+    calculator = CalculatorTool()
+
+    print(f"{'expression':<45} {'eval us':>9} {'ast us':>9} {'ast cold us':>12}")
+    for expression in EXPRESSIONS:
+        legacy = timeit.timeit(lambda: legacy_calculate(expression), number=args.number)
+        cached = timeit.timeit(lambda: calculator.calculate(expression), number=args.number)
+
+        def cold():
+            _parse_expression.cache_clear()
+            calculator.calculate(expression)
+
+        uncached = timeit.timeit(cold, number=args.number)
+        print(
+            f"{expression:<45} "
+            f"{legacy / args.number * 1e6:>9.2f} "
+            f"{cached / args.number * 1e6:>9.2f} "
+            f"{uncached / args.number * 1e6:>12.2f}"
+        )
+
+    # The case that motivated the rewrite: rejected in microseconds instead of
+    # pinning a CPU while eval builds a multi-million digit integer.
+    seconds = timeit.timeit(lambda: calculator.calculate("9**9**9"), number=1000)
+    print(f"\n9**9**9 rejected in {seconds / 1000 * 1e6:.2f} us "
+          f"({calculator.calculate('9**9**9')['error']})")
+
+
+if __name__ == "__main__":
+    main()
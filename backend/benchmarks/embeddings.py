@@ -0,0 +1,86 @@
+"""Parity and throughput of the embedding backends.
+
+Compares ONNX Runtime models (float32 and/or int8) against the PyTorch
+sentence-transformers output on the same texts, then measures encode
+throughput per backend at several batch sizes. Exits non-zero when the
+minimum cosine similarity to PyTorch falls below --min-cosine.
+
+Export the models first (see app.services.embeddings.export_onnx), then:
+
+    python -m benchmarks.embeddings --onnx models/minilm/model.onnx \\
+        --onnx models/minilm/model.int8.onnx
+"""
+import argparse
+import sys
+import time
+from typing import Dict, List
+import numpy as np
+from app.services.embeddings.backends import OnnxBackend, SentenceTransformerBackend
+from benchmarks import fixtures
+
+BATCH_SIZES = (1, 8, 32, 128)
+
+
+def sample_texts(count: int) -> List[str]:
+    """Sentences of varied length, including some past the truncation limit."""
+    sentences = fixtures.make_text(count * 120, seed=3).split(". ")[:count]
+    long_text = fixtures.make_text(4000, seed=4)
+    return sentences + [long_text, "", "15% of 2450?"]
+
+
+def parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """Cosine similarity between matching rows (both are L2-normalised)."""
+    cosine = (reference * candidate).sum(axis=1)
+    return {"min": float(cosine.min()), "mean": float(cosine.mean())}
+
+
+def throughput(backend, texts: List[str], batch_size: int, seconds: float) -> float:
+    """Texts encoded per second at a fixed batch size."""
+    batch = (texts * (batch_size // len(texts) + 1))[:batch_size]
+    backend.encode(batch)  # warm up
+    encoded = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        backend.encode(batch)
+        encoded += batch_size
+    return encoded / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend parity and throughput")
+    parser.add_argument("--onnx", action="append", default=[], help="ONNX model file (repeatable)")
+    parser.add_argument("--texts", type=int, default=200, help="Number of parity texts")
+    parser.add_argument("--min-cosine", type=float, default=0.99,
+                        help="Fail if any text's cosine similarity to PyTorch is below this")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time per throughput measurement")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    backends = {"pytorch": SentenceTransformerBackend()}
+    for path in args.onnx:
+        backends[f"onnx:{path}"] = OnnxBackend(path, num_threads=args.threads)
+
+    reference = backends["pytorch"].encode(texts)
+    failed = False
+    print(f"Parity against PyTorch over {len(texts)} texts")
+    for name, backend in backends.items():
+        if name == "pytorch":
+            continue
+        result = parity(reference, backend.encode(texts))
+        status = "ok" if result["min"] >= args.min_cosine else "FAIL"
+        failed = failed or status == "FAIL"
+        print(f"  {name:<48} min {result['min']:.5f}  mean {result['mean']:.5f}  {status}")
+
+    print("\nThroughput (texts/s)")
+    print(f"  {'backend':<48}" + "".join(f"{f'batch={size}':>12}" for size in BATCH_SIZES))
+    for name, backend in backends.items():
+        rates = [throughput(backend, texts, size, args.seconds) for size in BATCH_SIZES]
+        print(f"  {name:<48}" + "".join(f"{rate:>12.1f}" for rate in rates))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Deterministic fixture documents for benchmarks.
+
+Generates plain text, DOCX and PDF files of several sizes. The PDF writer
+is a minimal hand-rolled one (Helvetica text pages) so no PDF authoring
+library is needed; PyPDF2 extracts its text like any other PDF.
+"""
+import os
+import random
+from typing import Dict, List
+
+# Approximate extracted text size per fixture
+SIZES = {
+    "small": 4 * 1024,
+    "medium": 64 * 1024,
+    "large": 512 * 1024,
+}
+
+VOCABULARY = (
+    "the quarterly report shows revenue growth across regions while operating "
+    "costs declined customers adopted the new platform faster than expected and "
+    "the team plans to expand support hiring in europe and asia next year with "
+    "particular focus on onboarding documentation security reviews and uptime"
+).split()
+
+
+def make_text(size: int, seed: int = 0) -> str:
+    """Generate roughly size characters of sentence-like text."""
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < size:
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))]
+        sentence = " ".join(words).capitalize() + "."
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def paragraphs(text: str, words_per_paragraph: int = 80) -> List[str]:
+    words = text.split()
+    return [
+        " ".join(words[i:i + words_per_paragraph])
+        for i in range(0, len(words), words_per_paragraph)
+    ]
+
+
+def write_docx(path: str, text: str):
+    from docx import Document as DocxDocument
+
+    document = DocxDocument()
+    for paragraph in paragraphs(text):
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, text: str, chars_per_line: int = 90, lines_per_page: int = 60):
+    """Write text as a simple multi-page PDF."""
+    lines = []
+    for paragraph in paragraphs(text):
+        current = ""
+        for word in paragraph.split():
+            if len(current) + len(word) + 1 > chars_per_line:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        lines.append(current)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) pairs
+    objects: Dict[int, bytes] = {
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for index, page_lines in enumerate(pages):
+        page_number = 4 + index * 2
+        content_number = page_number + 1
+        kids.append(f"{page_number} 0 R")
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td\n" + "".join(
+            f"({_pdf_escape(line)}) '\n" for line in page_lines
+        ) + "ET"
+        data = stream.encode("latin-1")
+        objects[page_number] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>"
+        ).encode()
+        objects[content_number] = (
+            f"<< /Length {len(data)} >>\nstream\n".encode() + data + b"\nendstream"
+        )
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(output)
+        output += f"{number} 0 obj\n".encode() + objects[number] + b"\nendobj\n"
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    for number in range(1, size):
+        output += f"{offsets[number]:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def generate(directory: str) -> Dict[str, Dict[str, str]]:
+    """
+    Write fixture files for every size into directory.
+
+    Returns:
+        Mapping of size name to {"text": str, "pdf": path, "docx": path}
+    """
+    os.makedirs(directory, exist_ok=True)
+    fixtures = {}
+    for seed, (name, size) in enumerate(SIZES.items()):
+        text = make_text(size, seed=seed)
+        pdf_path = os.path.join(directory, f"{name}.pdf")
+        docx_path = os.path.join(directory, f"{name}.docx")
+        if not os.path.exists(pdf_path):
+            write_pdf(pdf_path, text)
+        if not os.path.exists(docx_path):
+            write_docx(docx_path, text)
+        fixtures[name] = {"text": text, "pdf": pdf_path, "docx": docx_path}
+    return fixtures
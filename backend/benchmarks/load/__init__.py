@@ -0,0 +1 @@
+"""Offline end-to-end load testing with local stub upstream services."""
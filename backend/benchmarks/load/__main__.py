@@ -0,0 +1,3 @@
+from benchmarks.load.run import main
+
+main()
@@ -0,0 +1,346 @@
+"""End-to-end load test of the FastAPI app against local stub services.
+
+Starts the stub upstreams (see stubs.py), launches the app under uvicorn
+with its clients pointed at them, drives /api/chat/message, /api/chat/ws
+and /api/documents/upload at a target concurrency and reports latency
+percentiles, throughput and per-worker RSS.
+
+DATABASE_URL must point at a PostgreSQL database the app can use.
+
+Usage:
+    python -m benchmarks.load --concurrency 32 --duration 60 --workers 2
+    python -m benchmarks.load --mix chat=8,ws=1,upload=1 --llm-latency 1.2
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load.stubs import LatencyModel, StubConfig, StubServer
+
+
+PROMPTS = [
+    "Hello! How are you today?",
+    "What is 15% of 2450?",
+    "Can you summarise the key points of my uploaded notes?",
+    "What's the latest news about renewable energy?",
+    "Remind me what my favourite programming language is.",
+    "Explain the difference between a process and a thread.",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def worker_pids(master_pid: int) -> List[int]:
+    """PIDs of the uvicorn master and its direct children (Linux /proc)."""
+    pids = [master_pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent PID; the command name may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(entry))
+    return pids
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def make_document(size_kb: int) -> bytes:
+    words = "quarterly revenue grew while operating costs declined across all regions".split()
+    text = []
+    length = 0
+    while length < size_kb * 1024:
+        sentence = " ".join(random.choice(words) for _ in range(12)) + ". "
+        text.append(sentence)
+        length += len(sentence)
+    return "".join(text).encode()
+
+
+class LoadTest:
+    """Closed-loop load generator with one coroutine per virtual user."""
+
+    def __init__(self, base_url: str, args: argparse.Namespace):
+        self.base_url = base_url
+        self.args = args
+        self.mix = self._parse_mix(args.mix)
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.mix}
+        self.errors: Dict[str, int] = {name: 0 for name in self.mix}
+        self.user_ids = [str(uuid.uuid4()) for _ in range(args.users)]
+
+    @staticmethod
+    def _parse_mix(mix: str) -> Dict[str, float]:
+        weights = {}
+        for part in mix.split(","):
+            name, _, weight = part.partition("=")
+            weights[name.strip()] = float(weight or 1)
+        unknown = set(weights) - {"chat", "ws", "upload"}
+        if unknown:
+            raise SystemExit(f"Unknown scenarios in --mix: {', '.join(sorted(unknown))}")
+        return weights
+
+    def _record(self, scenario: str, started: float, ok: bool):
+        if ok:
+            self.latencies[scenario].append(time.perf_counter() - started)
+        else:
+            self.errors[scenario] += 1
+
+    async def chat(self, client: httpx.AsyncClient, user_id: str, state: Dict[str, str]):
+        payload = {"user_id": user_id, "message": random.choice(PROMPTS)}
+        if state.get("conversation_id"):
+            payload["conversation_id"] = state["conversation_id"]
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/chat/message", json=payload)
+            ok = response.status_code == 200
+            if ok:
+                state["conversation_id"] = response.json()["conversation_id"]
+        except httpx.HTTPError:
+            ok = False
+        self._record("chat", started, ok)
+
+    async def ws(self, user_id: str, state: Dict[str, object]):
+        import websockets
+
+        started = time.perf_counter()
+        try:
+            if state.get("ws") is None:
+                url = self.base_url.replace("http", "ws", 1) + "/api/chat/ws"
+                state["ws"] = await websockets.connect(url, max_size=None)
+            connection = state["ws"]
+            payload = {"user_id": user_id, "message": random.choice(PROMPTS)}
+            if state.get("ws_conversation_id"):
+                payload["conversation_id"] = state["ws_conversation_id"]
+            await connection.send(json.dumps(payload))
+            while True:
+                reply = json.loads(await connection.recv())
+                # Skip heartbeats and other control frames
+                if "response" in reply or "error" in reply:
+                    break
+            ok = "error" not in reply
+            if ok:
+                state["ws_conversation_id"] = reply.get("conversation_id")
+        except Exception:
+            ok = False
+            state["ws"] = None
+        self._record("ws", started, ok)
+
+    async def upload(self, client: httpx.AsyncClient, user_id: str):
+        size_kb = random.choice(self.args.upload_sizes_kb)
+        files = {"file": (f"doc-{uuid.uuid4().hex[:8]}.txt", make_document(size_kb), "text/plain")}
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/documents/upload", params={"user_id": user_id}, files=files)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        self._record("upload", started, ok)
+
+    async def virtual_user(self, client: httpx.AsyncClient, deadline: float):
+        user_id = random.choice(self.user_ids)
+        state: Dict[str, object] = {}
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            scenario = random.choices(names, weights)[0]
+            if scenario == "chat":
+                await self.chat(client, user_id, state)
+            elif scenario == "ws":
+                await self.ws(user_id, state)
+            else:
+                await self.upload(client, user_id)
+            if self.args.think_time:
+                await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+        if state.get("ws") is not None:
+            await state["ws"].close()
+
+    async def run(self) -> float:
+        limits = httpx.Limits(max_connections=self.args.concurrency * 2)
+        timeout = httpx.Timeout(self.args.request_timeout)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=timeout) as client:
+            started = time.perf_counter()
+            deadline = started + self.args.duration
+            await asyncio.gather(*[
+                self.virtual_user(client, deadline) for _ in range(self.args.concurrency)
+            ])
+            return time.perf_counter() - started
+
+
+def wait_for_health(base_url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Wait until /health answers; returns seconds taken."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise SystemExit(f"App exited during startup with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"App did not become healthy within {timeout:.0f}s")
+
+
+def start_app(stubs: StubServer, args: argparse.Namespace) -> subprocess.Popen:
+    env = {**os.environ, **stubs.env(), "ENVIRONMENT": "benchmark"}
+    if "DATABASE_URL" not in env:
+        raise SystemExit("DATABASE_URL must be set to a PostgreSQL database for the load test")
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, env=env, start_new_session=True)
+
+
+def report(test: LoadTest, elapsed: float, rss: Dict[int, List[float]], as_json: bool):
+    results = {"elapsed_seconds": elapsed, "scenarios": {}, "workers": {}}
+    for scenario, latencies in test.latencies.items():
+        count = len(latencies)
+        results["scenarios"][scenario] = {
+            "requests": count,
+            "errors": test.errors[scenario],
+            "throughput_rps": count / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    for pid, samples in rss.items():
+        if samples:
+            results["workers"][pid] = {"rss_mb_max": max(samples), "rss_mb_last": samples[-1]}
+
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\nDuration: {elapsed:.1f}s")
+    print(f"{'scenario':<8} {'ok':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for scenario, row in results["scenarios"].items():
+        print(
+            f"{scenario:<8} {row['requests']:>7} {row['errors']:>7} {row['throughput_rps']:>8.2f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}"
+        )
+    print(f"\n{'pid':>8} {'RSS max MB':>11} {'RSS last MB':>12}")
+    for pid, row in results["workers"].items():
+        print(f"{pid:>8} {row['rss_mb_max']:>11.1f} {row['rss_mb_last']:>12.1f}")
+
+
+async def sample_rss(master_pid: int, rss: Dict[int, List[float]], stop: asyncio.Event):
+    while not stop.is_set():
+        for pid in worker_pids(master_pid):
+            value = rss_mb(pid)
+            if value is not None:
+                rss.setdefault(pid, []).append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def drive(test: LoadTest, master_pid: Optional[int]) -> tuple:
+    rss: Dict[int, List[float]] = {}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(master_pid, rss, stop)) if master_pid else None
+    elapsed = await test.run()
+    stop.set()
+    if sampler:
+        await sampler
+    return elapsed, rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--users", type=int, default=50, help="Distinct user IDs")
+    parser.add_argument("--mix", default="chat=8,ws=1,upload=1", help="Scenario weights")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between requests (s)")
+    parser.add_argument("--upload-sizes-kb", type=int, nargs="+", default=[4, 64, 512])
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=0, help="App port (default: random)")
+    parser.add_argument("--app-url", help="Use an already running app instead of starting one")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Median stub LLM latency (s)")
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--llm-seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--output-tokens", type=int, default=150, help="Median output tokens")
+    parser.add_argument("--tool-use-probability", type=float, default=0.3)
+    parser.add_argument("--pinecone-latency", type=float, default=0.03)
+    parser.add_argument("--tavily-latency", type=float, default=0.6)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    stubs = StubServer(StubConfig(
+        anthropic_latency=LatencyModel(args.llm_latency, args.llm_latency_sigma),
+        anthropic_seconds_per_token=args.llm_seconds_per_token,
+        output_tokens_median=args.output_tokens,
+        tool_use_probability=args.tool_use_probability,
+        pinecone_latency=LatencyModel(args.pinecone_latency),
+        tavily_latency=LatencyModel(args.tavily_latency),
+    )).start()
+
+    process = None
+    try:
+        if args.app_url:
+            base_url = args.app_url.rstrip("/")
+            print(f"Using app at {base_url}; make sure it points at the stubs:")
+            for key, value in stubs.env().items():
+                print(f"  {key}={value}")
+        else:
+            args.port = args.port or free_port()
+            base_url = f"http://127.0.0.1:{args.port}"
+            process = start_app(stubs, args)
+            startup = wait_for_health(base_url, process, args.startup_timeout)
+            print(f"App healthy after {startup:.2f}s ({args.workers} worker(s))")
+
+        test = LoadTest(base_url, args)
+        elapsed, rss = asyncio.run(drive(test, process.pid if process else None))
+        report(test, elapsed, rss, args.json)
+        print(f"\nUpstream calls: {json.dumps(stubs.request_counts)}", file=sys.stderr)
+    finally:
+        if process is not None:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=30)
+        stubs.stop()
+
+
+if __name__ == "__main__":
+    main()
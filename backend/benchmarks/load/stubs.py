@@ -0,0 +1,371 @@
+"""Local stand-ins for the Anthropic, Pinecone and Tavily HTTP APIs.
+
+One threaded HTTP server serves all three under path prefixes:
+
+    /anthropic   Messages API (point ANTHROPIC_BASE_URL here)
+    /pinecone    Control plane (PINECONE_HOST); indexes are served at
+                 /pinecone/idx/<name> as their data-plane host
+    /tavily      Search API (TAVILY_BASE_URL)
+
+Responses are shaped like the real APIs closely enough for the official
+clients to parse them. Latency and token counts are drawn from lognormal
+distributions so tail behaviour resembles a real upstream.
+
+Run standalone with ``python -m benchmarks.load.stubs --port 9100``.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """Lognormal latency with a given median (seconds) and shape."""
+    median: float
+    sigma: float = 0.5
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.sigma)
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub services."""
+    anthropic_latency: LatencyModel = LatencyModel(0.8, 0.5)
+    # Extra latency per generated output token (streaming-free approximation)
+    anthropic_seconds_per_token: float = 0.0
+    output_tokens_median: int = 150
+    output_tokens_sigma: float = 0.6
+    tool_use_probability: float = 0.3
+    pinecone_latency: LatencyModel = LatencyModel(0.03, 0.4)
+    tavily_latency: LatencyModel = LatencyModel(0.6, 0.5)
+
+
+WORDS = (
+    "the assistant reviewed your question and found several relevant points "
+    "about the topic including background context examples and a summary"
+).split()
+
+
+def _text_of_tokens(count: int) -> str:
+    # Roughly 1.3 tokens per English word
+    return " ".join(random.choice(WORDS) for _ in range(max(1, int(count / 1.3))))
+
+
+class _VectorIndex:
+    """In-memory vector index used by the Pinecone stub."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.namespaces: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def upsert(self, namespace: str, vectors: List[Dict[str, Any]]) -> int:
+        with self.lock:
+            store = self.namespaces.setdefault(namespace, {})
+            for vector in vectors:
+                store[vector["id"]] = vector
+        return len(vectors)
+
+    def query(self, namespace: str, vector: List[float], top_k: int,
+              metadata_filter: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.lock:
+            candidates = list(self.namespaces.get(namespace, {}).values())
+        scored = []
+        for item in candidates:
+            if metadata_filter and not _matches(item.get("metadata", {}), metadata_filter):
+                continue
+            score = sum(a * b for a, b in zip(vector, item["values"]))
+            scored.append((score, item))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [
+            {"id": item["id"], "score": score, "values": [], "metadata": item.get("metadata", {})}
+            for score, item in scored[:top_k]
+        ]
+
+    def delete(self, namespace: str, ids: Optional[List[str]], delete_all: bool,
+               metadata_filter: Optional[Dict[str, Any]]):
+        with self.lock:
+            store = self.namespaces.setdefault(namespace, {})
+            if delete_all:
+                store.clear()
+            for vector_id in ids or []:
+                store.pop(vector_id, None)
+            if metadata_filter:
+                for vector_id in [k for k, v in store.items()
+                                  if _matches(v.get("metadata", {}), metadata_filter)]:
+                    store.pop(vector_id, None)
+
+    def fetch(self, namespace: str, ids: List[str]) -> Dict[str, Any]:
+        with self.lock:
+            store = self.namespaces.get(namespace, {})
+            return {vector_id: store[vector_id] for vector_id in ids if vector_id in store}
+
+    def list_ids(self, namespace: str, prefix: str) -> List[str]:
+        with self.lock:
+            return sorted(k for k in self.namespaces.get(namespace, {}) if k.startswith(prefix))
+
+
+def _matches(metadata: Dict[str, Any], metadata_filter: Dict[str, Any]) -> bool:
+    for key, condition in metadata_filter.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class StubServer:
+    """Threaded HTTP server hosting all stub services."""
+
+    def __init__(self, config: StubConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.indexes: Dict[str, _VectorIndex] = {}
+        self.index_dimensions: Dict[str, int] = {}
+        self.request_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        handler = _make_handler(self)
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables pointing the app's clients at the stubs."""
+        return {
+            "ANTHROPIC_API_KEY": "stub-key",
+            "ANTHROPIC_BASE_URL": f"{self.base_url}/anthropic",
+            "PINECONE_API_KEY": "stub-key",
+            "PINECONE_HOST": f"{self.base_url}/pinecone",
+            "TAVILY_API_KEY": "stub-key",
+            "TAVILY_BASE_URL": f"{self.base_url}/tavily",
+        }
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, service: str):
+        with self._lock:
+            self.request_counts[service] = self.request_counts.get(service, 0) + 1
+
+    def index(self, name: str) -> _VectorIndex:
+        with self._lock:
+            return self.indexes.setdefault(name, _VectorIndex())
+
+    # --- Anthropic -------------------------------------------------------
+
+    def anthropic_messages(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        config = self.config
+        output_tokens = max(1, int(random.lognormvariate(
+            math.log(config.output_tokens_median), config.output_tokens_sigma
+        )))
+        time.sleep(config.anthropic_latency.sample() + output_tokens * config.anthropic_seconds_per_token)
+
+        messages = body.get("messages", [])
+        input_tokens = sum(len(json.dumps(m)) for m in messages) // 4 + len(str(body.get("system", ""))) // 4
+        after_tool = any(
+            isinstance(m, dict) and (
+                m.get("type") == "tool_result"
+                or (isinstance(m.get("content"), list) and any(
+                    isinstance(block, dict) and block.get("type") == "tool_result"
+                    for block in m["content"]
+                ))
+            )
+            for m in messages[-3:]
+        )
+
+        if body.get("tools") and not after_tool and random.random() < config.tool_use_probability:
+            content = [{
+                "type": "tool_use",
+                "id": f"toolu_{uuid.uuid4().hex[:24]}",
+                "name": "calculator",
+                "input": {"expression": f"{random.randint(2, 999)} * {random.randint(2, 999)}"},
+            }]
+            stop_reason = "tool_use"
+        else:
+            content = [{"type": "text", "text": _text_of_tokens(output_tokens)}]
+            stop_reason = "end_turn"
+
+        return 200, {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub-model"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        }
+
+    # --- Pinecone --------------------------------------------------------
+
+    def index_model(self, name: str) -> Dict[str, Any]:
+        return {
+            "name": name,
+            "dimension": self.index_dimensions.get(name, 384),
+            "metric": "cosine",
+            "host": f"{self.base_url}/pinecone/idx/{name}",
+            "spec": {"serverless": {"cloud": "aws", "region": "us-east-1"}},
+            "status": {"ready": True, "state": "Ready"},
+            "deletion_protection": "disabled",
+        }
+
+    def pinecone(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        time.sleep(self.config.pinecone_latency.sample())
+        parts = [p for p in path.split("?")[0].split("/") if p]
+
+        if parts == ["indexes"]:
+            if method == "GET":
+                return 200, {"indexes": [self.index_model(name) for name in list(self.indexes)]}
+            name = body.get("name", "index")
+            self.index_dimensions[name] = body.get("dimension", 384)
+            self.index(name)
+            return 201, self.index_model(name)
+
+        if len(parts) == 2 and parts[0] == "indexes":
+            if parts[1] not in self.indexes:
+                return 404, {"error": {"code": "NOT_FOUND", "message": "Index not found"}, "status": 404}
+            return 200, self.index_model(parts[1])
+
+        if len(parts) >= 3 and parts[0] == "idx":
+            index = self.index(parts[1])
+            operation = "/".join(parts[2:])
+            namespace = body.get("namespace", "")
+            if operation == "vectors/upsert":
+                return 200, {"upsertedCount": index.upsert(namespace, body.get("vectors", []))}
+            if operation == "query":
+                matches = index.query(namespace, body.get("vector", []), body.get("topK", 10), body.get("filter"))
+                return 200, {"matches": matches, "namespace": namespace, "usage": {"readUnits": 1}}
+            if operation == "vectors/delete":
+                index.delete(namespace, body.get("ids"), body.get("deleteAll", False), body.get("filter"))
+                return 200, {}
+            if operation.startswith("vectors/fetch"):
+                query = _parse_query(path)
+                vectors = index.fetch(query.get("namespace", [""])[0], query.get("ids", []))
+                return 200, {"vectors": vectors, "namespace": namespace, "usage": {"readUnits": 1}}
+            if operation.startswith("vectors/list"):
+                query = _parse_query(path)
+                ids = index.list_ids(query.get("namespace", [""])[0], query.get("prefix", [""])[0])
+                return 200, {"vectors": [{"id": i} for i in ids], "namespace": namespace,
+                             "usage": {"readUnits": 1}}
+            if operation == "describe_index_stats":
+                return 200, {"namespaces": {}, "dimension": 384, "indexFullness": 0.0, "totalVectorCount": 0}
+
+        return 404, {"error": f"Unknown Pinecone path {path}"}
+
+    # --- Tavily ----------------------------------------------------------
+
+    def tavily_search(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        time.sleep(self.config.tavily_latency.sample())
+        results = [
+            {
+                "title": f"Result {i} for {body.get('query', '')}",
+                "url": f"https://example.com/{uuid.uuid4().hex[:8]}",
+                "content": _text_of_tokens(random.randint(80, 300)),
+                "score": round(random.random(), 3),
+            }
+            for i in range(body.get("max_results", 5))
+        ]
+        return 200, {"answer": _text_of_tokens(40), "results": results, "query": body.get("query", "")}
+
+
+def _parse_query(path: str) -> Dict[str, List[str]]:
+    return parse_qs(urlsplit(path).query)
+
+
+def _make_handler(server: StubServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            try:
+                return json.loads(self.rfile.read(length))
+            except ValueError:
+                return {}
+
+        def _send(self, status: int, payload: Dict[str, Any]):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, method: str):
+            body = self._body() if method in ("POST", "PATCH", "PUT") else {}
+            path = self.path
+            if path.startswith("/anthropic/"):
+                server.count("anthropic")
+                self._send(*server.anthropic_messages(body))
+            elif path.startswith("/pinecone/"):
+                server.count("pinecone")
+                self._send(*server.pinecone(method, path[len("/pinecone"):], body))
+            elif path.startswith("/tavily/"):
+                server.count("tavily")
+                self._send(*server.tavily_search(body))
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_DELETE(self):
+            self._dispatch("DELETE")
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stub upstream services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Median LLM latency (s)")
+    parser.add_argument("--output-tokens", type=int, default=150, help="Median output tokens")
+    parser.add_argument("--tool-use-probability", type=float, default=0.3)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        anthropic_latency=LatencyModel(args.llm_latency),
+        output_tokens_median=args.output_tokens,
+        tool_use_probability=args.tool_use_probability,
+    )
+    server = StubServer(config, args.host, args.port)
+    for key, value in server.env().items():
+        print(f"export {key}={value}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Shared versus private memory of the app's server processes.
+
+Starts the app under gunicorn (see gunicorn.conf.py) against the
+load-test stubs, sends chat messages so every worker has run the
+embedding model, and reports each process's memory from
+/proc/<pid>/smaps_rollup (Linux): RSS, PSS, and how much of it is shared
+with other processes or private. It runs once with ``PRELOAD_APP=true``
+(model loaded in the master and shared copy-on-write) and once with
+``PRELOAD_APP=false`` (one copy per worker), unless ``--mode`` picks one.
+The private memory per worker is what each extra worker costs.
+
+DATABASE_URL must point at a PostgreSQL database the app can use.
+
+Usage:
+    python -m benchmarks.memory --workers 4
+    python -m benchmarks.memory --mode preload --requests 50 --json
+    python -m benchmarks.memory --pid 12345     # report an already running server
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load.run import PROMPTS, free_port, wait_for_health, worker_pids
+from benchmarks.load.stubs import LatencyModel, StubConfig, StubServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def memory_mb(pid: int) -> Optional[Dict[str, float]]:
+    """Memory of one process in MB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in FIELDS:
+                    values[name] = int(rest.split()[0]) / 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": values.get("Rss", 0.0),
+        "pss": values.get("Pss", 0.0),
+        "shared": values.get("Shared_Clean", 0.0) + values.get("Shared_Dirty", 0.0),
+        "private": values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0),
+    }
+
+
+def snapshot(master_pid: int) -> Dict[str, object]:
+    """Memory of the master and each worker, plus per-worker averages."""
+    processes = {}
+    for pid in worker_pids(master_pid):
+        usage = memory_mb(pid)
+        if usage is not None:
+            processes[pid] = {"role": "master" if pid == master_pid else "worker", **usage}
+    workers = [row for row in processes.values() if row["role"] == "worker"]
+    summary = {
+        "processes": processes,
+        "total_pss_mb": sum(row["pss"] for row in processes.values()),
+    }
+    if workers:
+        summary["worker_private_mb"] = sum(row["private"] for row in workers) / len(workers)
+        summary["worker_shared_mb"] = sum(row["shared"] for row in workers) / len(workers)
+    return summary
+
+
+def start_app(env: Dict[str, str], port: int, workers: int, preload: bool) -> subprocess.Popen:
+    env = {
+        **env,
+        "PORT": str(port),
+        "WEB_CONCURRENCY": str(workers),
+        "PRELOAD_APP": "true" if preload else "false",
+    }
+    command = [
+        sys.executable, "-m", "gunicorn", "app.main:app",
+        "-c", "gunicorn.conf.py", "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, start_new_session=True)
+
+
+def exercise(base_url: str, requests: int, concurrency: int):
+    """Send chat messages so each worker loads and runs the model."""
+    def send(index: int):
+        try:
+            httpx.post(
+                f"{base_url}/api/chat/message",
+                json={"user_id": str(uuid.uuid4()), "message": PROMPTS[index % len(PROMPTS)]},
+                timeout=120.0
+            )
+        except httpx.HTTPError as e:
+            print(f"Warning: request failed: {e}", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, range(requests)))
+
+
+def measure(stubs: StubServer, args: argparse.Namespace, preload: bool) -> Dict[str, object]:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, **stubs.env(), "ENVIRONMENT": "benchmark", "PYTHONPATH": BACKEND_DIR}
+    process = start_app(env, port, args.workers, preload)
+    try:
+        startup = wait_for_health(base_url, process, args.startup_timeout)
+        idle = snapshot(process.pid)
+        exercise(base_url, args.requests, args.concurrency)
+        time.sleep(1.0)
+        return {"startup_seconds": startup, "idle": idle, "after_requests": snapshot(process.pid)}
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def print_snapshot(title: str, summary: Dict[str, object]):
+    print(f"\n{title}")
+    print(f"{'pid':>8} {'role':<7} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+    for pid, row in summary["processes"].items():
+        print(
+            f"{pid:>8} {row['role']:<7} {row['rss']:>9.1f} {row['pss']:>9.1f} "
+            f"{row['shared']:>10.1f} {row['private']:>11.1f}"
+        )
+    print(f"Total PSS: {summary['total_pss_mb']:.1f} MB", end="")
+    if "worker_private_mb" in summary:
+        print(f"; per worker: {summary['worker_private_mb']:.1f} MB private, "
+              f"{summary['worker_shared_mb']:.1f} MB shared", end="")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared vs private memory of server workers")
+    parser.add_argument("--mode", choices=["both", "preload", "no-preload"], default="both")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--requests", type=int, default=20, help="Chat messages sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--pid", type=int, help="Report an already running server master and exit")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if args.pid:
+        summary = snapshot(args.pid)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_snapshot(f"Server {args.pid}", summary)
+        return
+
+    if "DATABASE_URL" not in os.environ:
+        raise SystemExit("DATABASE_URL must be set to a PostgreSQL database for the memory benchmark")
+
+    modes: List[bool] = {"both": [True, False], "preload": [True], "no-preload": [False]}[args.mode]
+    stubs = StubServer(StubConfig(
+        anthropic_latency=LatencyModel(0.0),
+        pinecone_latency=LatencyModel(0.0),
+        tavily_latency=LatencyModel(0.0),
+        tool_use_probability=0.0
+    )).start()
+    try:
+        results = {
+            ("preload" if preload else "no-preload"): measure(stubs, args, preload)
+            for preload in modes
+        }
+    finally:
+        stubs.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for mode, result in results.items():
+        print(f"\n=== {mode} ({args.workers} workers, healthy after {result['startup_seconds']:.1f}s) ===")
+        print_snapshot("Idle", result["idle"])
+        print_snapshot(f"After {args.requests} requests", result["after_requests"])
+
+
+if __name__ == "__main__":
+    main()
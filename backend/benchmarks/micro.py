@@ -0,0 +1,197 @@
+"""Microbenchmarks for hot functions, with stored regression baselines.
+
+Each case is timed with several repeats and the median time per item (per
+call, or per text for the embedding batch cases) is compared against
+benchmarks/baselines.json. The run exits non-zero when a case is slower
+than its baseline by more than the threshold. Baselines are machine
+specific; the committed file records the machine it was made on. Record
+new ones on the reference machine with ``--save-baseline`` (optionally
+with ``--filter`` to update a subset).
+
+Usage:
+    python -m benchmarks.micro                      # compare against baselines
+    python -m benchmarks.micro --save-baseline      # record new baselines
+    python -m benchmarks.micro --filter chunk_text --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+# Settings are required at import time; benchmarks never call the services
+for _name in ("ANTHROPIC_API_KEY", "PINECONE_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+os.environ.setdefault("DATABASE_URL", "postgresql://benchmark@localhost/benchmark")
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+
+from benchmarks import fixtures  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+FIXTURE_DIR = os.path.join(tempfile.gettempdir(), "ai-assistant-bench-fixtures")
+EMBEDDING_BATCH_SIZES = (1, 8, 32, 128)
+
+
+def web_search_result() -> Dict:
+    """A tool result shaped like WebSearchTool.search output."""
+    text = fixtures.make_text(1500, seed=7)
+    return {
+        "answer": text[:400],
+        "results": [
+            {"title": f"Result {i}", "url": f"https://example.com/{i}", "content": text, "score": 0.9 - i / 10}
+            for i in range(5)
+        ],
+    }
+
+
+def build_cases() -> Dict[str, Tuple[Callable[[], object], int]]:
+    """Create the benchmark cases (name -> (zero-argument callable, items per call))."""
+    from app.api.documents import chunk_text, extract_text_from_docx, extract_text_from_pdf
+    from app.services.ai_assistant import AIAssistant
+    from app.services.tools.calculator import CalculatorTool
+    from app.services.tools.compaction import to_json
+    from app.services.tools.web_search import WebSearchTool
+    from app.config import settings
+
+    files = fixtures.generate(FIXTURE_DIR)
+    functions: Dict[str, Callable[[], object]] = {}
+
+    for size, fixture in files.items():
+        functions[f"chunk_text[{size}]"] = lambda text=fixture["text"]: chunk_text(text)
+        functions[f"extract_text_from_pdf[{size}]"] = lambda path=fixture["pdf"]: extract_text_from_pdf(path)
+        functions[f"extract_text_from_docx[{size}]"] = lambda path=fixture["docx"]: extract_text_from_docx(path)
+
+    calculator = CalculatorTool()
+    functions["calculator[simple]"] = lambda: calculator.calculate("25 * 84")
+    functions["calculator[percent]"] = lambda: calculator.calculate("15% of 2450")
+    functions["calculator[functions]"] = lambda: calculator.calculate("round(sqrt(144) * sin(pi / 4) + log10(1000), 2)")
+
+    result = web_search_result()
+    functions["tool_result_json[web_search]"] = lambda: json.dumps(result, indent=2)
+    functions["tool_result_compact[web_search]"] = lambda: to_json(
+        WebSearchTool.compact_result(result, settings.tool_result_max_tokens)
+    )
+
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": fixtures.make_text(300, seed=i)}
+        for i in range(20)
+    ]
+    memories = [fixtures.make_text(200, seed=100 + i) for i in range(3)]
+    functions["build_messages"] = lambda: AIAssistant.build_messages("What did we decide?", history, memories)
+
+    cases = {name: (function, 1) for name, function in functions.items()}
+    cases.update(embedding_cases())
+    return cases
+
+
+def embedding_cases() -> Dict[str, Tuple[Callable[[], object], int]]:
+    """Embedding encode at several batch sizes (reported per text)."""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("sentence_transformers not installed; skipping embedding cases", file=sys.stderr)
+        return {}
+
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    sentences = fixtures.make_text(128 * 200, seed=42).split(". ")
+    cases = {}
+    for batch_size in EMBEDDING_BATCH_SIZES:
+        batch = sentences[:batch_size]
+        cases[f"embedding_encode[batch={batch_size}]"] = (
+            lambda batch=batch: model.encode(batch, batch_size=len(batch)),
+            batch_size,
+        )
+    return cases
+
+
+def measure(function: Callable[[], object], repeat: int, min_time: float) -> float:
+    """Median seconds per call over repeat runs of an auto-sized loop."""
+    timer = timeit.Timer(function)
+    function()  # warm up caches and lazy initialisation
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return statistics.median(samples)
+
+
+def load_baselines() -> Dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {"cases": {}}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+def save_baselines(baselines: Dict, results: Dict[str, float]):
+    baselines.setdefault("cases", {}).update(results)
+    baselines["machine"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    with open(BASELINE_PATH, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(results: Dict[str, float], baselines: Dict[str, float], threshold: float) -> List[Tuple[str, float]]:
+    """Print a comparison table; return the cases that regressed."""
+    regressions = []
+    print(f"{'case':<42} {'median':>12} {'baseline':>12} {'change':>9}")
+    for name, seconds in results.items():
+        baseline = baselines.get(name)
+        if baseline:
+            change = seconds / baseline - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{name:<42} {format_time(seconds):>12} {format_time(baseline):>12} {change:>+8.1%}{flag}")
+            if change > threshold:
+                regressions.append((name, change))
+        else:
+            print(f"{name:<42} {format_time(seconds):>12} {'-':>12} {'new':>9}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks with regression thresholds")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per case")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown versus baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the new baselines")
+    args = parser.parse_args()
+
+    cases = {name: case for name, case in build_cases().items() if args.filter in name}
+    results = {}
+    for name, (function, items) in cases.items():
+        results[name] = measure(function, args.repeat, args.min_time) / items
+
+    baselines = load_baselines()
+    if args.save_baseline:
+        save_baselines(baselines, results)
+        compare(results, {}, args.threshold)
+        print(f"\nSaved {len(results)} baselines to {BASELINE_PATH}")
+        return
+
+    regressions = compare(results, baselines.get("cases", {}), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed beyond {args.threshold:.0%}:")
+        for name, change in regressions:
+            print(f"  {name}: {change:+.1%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
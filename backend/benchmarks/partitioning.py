@@ -0,0 +1,102 @@
+"""Query latency versus tenant count: shared filtered index vs per-user namespaces.
+
+For each tenant count, loads the same per-tenant data in two layouts and
+times queries for random tenants:
+
+- filter: every tenant in the default namespace, queried with a user_id
+  metadata filter (VECTOR_PARTITIONING=filter)
+- namespace: one namespace per tenant (VECTOR_PARTITIONING=namespace)
+
+Runs against the local vector store by default. With --store pinecone it
+uses the configured Pinecone index (for example the load-test stubs, see
+benchmarks/load); the vectors it writes are deleted afterwards.
+
+    python -m benchmarks.partitioning --tenants 10 100 1000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+import numpy as np
+from app.services.embeddings.backends import EMBEDDING_DIMENSION
+
+
+def make_store(kind: str, directory: str, name: str):
+    if kind == "local":
+        from app.services.vectorstore.local import PartitionedLocalVectorStore
+        return PartitionedLocalVectorStore(f"{directory}/{name}", EMBEDDING_DIMENSION, quantization="int8")
+    from app.config import settings
+    from app.services.vectorstore.pinecone_store import PineconeVectorStore
+    return PineconeVectorStore(settings.pinecone_index_name, EMBEDDING_DIMENSION)
+
+
+def tenant_vectors(tenant: int, count: int, rng: np.random.Generator) -> List[Dict]:
+    values = rng.normal(size=(count, EMBEDDING_DIMENSION)).astype(np.float32)
+    values /= np.linalg.norm(values, axis=1, keepdims=True)
+    user_id = f"bench-tenant-{tenant}"
+    return [
+        {"id": f"{user_id}_{i}", "values": values[i].tolist(), "metadata": {"user_id": user_id}}
+        for i in range(count)
+    ]
+
+
+def load(store, layout: str, tenants: int, per_tenant: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for tenant in range(tenants):
+        vectors = tenant_vectors(tenant, per_tenant, rng)
+        namespace = f"bench-tenant-{tenant}" if layout == "namespace" else None
+        store.upsert(vectors, namespace=namespace)
+
+
+def time_queries(store, layout: str, tenants: int, queries: int, top_k: int, seed: int) -> List[float]:
+    rng = np.random.default_rng(seed)
+    latencies = []
+    for _ in range(queries):
+        user_id = f"bench-tenant-{rng.integers(tenants)}"
+        vector = rng.normal(size=EMBEDDING_DIMENSION).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        start = time.perf_counter()
+        store.query(
+            vector.tolist(),
+            top_k=top_k,
+            filter={"user_id": user_id},
+            namespace=user_id if layout == "namespace" else None
+        )
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def cleanup(store, layout: str, tenants: int):
+    for tenant in range(tenants):
+        user_id = f"bench-tenant-{tenant}"
+        store.delete_prefix(f"{user_id}_", namespace=user_id if layout == "namespace" else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tenant scaling of vector partitioning layouts")
+    parser.add_argument("--store", choices=["local", "pinecone"], default="local")
+    parser.add_argument("--tenants", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--per-tenant", type=int, default=50, help="Vectors per tenant")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'tenants':>8} {'layout':<10} {'vectors':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for tenants in args.tenants:
+            for layout in ("filter", "namespace"):
+                store = make_store(args.store, directory, f"{layout}-{tenants}")
+                load(store, layout, tenants, args.per_tenant, seed=tenants)
+                latencies = sorted(time_queries(store, layout, tenants, args.queries, args.top_k, seed=1))
+                p95 = latencies[int(0.95 * (len(latencies) - 1))]
+                print(
+                    f"{tenants:>8} {layout:<10} {tenants * args.per_tenant:>9} "
+                    f"{statistics.median(latencies) * 1000:>8.2f} {p95 * 1000:>8.2f}"
+                )
+                if args.store == "pinecone":
+                    cleanup(store, layout, tenants)
+
+
+if __name__ == "__main__":
+    main()
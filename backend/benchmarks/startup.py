@@ -0,0 +1,138 @@
+"""Cold start benchmark: import time, startup time and first-request latency.
+
+Each run starts a fresh interpreter that imports ``app.main``, runs the
+app's startup handlers and sends one chat message through the ASGI app,
+with the Anthropic, Pinecone and Tavily clients pointed at the load-test
+stubs (with no added latency). Runs are made with warm-up disabled
+("cold") and enabled ("warm"); the medians are compared against
+benchmarks/baselines.json like the microbenchmarks.
+
+DATABASE_URL must point at a PostgreSQL database the app can use.
+
+Usage:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --save-baseline
+    python -m benchmarks.startup --importtime     # slowest imports of app.main
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+# Read before benchmarks.micro fills in placeholder settings
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+from benchmarks.load.stubs import LatencyModel, StubConfig, StubServer  # noqa: E402
+from benchmarks.micro import compare, load_baselines, save_baselines  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON object with the timings
+CHILD = r"""
+import asyncio, json, time, uuid
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+import httpx
+
+async def first_request():
+    await app.main.app.router.startup()
+    started = time.perf_counter()
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+        response = await client.post(
+            "/api/chat/message",
+            json={"user_id": str(uuid.uuid4()), "message": "Explain the difference between a process and a thread."}
+        )
+    return started, time.perf_counter(), response.status_code
+
+started, finished, status = asyncio.run(first_request())
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - imported,
+    "first_request": finished - started,
+    "status": status,
+}))
+"""
+
+
+def run_once(env: Dict[str, str]) -> Dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_times(env: Dict[str, str], top: int = 15) -> List[str]:
+    """Slowest modules (cumulative microseconds) from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    return [f"{cumulative / 1e6:8.3f} s {name}" for cumulative, name in rows[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per mode")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown versus baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the new baselines")
+    parser.add_argument("--importtime", action="store_true", help="List the slowest imports and exit")
+    args = parser.parse_args()
+
+    if not DATABASE_URL and not args.importtime:
+        raise SystemExit("DATABASE_URL must be set to a PostgreSQL database for the startup benchmark")
+
+    stubs = StubServer(StubConfig(
+        anthropic_latency=LatencyModel(0.0),
+        pinecone_latency=LatencyModel(0.0),
+        tavily_latency=LatencyModel(0.0),
+        tool_use_probability=0.0
+    )).start()
+    try:
+        env = {**os.environ, **stubs.env(), "PYTHONPATH": BACKEND_DIR}
+        if args.importtime:
+            print("\n".join(import_times(env)))
+            return
+
+        results = {}
+        for mode, warmup in (("cold", "false"), ("warm", "true")):
+            runs = [run_once({**env, "WARMUP_ON_STARTUP": warmup}) for _ in range(args.runs)]
+            failed = [run["status"] for run in runs if run["status"] != 200]
+            if failed:
+                print(f"Warning: {mode} first requests returned {failed}", file=sys.stderr)
+            for metric in ("import", "startup", "first_request"):
+                results[f"startup[{mode}].{metric}"] = statistics.median(run[metric] for run in runs)
+    finally:
+        stubs.stop()
+
+    baselines = load_baselines()
+    if args.save_baseline:
+        save_baselines(baselines, results)
+        compare(results, {}, args.threshold)
+        return
+    if compare(results, baselines.get("cases", {}), args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
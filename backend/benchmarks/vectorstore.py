@@ -0,0 +1,123 @@
+"""Memory and recall of the local vector store's quantization modes.
+
+Builds one LocalVectorStore per quantization mode from the same vectors
+and reports bytes per vector, query latency and recall@k against the
+unquantized (exact) index. Each vector carries chunk-sized text in its
+metadata, as the knowledge base stores it, so the memory columns show how
+much the codes save against the whole in-memory index.
+
+Vectors are synthetic (clustered, L2-normalised, like sentence
+embeddings), or real embeddings of fixture text with --embed:
+
+    python -m benchmarks.vectorstore --vectors 50000 --top-k 10
+    python -m benchmarks.vectorstore --embed --vectors 20000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+import numpy as np
+from app.services.embeddings.backends import EMBEDDING_DIMENSION
+from app.services.vectorstore.local import LocalVectorStore
+from benchmarks import fixtures
+
+MODES = ("none", "int8", "pq")
+USERS = 20
+
+
+def synthetic_vectors(count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, count // 200), EMBEDDING_DIMENSION))
+    points = centers[rng.integers(0, len(centers), count)] + 0.5 * rng.normal(size=(count, EMBEDDING_DIMENSION))
+    return points.astype(np.float32)
+
+
+def embedded_vectors(count: int, seed: int) -> np.ndarray:
+    from app.services.embeddings.backends import SentenceTransformerBackend
+
+    sentences = fixtures.make_text(count * 120, seed=seed).split(". ")[:count]
+    backend = SentenceTransformerBackend()
+    return np.concatenate([backend.encode(sentences[i:i + 256]) for i in range(0, len(sentences), 256)])
+
+
+def build(mode: str, directory: str, vectors: np.ndarray, texts: List[str], args) -> LocalVectorStore:
+    store = LocalVectorStore(
+        directory,
+        EMBEDDING_DIMENSION,
+        quantization=mode,
+        rerank_factor=args.rerank_factor,
+        pq_subspaces=args.pq_subspaces,
+        pq_train_size=min(args.pq_train_size, len(vectors))
+    )
+    for start in range(0, len(vectors), 1000):
+        store.upsert([
+            {"id": f"v{i}", "values": vectors[i], "metadata": {"user_id": f"user{i % USERS}", "text": texts[i]}}
+            for i in range(start, min(len(vectors), start + 1000))
+        ])
+    return store
+
+
+def evaluate(store: LocalVectorStore, queries: np.ndarray, truth: List[set], top_k: int) -> Dict[str, float]:
+    latencies = []
+    hits = 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        matches = store.query(query, top_k=top_k, filter={"user_id": f"user{i % USERS}"})
+        latencies.append(time.perf_counter() - start)
+        hits += len({match.id for match in matches} & truth[i])
+    return {
+        "recall": hits / (len(queries) * top_k),
+        "p50_ms": statistics.median(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local vector store quantization benchmark")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--pq-subspaces", type=int, default=48)
+    parser.add_argument("--pq-train-size", type=int, default=4096)
+    parser.add_argument("--text-chars", type=int, default=1000, help="Chunk text stored per vector")
+    parser.add_argument("--embed", action="store_true", help="Use real embeddings of fixture text")
+    args = parser.parse_args()
+
+    make = embedded_vectors if args.embed else synthetic_vectors
+    vectors = make(args.vectors + args.queries, seed=1)
+    vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+    text = fixtures.make_text(args.text_chars + 100, seed=2)
+    # Slices are separate strings, like chunks decoded from the log
+    texts = [text[i % 100:i % 100 + args.text_chars] for i in range(len(vectors))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {}
+        for mode in MODES:
+            start = time.perf_counter()
+            stores[mode] = build(mode, f"{directory}/{mode}", vectors, texts, args)
+            print(f"Built {mode} index in {time.perf_counter() - start:.1f}s")
+
+        exact = stores["none"]
+        truth = [
+            {match.id for match in exact.query(query, top_k=args.top_k, filter={"user_id": f"user{i % USERS}"})}
+            for i, query in enumerate(queries)
+        ]
+
+        print(f"\n{len(vectors)} vectors, {len(queries)} queries, {USERS} users, recall@{args.top_k}")
+        print(
+            f"{'mode':<6} {'bytes/vector':>13} {'codes MB':>10} {'metadata MB':>12} "
+            f"{'total/vector':>13} {'recall':>8} {'p50 ms':>8}"
+        )
+        for mode, store in stores.items():
+            stats = store.stats()
+            result = evaluate(store, queries, truth, args.top_k)
+            print(
+                f"{mode:<6} {stats['bytes_per_vector']:>13} {stats['code_bytes'] / 1e6:>10.1f} "
+                f"{stats['metadata_bytes'] / 1e6:>12.1f} {stats['memory_bytes_per_vector']:>13.0f} "
+                f"{result['recall']:>8.3f} {result['p50_ms']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
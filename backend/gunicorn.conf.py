@@ -0,0 +1,41 @@
+"""Gunicorn settings for running the API with several worker processes.
+
+With ``preload_app`` (the default here) the app is imported and the
+embedding model loaded once in the master (``app.services.warmup.preload``),
+then shared copy-on-write by every worker, so each extra worker only adds
+its own request state. ``uvicorn --workers`` starts workers as fresh
+interpreters and cannot share the model this way.
+
+Run from backend/ (requires gunicorn):
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Environment: PORT, WEB_CONCURRENCY (workers, default 2) and PRELOAD_APP
+("false" to load everything per worker, e.g. to compare memory with
+``python -m benchmarks.memory``).
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("PRELOAD_APP", "true").lower() != "false"
+
+if preload_app:
+    # A collection in the master would touch every object header and
+    # dirty pages before they are shared; frozen in when_ready instead
+    gc.disable()
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app.services.warmup import preload
+
+    for name, seconds in preload().items():
+        server.log.info(f"Preloaded {name} in {seconds * 1000:.0f} ms")
+    # Move everything loaded so far out of the collector's generations so
+    # workers never write to those objects during a collection
+    gc.freeze()
+    gc.enable()
@@ -0,0 +1,79 @@
+"""Script to move vectors into per-user namespaces.
+
+Vectors written with VECTOR_PARTITIONING=filter (the only layout before
+per-user namespaces) live in the default namespace, separated by the
+user_id metadata filter. This copies every user's document chunks and
+memories into the user's namespace, then deletes the originals. Each
+batch is copied before it is deleted, so the script can be re-run after
+an interruption.
+
+The app only reads the namespaces once VECTOR_PARTITIONING=namespace is
+set, and stops reading the default namespace then. Run the script with
+the app stopped (or during a deploy) and switch the setting right after.
+
+Usage (from backend/):
+    python migrate_vector_namespaces.py --dry-run
+    python migrate_vector_namespaces.py
+"""
+import argparse
+from typing import List
+from app.config import settings
+from app.models.base import SessionLocal
+from app.models.document import Document
+from app.models.user import User
+from app.services.vectorstore import get_vector_store
+
+BATCH_SIZE = 100
+
+
+def move_vectors(store, ids: List[str], user_id: str, dry_run: bool) -> int:
+    """Move vectors from the default namespace to the user's namespace."""
+    moved = 0
+    for i in range(0, len(ids), BATCH_SIZE):
+        vectors = store.fetch(ids[i:i + BATCH_SIZE])
+        owned = [vector for vector in vectors if vector["metadata"].get("user_id") == user_id]
+        if len(owned) < len(vectors):
+            print(f"  Skipping {len(vectors) - len(owned)} vectors not owned by {user_id}")
+        if owned and not dry_run:
+            store.upsert(owned, namespace=user_id)
+            store.delete(ids=[vector["id"] for vector in owned])
+        moved += len(owned)
+    return moved
+
+
+def migrate(dry_run: bool = False):
+    """Move document and memory vectors of every user."""
+    knowledge_base = get_vector_store(settings.pinecone_index_name)
+    memory = get_vector_store(f"{settings.pinecone_index_name}-memory")
+
+    db = SessionLocal()
+    try:
+        documents = db.query(Document.id, Document.user_id).all()
+        user_ids = [str(user_id) for (user_id,) in db.query(User.id).all()]
+    finally:
+        db.close()
+
+    chunk_count = 0
+    for document_id, user_id in documents:
+        # Chunk vector IDs start with the document ID
+        ids = list(knowledge_base.list_ids(f"{document_id}_"))
+        chunk_count += move_vectors(knowledge_base, ids, str(user_id), dry_run)
+
+    memory_count = 0
+    for user_id in user_ids:
+        # Memory IDs start with the user ID
+        ids = list(memory.list_ids(f"{user_id}_"))
+        memory_count += move_vectors(memory, ids, user_id, dry_run)
+
+    action = "Would move" if dry_run else "Moved"
+    print(f"✅ {action} {chunk_count} document chunk vectors ({len(documents)} documents)")
+    print(f"✅ {action} {memory_count} memory vectors ({len(user_ids)} users)")
+    if settings.vector_partitioning != "namespace" and not dry_run:
+        print("Next: set VECTOR_PARTITIONING=namespace; until then the app reads the default namespace, which is now empty")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move vectors into per-user namespaces")
+    parser.add_argument("--dry-run", action="store_true", help="Count vectors without moving them")
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run)
@@ -1,12 +1,38 @@
 """Script to set up the database tables."""
+from sqlalchemy import text
 from app.models.base import Base, engine
 from app.config import settings
 
+# Idempotent DDL for databases created before a model change. create_all()
+# only creates missing tables, not indexes or columns on existing ones.
+SCHEMA_UPDATES = [
+    # Keep the most recently updated row per (user_id, key) before enforcing uniqueness
+    """
+    DELETE FROM user_preferences a USING user_preferences b
+    WHERE a.user_id = b.user_id AND a.key = b.key
+      AND (a.updated_at, a.id::text) < (b.updated_at, b.id::text)
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_preferences_user_key ON user_preferences (user_id, key)",
+    # Content hashes for upload deduplication and incremental re-indexing
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_user_content_hash ON documents (user_id, content_hash)",
+]
+
+
+def apply_schema_updates():
+    """Bring tables created by older versions up to date with the models."""
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPDATES:
+            connection.execute(text(statement))
+
+
 def setup_database():
     """Create all database tables."""
     print("Creating database tables...")
     try:
         Base.metadata.create_all(bind=engine)
+        apply_schema_updates()
         print("✅ Database tables created successfully!")
         print(f"Database URL: {settings.database_url.split('@')[-1] if '@' in settings.database_url else 'configured'}")
     except Exception as e:
@@ -18,4 +44,3 @@ def setup_database():
 
 if __name__ == "__main__":
     setup_database()
-
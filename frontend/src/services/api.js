@@ -46,3 +46,24 @@ export const getDocuments = async (userId) => {
   return response.data;
 };
 
+
+export const deleteDocument = async (userId, documentId) => {
+  const response = await api.delete(`/api/documents/${userId}/${documentId}`);
+  return response.data;
+};
+
+export const replaceDocument = async (userId, documentId, file) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  
+  const response = await axios.put(
+    `${API_URL}/api/documents/${userId}/${documentId}`,
+    formData,
+    {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    }
+  );
+  return response.data;
+};